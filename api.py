@@ -4,8 +4,13 @@ import os
 import threading
 import traceback
 import io
+import queue
+import logging
 import urllib.request
 
+import serializer
+from semantic_config import resolve_semantic_config_path
+
 # ==========================================================
 # 1. 配置区域：单模型架构 (DeBERTa All-in-One)
 # ==========================================================
@@ -13,20 +18,84 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = CURRENT_DIR
 sys.path.append(CURRENT_DIR)
 CorpusPipelineClass = None
+# 常驻流水线: 模型只加载一次，多次运行复用 (release-pipeline 释放)
+RESIDENT_PIPELINE = None
+# 监视目录 (守护模式) 的后台线程
+WATCH_THREAD = None
+WATCH_STOP = threading.Event()
+SEMANTIC_CONFIG_PATH = resolve_semantic_config_path(PROJECT_ROOT)
 MODEL_CONFIGS = {
     "NOISE_CAPTION": os.path.join(
         PROJECT_ROOT, "models", "noise-cleaner-deberta-v2", "final"
     ),
     "SEMANTIC_MODEL": os.path.join(PROJECT_ROOT, "models", "all-MiniLM-L6-v2"),
+    "SEMANTIC_CONFIG_PATH": SEMANTIC_CONFIG_PATH,
+    # 复用本机已保存的调优结果；校准由界面的 autotune 操作显式触发
+    "AUTOTUNE": "auto",
 }
+# 只检查模型目录 (其余是普通配置项)
+MODEL_PATH_KEYS = ["NOISE_CAPTION", "SEMANTIC_MODEL"]
 
 # 你的 HF 仓库 ID (如果未来需要更新检查，否则可忽略)
 HF_REPO_ID = "gysgzyh/noise-cleaner-deberta-v2"
 
-# === 2. 系统输出重定向 (保持不变) ===
+# === 2. 系统输出 (后台线程统一写出，处理线程只负责入队) ===
 REAL_STDOUT = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
 
 
+class BridgeWriter:
+    """
+    所有发往 Electron 的行都经过这里:
+    序列化在调用方线程完成 (入队的是当时的快照，之后改动字典不影响输出)，
+    写 stdout 在单独的线程里完成，队列保证顺序，管道暂时写不进去时也不会卡住流水线
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        if not isinstance(item, str):
+            try:
+                item = serializer.dumps(item)
+            except Exception as e:
+                # 序列化失败也要发出一行，complete / error 丢了前端会一直等
+                kind = item.get("type") if isinstance(item, dict) else None
+                item = serializer.dumps(
+                    {
+                        "type": "error",
+                        "msg": f"Bridge message ({kind}) not serializable: {e}",
+                    }
+                )
+        self.queue.put(item)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.stream.write(item + "\n")
+                # 队列空了再 flush，连续的日志合并成一次写
+                if self.queue.empty():
+                    self.stream.flush()
+            except Exception as e:
+                # stdout 写不进去 (管道断开等): 记到真正的 stderr，不静默丢弃
+                if sys.__stderr__ is not None:
+                    sys.__stderr__.write(f"bridge write failed ({e}): {item}\n")
+                    sys.__stderr__.flush()
+        self.stream.flush()
+
+    def close(self, timeout=5):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+
+BRIDGE_OUT = BridgeWriter(REAL_STDOUT)
+
+
 class JSONStdout:
     def __init__(self):
         self.buffer = ""
@@ -47,19 +116,14 @@ class JSONStdout:
             self.buffer = ""
 
     def _send_log(self, msg):
-        if not msg.strip():
+        stripped = msg.strip()
+        if not stripped:
             return
-        try:
-            if msg.strip().startswith("{") and msg.strip().endswith("}"):
-                json.loads(msg)
-                REAL_STDOUT.write(msg + "\n")
-                REAL_STDOUT.flush()
-                return
-        except:
-            pass
-        payload = json.dumps({"type": "info", "msg": msg}, ensure_ascii=False)
-        REAL_STDOUT.write(payload + "\n")
-        REAL_STDOUT.flush()
+        # 已经是桥接协议消息的行原样转发 (不再 json.loads 校验)，其余包装成 info
+        if stripped.startswith('{"type":') and stripped.endswith("}"):
+            BRIDGE_OUT.put(stripped)
+            return
+        BRIDGE_OUT.put({"type": "info", "msg": msg})
 
 
 sys.stdout = JSONStdout()
@@ -67,14 +131,101 @@ sys.stderr = JSONStdout()
 
 
 def send_system_json(data):
-    REAL_STDOUT.write(json.dumps(data, ensure_ascii=False) + "\n")
-    REAL_STDOUT.flush()
+    BRIDGE_OUT.put(data)
+
+
+# 日志级别 -> 前端消息类型
+LOG_MSG_TYPES = {logging.ERROR: "err", logging.WARNING: "warn"}
+
+
+class BridgeLogHandler(logging.Handler):
+    """把 pipeline_modules 的分级日志转成前端的 JSON 消息"""
+
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, record):
+        try:
+            send_system_json(
+                {
+                    "type": LOG_MSG_TYPES.get(record.levelno, "info"),
+                    "msg": self.format(record),
+                    "stage": record.name.rsplit(".", 1)[-1],
+                }
+            )
+        except Exception:
+            self.handleError(record)
+
+
+LOGGING_ATTACHED = False
+
+
+def attach_pipeline_logging():
+    """首次 import pipeline_modules 后，把它的日志接到桥接输出上"""
+    global LOGGING_ATTACHED
+    import pipeline_modules
+
+    if not LOGGING_ATTACHED:
+        pipeline_modules.setup_logging(handler=BridgeLogHandler())
+        LOGGING_ATTACHED = True
+    return pipeline_modules
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def start_watch(pipeline, in_dir, recursive=False):
+    global WATCH_THREAD
+    WATCH_STOP.clear()
+
+    def run():
+        try:
+            totals = pipeline.watch(
+                in_dir,
+                recursive=recursive,
+                stop_event=WATCH_STOP,
+                on_summary=lambda summary: send_system_json(
+                    {"type": "watch-batch", "data": summary}
+                ),
+            )
+            send_system_json({"type": "watch-stopped", "data": totals})
+        except Exception:
+            send_system_json(
+                {"type": "err", "msg": f"Watch Error:\n{traceback.format_exc()}"}
+            )
+
+    WATCH_THREAD = threading.Thread(target=run, daemon=True)
+    WATCH_THREAD.start()
+
+
+def stop_watch():
+    global WATCH_THREAD
+    if WATCH_THREAD is not None:
+        WATCH_STOP.set()
+        WATCH_THREAD.join()
+        WATCH_THREAD = None
+
+
+def release_resident_pipeline():
+    global RESIDENT_PIPELINE
+    stop_watch()
+    if RESIDENT_PIPELINE is not None:
+        try:
+            RESIDENT_PIPELINE.dispose()
+        except:
+            pass
+        RESIDENT_PIPELINE = None
 
 
 def check_all_models_exist():
     missing = []
-    for name, path in MODEL_CONFIGS.items():
-        if not os.path.exists(path):
+    for name in MODEL_PATH_KEYS:
+        if not os.path.exists(MODEL_CONFIGS[name]):
             missing.append(f"{name}")
     return (len(missing) == 0), missing
 
@@ -138,7 +289,7 @@ def main():
         try:
             if not line.strip():
                 continue
-            request = json.loads(line)
+            request = serializer.loads(line)
             action = request.get("action")
 
             if action == "check-model":
@@ -163,13 +314,11 @@ def main():
             elif action == "start":
                 from pipeline_modules import DeviceManager
 
-                global CorpusPipelineClass
+                global CorpusPipelineClass, RESIDENT_PIPELINE
                 if CorpusPipelineClass is None:
                     send_system_json({"type": "info", "msg": "Loading AI Core..."})
                     try:
-                        from pipeline_modules import CorpusPipeline
-
-                        CorpusPipelineClass = CorpusPipeline
+                        CorpusPipelineClass = attach_pipeline_logging().CorpusPipeline
                     except ImportError as e:
                         send_system_json(
                             {
@@ -185,21 +334,44 @@ def main():
                     send_system_json({"type": "err", "msg": f"Missing: {missing}"})
                     send_system_json({"type": "sys", "status": "done"})
                     continue
+                if WATCH_THREAD is not None:
+                    send_system_json(
+                        {
+                            "type": "err",
+                            "msg": "Folder watch is running, stop it first.",
+                        }
+                    )
+                    send_system_json({"type": "sys", "status": "done"})
+                    continue
 
                 in_dir = request.get("inputPath")
                 out_dir = request.get("outputPath")
 
                 # 从前端请求中获取 recursive 参数 (默认为 False)
                 is_recursive = request.get("recursive", False)
+                # 可选: 采样分析 (true / 前 N 篇 / {"docs", "interval_ms", "format"})
+                profile = request.get("profile")
+                # 可选: inputPath 为 zip / tar 压缩包时，输出也可以写成 .zip
+                output_archive = request.get("outputArchive")
+                # 可选: 语料目录筛选 {"date_from", "date_to", "sources", "unprocessed", ...}
+                catalog_query = request.get("catalogQuery")
 
                 try:
-                    send_system_json(
-                        {
-                            "type": "info",
-                            "msg": f"Initializing Pipeline with configs: {MODEL_CONFIGS}",
-                        }
-                    )
-                    pipeline = CorpusPipelineClass(MODEL_CONFIGS)
+                    if RESIDENT_PIPELINE is None:
+                        send_system_json(
+                            {
+                                "type": "info",
+                                "msg": f"Initializing Pipeline with configs: {MODEL_CONFIGS}",
+                            }
+                        )
+                        RESIDENT_PIPELINE = CorpusPipelineClass(MODEL_CONFIGS)
+                    else:
+                        send_system_json(
+                            {"type": "info", "msg": "Reusing resident pipeline."}
+                        )
+                        # 规则可能在两次运行之间被修改过
+                        RESIDENT_PIPELINE.semantic_filter.reload_if_changed(force=True)
+                    pipeline = RESIDENT_PIPELINE
 
                     def electron_callback(current, total, message):
                         try:
@@ -216,11 +388,14 @@ def main():
                             "msg": f"Pipeline Started... (Recursive: {is_recursive})",
                         }
                     )
-                    pipeline.process_folder(
+                    summary = pipeline.process_folder(
                         in_dir,
                         out_dir,
                         recursive=is_recursive,
                         progress_callback=electron_callback,
+                        profile=profile,
+                        output_archive=output_archive,
+                        query=catalog_query,
                     )
 
                     send_system_json(
@@ -230,6 +405,8 @@ def main():
                             "status": "done",
                             "progress": 100,
                             "resultPath": out_dir,
+                            "latency": summary.get("latency"),
+                            "profile": summary.get("profile"),
                         }
                     )
 
@@ -241,17 +418,74 @@ def main():
                         }
                     )
                     send_system_json({"type": "sys", "status": "done"})
+                    # 出错后状态不可信，释放常驻流水线，下次重新加载
+                    release_resident_pipeline()
                 finally:
-                    if "pipeline" in locals() and pipeline:
-                        try:
-                            pipeline.dispose()
-                            del pipeline
-                        except:
-                            pass
                     import gc
 
                     gc.collect()
 
+            elif action == "release-pipeline":
+                release_resident_pipeline()
+                send_system_json({"type": "success", "msg": "Models released."})
+
+            elif action == "watch-start":
+                # 守护模式: 模型常驻，投放目录里新到 / 修改过的 RTF 几秒内处理完
+                if WATCH_THREAD is not None:
+                    send_system_json({"type": "warn", "msg": "Already watching."})
+                    continue
+                all_exist, missing = check_all_models_exist()
+                if not all_exist:
+                    send_system_json({"type": "err", "msg": f"Missing: {missing}"})
+                    continue
+                in_dir = request.get("inputPath")
+                try:
+                    if RESIDENT_PIPELINE is None:
+                        CorpusPipeline = attach_pipeline_logging().CorpusPipeline
+                        RESIDENT_PIPELINE = CorpusPipeline(MODEL_CONFIGS)
+                    start_watch(
+                        RESIDENT_PIPELINE, in_dir, request.get("recursive", False)
+                    )
+                    send_system_json({"type": "success", "msg": f"Watching: {in_dir}"})
+                except Exception as e:
+                    send_system_json({"type": "err", "msg": f"Watch Error: {e}"})
+
+            elif action == "watch-stop":
+                stop_watch()
+                send_system_json({"type": "success", "msg": "Folder watch stopped."})
+
+            elif action == "autotune":
+                # 按需重新校准 (换了硬件 / 驱动后使用)
+                try:
+                    all_exist, missing = check_all_models_exist()
+                    if not all_exist:
+                        send_system_json({"type": "err", "msg": f"Missing: {missing}"})
+                        continue
+                    if RESIDENT_PIPELINE is None:
+                        CorpusPipeline = attach_pipeline_logging().CorpusPipeline
+                        RESIDENT_PIPELINE = CorpusPipeline(
+                            {**MODEL_CONFIGS, "AUTOTUNE": "calibrate"}
+                        )
+                        profile = RESIDENT_PIPELINE.tuned_profile
+                    else:
+                        profile = RESIDENT_PIPELINE.autotune()
+                    send_system_json({"type": "autotune", "data": profile})
+                except Exception as e:
+                    send_system_json({"type": "err", "msg": f"Autotune Error: {e}"})
+
+            elif action == "set-log-level":
+                # {"level": "DEBUG", "stage": "ner"}; stage 省略时调整全部阶段
+                try:
+                    pipeline_modules = attach_pipeline_logging()
+                    name, level = pipeline_modules.set_log_level(
+                        request.get("level", "INFO"), request.get("stage")
+                    )
+                    send_system_json(
+                        {"type": "success", "msg": f"Log level of {name}: {level}"}
+                    )
+                except Exception as e:
+                    send_system_json({"type": "err", "msg": f"Log Level Error: {e}"})
+
             elif action == "get-semantic-config":
                 try:
                     # 1. 定义默认配置 (作为兜底，防止文件不存在时界面空白)
@@ -280,19 +514,12 @@ def main():
                         ],
                     }
 
-                    # 2. 定位文件路径
-                    base_dir = CURRENT_DIR
-
-                    possible_paths = [
-                        os.path.join(base_dir, "css-interface", "semantic_config.json"),
-                        os.path.join(base_dir, "semantic_config.json"),
-                    ]
-
-                    target_path = None
-                    for p in possible_paths:
-                        if os.path.exists(p):
-                            target_path = p
-                            break
+                    # 2. 定位文件路径 (与流水线读取的是同一个文件)
+                    target_path = (
+                        SEMANTIC_CONFIG_PATH
+                        if os.path.exists(SEMANTIC_CONFIG_PATH)
+                        else None
+                    )
 
                     # 3. 读取逻辑
                     final_data = default_config  # 先设为默认值
@@ -308,20 +535,9 @@ def main():
                                 {"type": "err", "msg": f"Config Corrupted: {e}"}
                             )
                     else:
-                        # 如果文件完全不存在，自动创建一个 (默认放在 css-interface 下)
-                        # 尝试找到存在的文件夹路径
-                        folder_path = os.path.join(base_dir, "css-interface")
-                        if not os.path.exists(folder_path):
-                            folder_path = (
-                                base_dir  # 如果 css-interface 文件夹不存在，就存根目录
-                            )
-
-                        save_path = os.path.join(folder_path, "semantic_config.json")
+                        # 如果文件完全不存在，自动创建一个
                         try:
-                            with open(save_path, "w", encoding="utf-8") as f:
-                                json.dump(
-                                    default_config, f, indent=2, ensure_ascii=False
-                                )
+                            write_json_atomic(SEMANTIC_CONFIG_PATH, default_config)
                         except:
                             pass
 
@@ -338,36 +554,28 @@ def main():
                 try:
                     new_config = request.get("config")
 
-                    base_dir = os.path.dirname(os.path.abspath(__file__))
-
-                    # 优先保存到 css-interface
-                    # 如果该文件夹存在，就保存进去；否则保存到当前目录
-                    if os.path.exists(os.path.join(base_dir, "css-interface")):
-                        save_path = os.path.join(
-                            base_dir, "css-interface", "semantic_config.json"
-                        )
-                    elif os.path.exists(os.path.join(base_dir, "css_interface")):
-                        save_path = os.path.join(
-                            base_dir, "css_interface", "semantic_config.json"
-                        )
-                    else:
-                        save_path = os.path.join(base_dir, "semantic_config.json")
+                    # 原子写入: 正在运行的流水线不会读到写了一半的文件
+                    write_json_atomic(SEMANTIC_CONFIG_PATH, new_config)
 
-                    with open(save_path, "w", encoding="utf-8") as f:
-                        json.dump(new_config, f, indent=2, ensure_ascii=False)
-
-                    send_system_json(
-                        {"type": "success", "msg": "Semantic Rules Saved!"}
-                    )
+                    msg = "Semantic Rules Saved!"
+                    if RESIDENT_PIPELINE is not None:
+                        # 常驻模型直接热更新，只重新计算改动过的概念
+                        semantic_filter = RESIDENT_PIPELINE.semantic_filter
+                        semantic_filter.reload_if_changed(force=True)
+                        msg += f" Applied (rules {semantic_filter.rules.version})."
+                    send_system_json({"type": "success", "msg": msg})
                 except Exception as e:
                     send_system_json(
                         {"type": "err", "msg": f"Failed to save config: {e}"}
                     )
             elif action == "get-system-info":
                 try:
-                    from pipeline_modules import DeviceManager
+                    from pipeline_modules import DeviceManager, HardwareAutotuner
 
                     device_str, info = DeviceManager.get_optimal_device()
+                    autotuner = HardwareAutotuner(
+                        MODEL_CONFIGS.get("CACHE_DIR"), device_str
+                    )
                     full_path = MODEL_CONFIGS.get("NOISE_CAPTION", "")
                     model_display_name = "Unknown Model"
                     if full_path:
@@ -385,6 +593,9 @@ def main():
                                 "device": device_str,
                                 "details": info,
                                 "active_model": model_display_name,
+                                "hardware": autotuner.hardware_info(),
+                                "tuned_profile": autotuner.load(),
+                                "threads_in_effect": HardwareAutotuner.threads_in_effect(),
                             },
                         }
                     )
@@ -396,6 +607,12 @@ def main():
         except Exception as e:
             send_system_json({"type": "err", "msg": f"Bridge Error: {str(e)}"})
 
+    # 3. stdin 关闭: 写完队列里剩余的日志和消息再退出
+    stop_watch()
+    if LOGGING_ATTACHED:
+        sys.modules["pipeline_modules"].shutdown_logging()
+    BRIDGE_OUT.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,147 @@
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from corpus_logging import get_logger
+from file_discovery import FileEntry
+
+
+# ==========================================================
+# 压缩包输入 / 输出: zip / tar 当作输入目录读取，输出打包成 zip (不解压到磁盘)
+# ==========================================================
+class RTFArchive:
+    """
+    把 zip / tar 压缩包当作输入目录:
+    成员映射为虚拟路径 <压缩包路径>/<成员目录>/<文件名>，文件夹 / 话题模式 /
+    输出目录的规则与磁盘上的目录完全相同；成员按需读成字节交给 RTFHandler
+    - zip: 中央目录直接给出成员列表，可以随机读取 (支持按大小排程)
+    - tar (.tar/.tar.gz/.tgz/.tar.bz2/.tar.xz): 压缩的 tar 不能高效地往回 seek，
+      列目录一遍 (只读头部)，之后按包内顺序读取
+    """
+
+    log = get_logger("pipeline")
+
+    SUFFIXES = (
+        ".zip",
+        ".tar",
+        ".tar.gz",
+        ".tgz",
+        ".tar.bz2",
+        ".tbz2",
+        ".tar.xz",
+        ".txz",
+    )
+
+    def __init__(self, path):
+        self.path = os.path.normpath(path)
+        self.kind = "zip" if path.lower().endswith(".zip") else "tar"
+        if self.kind == "zip":
+            self.handle = zipfile.ZipFile(self.path)
+        else:
+            self.handle = tarfile.open(self.path, "r:*")
+        self.members = {}  # 虚拟路径 -> ZipInfo / TarInfo
+        self.random_access = self.kind == "zip"
+        # 未指定输出目录时: data/bundle.tar.gz -> data/bundle_output/
+        stem = self.path
+        for suffix in self.SUFFIXES:
+            if stem.lower().endswith(suffix):
+                stem = stem[: -len(suffix)]
+                break
+        self.default_output_root = stem + "_output"
+
+    @classmethod
+    def is_archive(cls, path):
+        return os.path.isfile(path) and path.lower().endswith(cls.SUFFIXES)
+
+    def scan(self, recursive=True):
+        """返回 RTF 成员的 FileEntry 列表 (包内顺序)；recursive=False 时只取顶层"""
+        self.log.info(f"🗜️ Scanning archive: {self.path}")
+        if self.kind == "zip":
+            infos = [
+                (i.filename, i.file_size, time.mktime(i.date_time + (0, 0, -1)), i)
+                for i in self.handle.infolist()
+                if not i.is_dir()
+            ]
+        else:
+            infos = [
+                (i.name, i.size, float(i.mtime), i)
+                for i in self.handle.getmembers()
+                if i.isfile()
+            ]
+
+        entries = []
+        for name, size, mtime, info in infos:
+            parts = [
+                p for p in name.replace("\\", "/").split("/") if p not in ("", ".")
+            ]
+            # 跳过绝对路径 / ".." 成员 (输出目录按成员路径镜像，不能逃出输出根目录)
+            if not parts or ".." in parts or name.startswith("/"):
+                self.log.warning(f"⚠️ Skipping unsafe archive member: {name}")
+                continue
+            if not parts[-1].lower().endswith(".rtf"):
+                continue
+            if not recursive and len(parts) > 1:
+                continue
+            path = os.path.join(self.path, *parts)
+            self.members[path] = info
+            entries.append(FileEntry(path, size, mtime))
+        return entries
+
+    def read(self, path):
+        """虚拟路径 -> 成员字节；损坏的成员记录错误并返回空 (按空文档处理)"""
+        info = self.members[path]
+        try:
+            if self.kind == "zip":
+                return self.handle.read(info)
+            return self.handle.extractfile(info).read()
+        except Exception as e:
+            self.log.error(f"❌ Archive member unreadable {path}: {e}")
+            return b""
+
+    def close(self):
+        self.handle.close()
+
+
+class ArchiveOutput:
+    """
+    把输出写回 zip: 每个文件夹照常写到暂存目录 (审查库需要可随机写的文件)，
+    文件夹结束后立即打包进压缩包并删除，磁盘上同时只留正在写的文件夹
+    先写 <目标>.tmp，关闭时原子替换
+    """
+
+    log = get_logger("pipeline")
+
+    def __init__(self, archive_path, staging_dir=None):
+        self.archive_path = archive_path
+        self.temporary = staging_dir is None
+        if self.temporary:
+            staging_dir = tempfile.mkdtemp(
+                prefix=".staging_", dir=os.path.dirname(os.path.abspath(archive_path))
+            )
+        self.staging_dir = staging_dir
+        self.tmp_path = archive_path + ".tmp"
+        self.zip = zipfile.ZipFile(self.tmp_path, "w", zipfile.ZIP_DEFLATED)
+        self.files = 0
+
+    def add_folder(self, folder, remove=True):
+        """把暂存目录下的一个文件夹打包 (并删除)"""
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                arcname = os.path.relpath(path, self.staging_dir).replace(os.sep, "/")
+                self.zip.write(path, arcname)
+                self.files += 1
+        if remove:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def close(self):
+        """打包暂存目录里剩下的内容 (导出分片 / 分析结果等)，返回统计"""
+        if os.path.isdir(self.staging_dir):
+            self.add_folder(self.staging_dir, remove=self.temporary)
+        self.zip.close()
+        os.replace(self.tmp_path, self.archive_path)
+        self.log.info(f"🗜️ Wrote {self.files} files to: {self.archive_path}")
+        return {"path": self.archive_path, "files": self.files}
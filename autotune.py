@@ -0,0 +1,268 @@
+import os
+import json
+import math
+import time
+import hashlib
+import platform
+
+import psutil
+import torch
+
+from corpus_logging import get_logger
+
+# ==========================================================
+# 硬件自动调优: torch 线程数 / 批大小 / 解析进程数，结果按机器保存
+# ==========================================================
+# 未指定 CACHE_DIR 时，调优结果等跨运行的数据放在这里
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "nlp-corpus-pipeline"
+)
+
+
+class HardwareAutotuner:
+    """
+    根据 psutil 的核数/内存信息和一次简短实测，选择
+    torch 线程数、DeBERTa / MiniLM 批大小、RTF 解析进程数，使 docs/sec 最大
+    结果按机器保存为 JSON，下次启动直接读取
+    """
+
+    log = get_logger("autotune")
+
+    TUNED_KEYS = [
+        "NER_BATCH_SIZE",
+        "SEMANTIC_BATCH_SIZE",
+        "NUM_WORKERS",
+        "TORCH_THREADS",
+        "TORCH_INTEROP_THREADS",
+    ]
+
+    # 校准用的代表性段落 (新闻正文 + 常见噪音，长短混合)
+    SAMPLE_PARAGRAPHS = [
+        "China and Malaysia agreed on Monday to deepen cooperation in trade, "
+        "infrastructure and maritime security during talks in Beijing.",
+        "PHOTO: Reuters",
+        "The foreign ministry spokesperson said both sides had reached a broad "
+        "consensus on the Belt and Road projects, adding that further details would "
+        "be announced after the summit. Analysts said the agreement reflected "
+        "growing economic ties between the two countries over the past decade.",
+        "READ MORE: Sign up for our newsletter to get the latest updates.",
+        "Officials declined to comment on the timeline.",
+    ]
+    # 估算单篇文章包含的段落数 (把段落吞吐换算成文章吞吐)
+    PARAGRAPHS_PER_DOC = 10
+
+    def __init__(self, cache_dir=None, device="cpu"):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.device = device
+
+    @staticmethod
+    def hardware_info():
+        vm = psutil.virtual_memory()
+        logical = psutil.cpu_count() or 1
+        return {
+            "physical_cores": psutil.cpu_count(logical=False) or logical,
+            "logical_cores": logical,
+            "memory_gb": round(vm.total / 1024**3, 1),
+            "available_gb": round(vm.available / 1024**3, 1),
+            "processor": platform.processor() or platform.machine(),
+            "node": platform.node(),
+        }
+
+    def machine_key(self):
+        hw = self.hardware_info()
+        raw = (
+            f"{hw['node']}|{hw['processor']}|{hw['physical_cores']}|"
+            f"{hw['logical_cores']}|{hw['memory_gb']}|{self.device}"
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    @property
+    def profile_path(self):
+        return os.path.join(self.cache_dir, "autotune", f"{self.machine_key()}.json")
+
+    # ---------- 启发式 (校准前的起点) ----------
+    def heuristic_profile(self):
+        hw = self.hardware_info()
+        cores = hw["physical_cores"]
+        if self.device == "cpu":
+            # 大机器上多开几个解析进程，剩下的核给 torch
+            workers = 1 if cores < 8 else min(8, cores // 8)
+            threads = max(1, cores - (workers if workers > 1 else 0))
+            ner_batch, sem_batch = 16, 32
+        else:
+            # GPU 推理时 CPU 主要负责解析和分词
+            workers = min(4, max(1, cores // 4))
+            threads = max(1, min(4, cores - workers))
+            ner_batch, sem_batch = 64, 128
+        if hw["available_gb"] < 4:
+            ner_batch, sem_batch = min(ner_batch, 8), min(sem_batch, 16)
+        return {
+            "NER_BATCH_SIZE": ner_batch,
+            "SEMANTIC_BATCH_SIZE": sem_batch,
+            "NUM_WORKERS": workers,
+            "TORCH_THREADS": threads,
+            "TORCH_INTEROP_THREADS": 1 if workers > 1 else min(2, threads),
+            "source": "heuristic",
+        }
+
+    # ---------- 持久化 ----------
+    def load(self):
+        if not os.path.exists(self.profile_path):
+            return None
+        try:
+            with open(self.profile_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            self.log.warning(f"⚠️ Autotune profile unreadable ({e}), ignoring.")
+            return None
+
+    def save(self, profile):
+        try:
+            os.makedirs(os.path.dirname(self.profile_path), exist_ok=True)
+            with open(self.profile_path, "w", encoding="utf-8") as f:
+                json.dump(profile, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            self.log.error(f"❌ Failed to save autotune profile: {e}")
+
+    # ---------- 应用 ----------
+    @classmethod
+    def merge(cls, model_configs, profile):
+        """调优结果只填补用户没有显式指定的参数"""
+        merged = dict(model_configs)
+        for key in cls.TUNED_KEYS:
+            if merged.get(key) is None and key in profile:
+                merged[key] = profile[key]
+        return merged
+
+    @staticmethod
+    def threads_in_effect():
+        """torch 当前实际使用的线程数 (与配置 / 调优结果可能不同)"""
+        return {
+            "TORCH_THREADS": torch.get_num_threads(),
+            "TORCH_INTEROP_THREADS": torch.get_num_interop_threads(),
+        }
+
+    @classmethod
+    def apply_threads(cls, configs):
+        """应用线程数配置，返回实际生效的值"""
+        threads = configs.get("TORCH_THREADS")
+        if threads:
+            torch.set_num_threads(int(threads))
+        interop = configs.get("TORCH_INTEROP_THREADS")
+        if interop and int(interop) != torch.get_num_interop_threads():
+            try:
+                # 只能在第一次并行计算之前设置
+                torch.set_num_interop_threads(int(interop))
+            except RuntimeError:
+                cls.log.warning(
+                    f"⚠️ Cannot set interop threads to {interop} after parallel "
+                    f"work has started; keeping {torch.get_num_interop_threads()}."
+                )
+        if (configs.get("NUM_WORKERS") or 1) > 1:
+            # 多进程解析时关闭 tokenizers 的 Rust 线程池，避免核数超售
+            os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        return cls.threads_in_effect()
+
+    # ---------- 校准 ----------
+    @staticmethod
+    def _measure(fn, n_items, min_seconds=0.5):
+        """重复执行 fn 直到超过 min_seconds，返回 items/sec"""
+        fn()  # 预热
+        start = time.perf_counter()
+        rounds = 0
+        while True:
+            fn()
+            rounds += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                return rounds * n_items / elapsed
+
+    def calibrate(self, cleaner, semantic_filter, parse_rtf):
+        """
+        在已加载的模型上实测，返回新的调优结果 (约 10-20 秒)
+        parse_rtf: RTF 字节 -> 纯文本 (RTFHandler.bytes_to_text)，用来估算解析速度
+        """
+        self.log.info("⏱️ Autotune: calibrating threads and batch sizes...")
+        hw = self.hardware_info()
+        base = self.heuristic_profile()
+        measured = {}
+
+        if self.device == "cpu":
+            thread_candidates = sorted(
+                {base["TORCH_THREADS"], max(1, base["TORCH_THREADS"] // 2)},
+                reverse=True,
+            )
+            ner_candidates, sem_candidates = [8, 16, 32], [16, 32, 64]
+        else:
+            thread_candidates = [base["TORCH_THREADS"]]
+            ner_candidates, sem_candidates = [32, 64, 128], [64, 128, 256]
+
+        # 1. DeBERTa: 线程数 x 批大小
+        best_ner = (0.0, base["TORCH_THREADS"], base["NER_BATCH_SIZE"])
+        old_batch = cleaner.batch_size
+        if cleaner.model is not None:
+            for threads in thread_candidates:
+                torch.set_num_threads(threads)
+                for batch in ner_candidates:
+                    cleaner.batch_size = batch
+                    paras = (self.SAMPLE_PARAGRAPHS * batch)[: batch * 2]
+                    rate = self._measure(
+                        lambda: cleaner._predict_noise_masks(paras), len(paras)
+                    )
+                    measured[f"ner_t{threads}_b{batch}"] = round(rate, 1)
+                    if rate > best_ner[0]:
+                        best_ner = (rate, threads, batch)
+        cleaner.batch_size = old_batch
+        torch.set_num_threads(best_ner[1])
+
+        # 2. MiniLM: 批大小
+        best_sem = (0.0, base["SEMANTIC_BATCH_SIZE"])
+        docs = [" ".join(self.SAMPLE_PARAGRAPHS)] * max(sem_candidates)
+        for batch in sem_candidates:
+            rate = self._measure(
+                lambda: semantic_filter.model.encode(docs[:batch], batch_size=batch),
+                batch,
+            )
+            measured[f"sem_b{batch}"] = round(rate, 1)
+            if rate > best_sem[0]:
+                best_sem = (rate, batch)
+
+        # 3. RTF 解析速度 -> 需要几个解析进程才能喂饱模型
+        rtf = (
+            "{\\rtf1\\ansi "
+            + "\\par\n".join(self.SAMPLE_PARAGRAPHS * self.PARAGRAPHS_PER_DOC)
+            + "}"
+        ).encode("cp1252")
+        parse_rate = self._measure(lambda: parse_rtf(rtf), 1)
+        model_doc_rate = best_ner[0] / self.PARAGRAPHS_PER_DOC if best_ner[0] else 0
+        measured["parse_docs_per_sec"] = round(parse_rate, 1)
+        measured["model_docs_per_sec"] = round(model_doc_rate, 1)
+
+        workers = 1
+        if model_doc_rate > parse_rate:
+            workers = min(
+                max(1, hw["physical_cores"] // 2),
+                int(math.ceil(model_doc_rate * 1.5 / parse_rate)),
+            )
+        threads = best_ner[1]
+        if self.device == "cpu" and workers > 1:
+            threads = max(1, min(threads, hw["physical_cores"] - workers))
+
+        profile = {
+            "NER_BATCH_SIZE": best_ner[2],
+            "SEMANTIC_BATCH_SIZE": best_sem[1],
+            "NUM_WORKERS": workers,
+            "TORCH_THREADS": threads,
+            "TORCH_INTEROP_THREADS": 1 if workers > 1 else min(2, threads),
+            "source": "calibrated",
+            "device": self.device,
+            "machine": self.machine_key(),
+            "hardware": hw,
+            "measured": measured,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.log.info(
+            f"✅ Autotune: threads={threads}, ner_batch={best_ner[2]}, "
+            f"semantic_batch={best_sem[1]}, workers={workers}"
+        )
+        return profile
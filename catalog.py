@@ -0,0 +1,287 @@
+import os
+import time
+import sqlite3
+import hashlib
+import datetime
+
+from autotune import DEFAULT_CACHE_DIR
+from corpus_logging import get_logger
+
+
+# ==========================================================
+# 语料目录: SQLite 记录每个文件的元数据 / 关键词门结果 / 处理状态，
+# process_folder 的筛选条件在解析和推理之前下推成 SQL
+# ==========================================================
+class CorpusCatalog:
+    """
+    记录每个发现过的文件: 路径、大小、mtime、内容哈希、元数据 (标题 / 日期 / 来源)、
+    关键词门结果和处理状态，增量更新 (大小或 mtime 变化的文件清空派生字段；
+    关键词门规则变化后，按门筛选时重新索引 gate_version 不一致的文件)
+    process_folder 的 query (日期范围 / 来源 / 只处理未处理过的) 在解析和推理之前
+    用 SQL 筛掉文件；元数据只在文件第一次出现或变化后解析一次
+    """
+
+    log = get_logger("pipeline")
+
+    SCHEMA_VERSION = 2
+    # 旧版本库原地升级时补上的列 (不丢已有的处理状态)
+    MIGRATIONS = {1: ["ALTER TABLE documents ADD COLUMN gate_version TEXT"]}
+
+    # 文件变化时清空的派生字段
+    DERIVED = (
+        "content_hash",
+        "title",
+        "date",
+        "date_iso",
+        "source",
+        "topic_mode",
+        "gate_passed",
+        "gate_reason",
+        "gate_version",
+        "indexed_at",
+        "status",
+        "rules_version",
+        "processed_at",
+    )
+
+    # query 里需要元数据 (首次要解析) 的条件
+    INDEXED_FILTERS = ("date_from", "date_to", "sources", "gate")
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version in self.MIGRATIONS:
+            for statement in self.MIGRATIONS[version]:
+                self.conn.execute(statement)
+        elif version != self.SCHEMA_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS documents")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                content_hash TEXT,
+                title TEXT,
+                date TEXT,
+                date_iso TEXT,
+                source TEXT COLLATE NOCASE,
+                topic_mode TEXT,
+                gate_passed INTEGER,
+                gate_reason TEXT,
+                gate_version TEXT,
+                indexed_at REAL,
+                status TEXT,
+                rules_version TEXT,
+                processed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_date ON documents (date_iso);
+            CREATE INDEX IF NOT EXISTS idx_source ON documents (source);
+            CREATE INDEX IF NOT EXISTS idx_status ON documents (status);
+            """)
+        self.conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self.conn.commit()
+
+    @staticmethod
+    def default_path(cache_dir, input_dir, recursive=False):
+        """每个输入目录 (+ 是否递归) 一个数据库，与监视状态的命名方式相同"""
+        key = hashlib.sha1(
+            f"{os.path.abspath(input_dir)}|{recursive}".encode("utf-8")
+        ).hexdigest()
+        return os.path.join(
+            cache_dir or DEFAULT_CACHE_DIR, "catalog", f"{key[:12]}.sqlite"
+        )
+
+    @staticmethod
+    def iso_date(date):
+        """MetaExtractor 的 "12 March 2021" -> "2021-03-12"，无法识别时返回 None"""
+        try:
+            return (
+                datetime.datetime.strptime(date.strip(), "%d %B %Y").date().isoformat()
+            )
+        except (AttributeError, ValueError):
+            return None
+
+    def sync(self, entries, input_dir=None, recursive=False):
+        """
+        合并一次扫描结果 (FileEntry 列表): 新文件插入，变化的文件清空派生字段
+        给出 input_dir 时，删除该范围内已经不存在的文件
+        返回 {"added", "changed", "removed"}
+        """
+        known = {
+            path: (size, mtime)
+            for path, size, mtime in self.conn.execute(
+                "SELECT path, size, mtime FROM documents"
+            )
+        }
+        added, changed = [], []
+        for entry in entries:
+            old = known.pop(entry.path, None)
+            if old is None:
+                added.append(entry)
+            elif old != (entry.size, entry.mtime):
+                changed.append(entry)
+
+        removed = []
+        if input_dir is not None:
+            root = os.path.normpath(input_dir)
+            for path in known:
+                folder = os.path.dirname(path)
+                if folder == root or (
+                    recursive and folder.startswith(os.path.join(root, ""))
+                ):
+                    removed.append(path)
+
+        reset = ", ".join(f"{column} = NULL" for column in self.DERIVED)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO documents (path, folder, size, mtime) VALUES (?, ?, ?, ?)",
+                [(e.path, os.path.dirname(e.path), e.size, e.mtime) for e in added],
+            )
+            self.conn.executemany(
+                f"UPDATE documents SET size = ?, mtime = ?, {reset} WHERE path = ?",
+                [(e.size, e.mtime, e.path) for e in changed],
+            )
+            self.conn.executemany(
+                "DELETE FROM documents WHERE path = ?", [(p,) for p in removed]
+            )
+        return {"added": len(added), "changed": len(changed), "removed": len(removed)}
+
+    def unindexed(self, paths, gate_version=None):
+        """
+        paths 中还没有元数据的文件；给出 gate_version 时，
+        关键词门结果来自其他版本规则的文件也算 (需要重新索引)
+        """
+        sql = "SELECT path FROM documents WHERE indexed_at IS NULL"
+        params = []
+        if gate_version is not None:
+            sql += " OR gate_version IS NOT ?"
+            params.append(gate_version)
+        stale = {path for (path,) in self.conn.execute(sql, params)}
+        return [path for path in paths if path in stale]
+
+    def update_index(self, rows):
+        """写入 _catalog_fields 的结果"""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE documents SET content_hash = ?, title = ?, date = ?, "
+                "date_iso = ?, source = ?, topic_mode = ?, gate_passed = ?, "
+                "gate_reason = ?, gate_version = ?, indexed_at = ? WHERE path = ?",
+                [
+                    (
+                        row["content_hash"],
+                        row["title"],
+                        row["date"],
+                        self.iso_date(row["date"]),
+                        row["source"],
+                        row["topic_mode"],
+                        row["gate_passed"],
+                        row["gate_reason"],
+                        row["gate_version"],
+                        now,
+                        row["path"],
+                    )
+                    for row in rows
+                ],
+            )
+
+    def record_results(self, records, rules_version=None, gate_version=None):
+        """流水线处理结果: 状态、关键词门结果；保留的文章同时更新元数据"""
+        now = time.time()
+        rows = []
+        for record in records:
+            meta = record.get("meta") or {}
+            date = meta.get("date")
+            gate_passed = (
+                None
+                if record["status"] == "empty"
+                else int(record["status"] != "gate_skipped")
+            )
+            rows.append(
+                (
+                    record["status"],
+                    record.get("rules_version") or rules_version,
+                    now,
+                    record["topic_mode"],
+                    record.get("gate_reason"),
+                    gate_passed,
+                    gate_version if gate_passed is not None else None,
+                    meta.get("title"),
+                    date,
+                    self.iso_date(date) if date else None,
+                    meta.get("source"),
+                    record["path"],
+                )
+            )
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE documents SET status = ?, rules_version = ?, processed_at = ?, "
+                "topic_mode = ?, gate_reason = COALESCE(?, gate_reason), "
+                "gate_passed = COALESCE(?, gate_passed), "
+                "gate_version = COALESCE(?, gate_version), "
+                "title = COALESCE(?, title), date = COALESCE(?, date), "
+                "date_iso = COALESCE(?, date_iso), source = COALESCE(?, source) "
+                "WHERE path = ?",
+                rows,
+            )
+
+    @classmethod
+    def needs_index(cls, query):
+        return any(query.get(key) for key in cls.INDEXED_FILTERS)
+
+    def select(self, query):
+        """
+        query: {"date_from": "YYYY-MM-DD", "date_to": "YYYY-MM-DD",
+                "sources": [...] (不区分大小写), "gate": "passed" | "skipped",
+                "unprocessed": True, "status": [...]}
+        返回满足全部条件的路径集合 (日期无法识别的文章不满足日期条件)
+        """
+        where, params = [], []
+        for key, op in (("date_from", ">="), ("date_to", "<=")):
+            if query.get(key):
+                where.append(f"date_iso {op} ?")
+                params.append(datetime.date.fromisoformat(query[key]).isoformat())
+        if query.get("sources"):
+            sources = list(query["sources"])
+            where.append(f"source IN ({', '.join('?' * len(sources))})")
+            params.extend(sources)
+        if query.get("gate"):
+            if query["gate"] not in ("passed", "skipped"):
+                raise ValueError(f"Unknown gate filter: {query['gate']}")
+            where.append("gate_passed = ?")
+            params.append(int(query["gate"] == "passed"))
+        if query.get("unprocessed"):
+            where.append("status IS NULL")
+        if query.get("status"):
+            statuses = list(query["status"])
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        sql = "SELECT path FROM documents"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return {path for (path,) in self.conn.execute(sql, params)}
+
+    def report(self):
+        counts = dict(
+            self.conn.execute(
+                "SELECT COALESCE(status, 'unprocessed'), COUNT(*) FROM documents "
+                "GROUP BY 1"
+            ).fetchall()
+        )
+        indexed = self.conn.execute(
+            "SELECT COUNT(*) FROM documents WHERE indexed_at IS NOT NULL"
+        ).fetchone()[0]
+        return {
+            "path": self.db_path,
+            "documents": sum(counts.values()),
+            "indexed": indexed,
+            "status": counts,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,653 @@
+import sys
+import os
+import argparse
+import datetime
+import contextlib
+import signal
+import threading
+import traceback
+
+# ==========================================================
+# 无界面批处理入口 (服务器 / 集群调度 / cron)
+# 用法: python cli.py <input_dir> [options]
+# 运行日志写到 stderr，最终统计以单行 JSON 写到 stdout
+# ==========================================================
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+import serializer
+
+# 退出码 (供调度器判断)
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_MODELS_MISSING = 3
+EXIT_NO_INPUT = 4
+
+# 可以直接作为输入的压缩包 (与 RTFArchive.SUFFIXES 一致；参数检查时还不导入 torch)
+ARCHIVE_SUFFIXES = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+
+
+def parse_iso_date(value):
+    """YYYY-MM-DD"""
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+
+
+def parse_shard(value):
+    """解析 "i/N" 形式的分片参数 (i 从 0 开始)"""
+    try:
+        index, count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like 'i/N', got: {value}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index out of range: {value}")
+    return index, count
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Headless batch runner for the corpus cleaning pipeline."
+    )
+    parser.add_argument(
+        "input_dir",
+        help="Folder containing .rtf files, or a .zip / .tar(.gz|.bz2|.xz) archive "
+        "of them (read in place, no extraction)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-root",
+        help="Mirror outputs under this folder instead of <folder>/output "
+        "(archive input: default <archive name>_output)",
+    )
+    parser.add_argument(
+        "--output-archive",
+        help="Write all outputs into this .zip instead of a folder "
+        "(each folder is packed and removed from disk as soon as it is done)",
+    )
+    parser.add_argument(
+        "-r", "--recursive", action="store_true", help="Scan sub-folders"
+    )
+
+    perf = parser.add_argument_group("throughput")
+    perf.add_argument(
+        "--workers",
+        type=int,
+        help="RTF parsing processes (default: autotuned, else 1)",
+    )
+    perf.add_argument(
+        "--ner-batch-size",
+        type=int,
+        help="Paragraphs per DeBERTa forward pass (default: autotuned, else 16)",
+    )
+    perf.add_argument(
+        "--semantic-batch-size",
+        type=int,
+        help="Documents per MiniLM encode call (default: autotuned, else 32)",
+    )
+    perf.add_argument(
+        "--prefork",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Load models once, then fork N CPU workers that share the weights "
+        "copy-on-write (POSIX only)",
+    )
+    perf.add_argument(
+        "--prefork-threads",
+        type=int,
+        help="Torch threads per forked worker (default: cores / N)",
+    )
+    perf.add_argument(
+        "--schedule",
+        choices=["size", "directory"],
+        default="size",
+        help="File order inside each folder: largest first, or directory order "
+        "(default: size; output files keep directory order either way)",
+    )
+    perf.add_argument(
+        "--read-ahead",
+        type=int,
+        default=32,
+        metavar="N",
+        help="Prefetch the bytes of the next N files in a background thread "
+        "(0 = off, default: 32)",
+    )
+    perf.add_argument(
+        "--torch-threads",
+        type=int,
+        help="Intra-op threads for torch (default: autotuned)",
+    )
+    perf.add_argument(
+        "--autotune",
+        choices=["off", "auto", "calibrate"],
+        default="auto",
+        help="auto: reuse this machine's saved profile, if any; calibrate: "
+        "measure and save one (adds about 10-20 s to startup) (default: auto)",
+    )
+    perf.add_argument(
+        "--device", choices=["auto", "cpu", "cuda", "mps"], default="auto"
+    )
+    perf.add_argument(
+        "--precision", choices=["auto", "fp32", "fp16", "bf16"], default="auto"
+    )
+
+    perf.add_argument(
+        "--inference-mode",
+        choices=["eager", "compile", "trace"],
+        default="eager",
+        help="compile: torch.compile; trace: TorchScript per length bucket. "
+        "Compiled graphs are cached under --cache-dir (default: eager)",
+    )
+    perf.add_argument(
+        "--no-warmup",
+        action="store_true",
+        help="Skip the warmup batches run right after the models load",
+    )
+    perf.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="RSS budget (this process plus its workers): above it buffers "
+        "are flushed, batches shrink and read-ahead / in-flight windows "
+        "narrow (default: only report high-water marks)",
+    )
+    perf.add_argument(
+        "--semantic-aggregation",
+        choices=["max", "mean"],
+        default="mean",
+        help="How per-concept similarities are combined (default: mean; the "
+        "semantic threshold is calibrated for it, max scores run higher)",
+    )
+    perf.add_argument(
+        "--semantic-input",
+        choices=["body", "head"],
+        default="body",
+        help="What the semantic model reads after the title: the start of the "
+        "body (after the date/source/copyright header) or the start of the raw "
+        "text, as before (default: body)",
+    )
+    perf.add_argument(
+        "--semantic-short-circuit",
+        choices=["off", "record", "on"],
+        default="off",
+        help="record: keep per-gate-outcome semantic pass rates under --cache-dir; "
+        "on: also skip MiniLM for outcomes that (almost) always pass (default: off)",
+    )
+    perf.add_argument(
+        "--short-circuit-pass-rate",
+        type=float,
+        default=0.995,
+        help="Pass rate a gate outcome needs before it is skipped (default: 0.995)",
+    )
+    perf.add_argument(
+        "--short-circuit-min-samples",
+        type=int,
+        default=200,
+        help="Recorded documents a gate outcome needs before it can be skipped "
+        "(default: 200)",
+    )
+    perf.add_argument(
+        "--short-circuit-verify-rate",
+        type=float,
+        default=0.05,
+        help="Share of skipped documents still encoded to verify the policy "
+        "(default: 0.05)",
+    )
+    perf.add_argument(
+        "--paragraph-memo-size",
+        type=int,
+        default=20000,
+        help="Memoized paragraph predictions kept in memory, 0 disables "
+        "(persisted under --cache-dir)",
+    )
+    perf.add_argument(
+        "--ner-packing",
+        choices=["off", "on", "validate"],
+        default="off",
+        help="Pack consecutive short paragraphs into shared DeBERTa sequences. "
+        "validate: run packed and unpacked, keep the unpacked result and report "
+        "how often the noise decision differs (default: off)",
+    )
+    perf.add_argument(
+        "--packing-tolerance",
+        type=float,
+        default=0.01,
+        help="Share of paragraphs whose noise decision may change under "
+        "--ner-packing validate before a warning (default: 0.01)",
+    )
+
+    cascade = parser.add_argument_group("NER cascade")
+    cascade.add_argument(
+        "--cascade",
+        choices=["off", "collect", "on", "audit"],
+        default="off",
+        help="Lexical pre-classifier in front of DeBERTa. collect: log the model's "
+        "paragraph decisions as training samples; on: skip paragraphs it rates "
+        "clean; audit: like on, but sample skipped paragraphs through the model "
+        "and report the miss rate (default: off)",
+    )
+    cascade.add_argument(
+        "--cascade-recall",
+        type=float,
+        default=0.995,
+        help="Share of noisy paragraphs that must still reach the model "
+        "(default: 0.995)",
+    )
+    cascade.add_argument(
+        "--cascade-audit-rate",
+        type=float,
+        default=0.05,
+        help="Share of skipped paragraphs re-checked in audit mode (default: 0.05)",
+    )
+    cascade.add_argument(
+        "--train-cascade",
+        action="store_true",
+        help="Train the cascade from the samples collected under --cache-dir "
+        "and exit (input_dir is not read)",
+    )
+
+    paths = parser.add_argument_group("models & caches")
+    paths.add_argument("--noise-model", help="Path to the DeBERTa noise model")
+    paths.add_argument("--semantic-model", help="Path to the MiniLM model")
+    paths.add_argument(
+        "--semantic-config",
+        help="semantic_config.json to use (default: the one the UI edits); "
+        "changes are picked up while running",
+    )
+    paths.add_argument(
+        "--cache-dir", help="Directory for pipeline caches (and HF_HOME if unset)"
+    )
+
+    export = parser.add_argument_group("columnar export")
+    export.add_argument(
+        "--export",
+        choices=["parquet", "jsonl"],
+        help="Also write kept documents as sharded Parquet or zstd JSONL",
+    )
+    export.add_argument(
+        "--export-dir", help="Export folder (default: <output-root>/corpus_export)"
+    )
+    export.add_argument(
+        "--export-rows-per-shard",
+        type=int,
+        default=100000,
+        help="Rows per export file (default: 100000)",
+    )
+    export.add_argument(
+        "--export-row-group",
+        type=int,
+        default=10000,
+        help="Rows per Parquet row group / write batch (default: 10000)",
+    )
+
+    catalog = parser.add_argument_group("corpus catalog")
+    catalog.add_argument(
+        "--catalog",
+        nargs="?",
+        const=True,
+        metavar="DB",
+        help="Keep an SQLite catalog of every discovered file (metadata, gate "
+        "result, processing status); default location: <cache-dir>/catalog/",
+    )
+    catalog.add_argument(
+        "--date-from",
+        type=parse_iso_date,
+        metavar="YYYY-MM-DD",
+        help="Only process articles dated on or after this day",
+    )
+    catalog.add_argument(
+        "--date-to",
+        type=parse_iso_date,
+        metavar="YYYY-MM-DD",
+        help="Only process articles dated on or before this day",
+    )
+    catalog.add_argument(
+        "--source",
+        action="append",
+        dest="sources",
+        metavar="NAME",
+        help="Only process articles from this source (repeatable, case-insensitive)",
+    )
+    catalog.add_argument(
+        "--gate",
+        choices=["passed", "skipped"],
+        help="Only process articles whose keyword gate result is this",
+    )
+    catalog.add_argument(
+        "--only-unprocessed",
+        action="store_true",
+        help="Only process files that are new or changed since their last run",
+    )
+
+    rules = parser.add_argument_group("structural noise rules")
+    rules.add_argument(
+        "--rule-budget-ms",
+        type=float,
+        default=200.0,
+        help="Time budget per regex rule per document; a rule that runs over is "
+        "cut short and logged (0 = no budget, default: 200)",
+    )
+    rules.add_argument(
+        "--profile-rules",
+        action="store_true",
+        help="Profile every structural rule over input_dir without loading models: "
+        "per-rule cost, slowest document, timeouts, and a match check against re",
+    )
+
+    run = parser.add_argument_group("run control")
+    run.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Only process shard i of N (stable hash of relative path), e.g. 0/4",
+    )
+    run.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Scan and estimate the workload without loading models",
+    )
+    run.add_argument("--summary-json", help="Also write the summary JSON to a file")
+    run.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running: poll input_dir and clean new or changed files as they "
+        "arrive (one summary line per batch on stdout; Ctrl+C / SIGTERM to stop)",
+    )
+    run.add_argument(
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between polls in --watch mode (default: 2)",
+    )
+    run.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=3.0,
+        help="Seconds a file must stay unchanged before it is processed (default: 3)",
+    )
+    run.add_argument(
+        "--profile",
+        nargs="?",
+        type=int,
+        const=0,
+        metavar="N",
+        help="Run a sampling profiler for the whole job, or only the first N docs; "
+        "writes a flamegraph file and per-stage self times to "
+        "<output-root>/profile/",
+    )
+    run.add_argument(
+        "--profile-format",
+        choices=["speedscope", "collapsed"],
+        default="speedscope",
+        help="speedscope JSON or collapsed stacks for flamegraph.pl "
+        "(default: speedscope)",
+    )
+    run.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="DEBUG also logs every skipped document (default: INFO)",
+    )
+
+    review = parser.add_argument_group("review store")
+    review.add_argument(
+        "--no-legacy-json",
+        action="store_true",
+        help="Only write review_store.bin/.idx, skip frontend_diff.json",
+    )
+    review.add_argument(
+        "--pretty-json",
+        action="store_true",
+        help="Indent frontend_diff.json (default: compact)",
+    )
+    review.add_argument(
+        "--rebuild-review-json",
+        action="store_true",
+        help="Treat input_dir as an output folder and regenerate its "
+        "frontend_diff.json from the review store (no models loaded)",
+    )
+    return parser
+
+
+def emit_summary(summary, summary_path=None):
+    line = serializer.dumps(summary)
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def run_watch(pipeline, args):
+    """守护模式: 每处理完一批增量就输出一行统计，SIGTERM / Ctrl+C 时退出"""
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    def on_summary(summary):
+        summary = dict(summary, status="batch", exit_code=EXIT_OK)
+        emit_summary(summary, args.summary_json)
+
+    # emit_summary 写真正的 stdout (日志在 stderr)
+    with contextlib.redirect_stdout(sys.__stdout__):
+        totals = pipeline.watch(
+            args.input_dir,
+            recursive=args.recursive,
+            output_root=args.output_root,
+            interval=args.watch_interval,
+            debounce=args.watch_debounce,
+            stop_event=stop_event,
+            on_summary=on_summary,
+        )
+    return totals
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    summary = {"status": "error", "exit_code": EXIT_FAILURE}
+
+    if not os.path.isdir(args.input_dir) and not (
+        os.path.isfile(args.input_dir)
+        and args.input_dir.lower().endswith(ARCHIVE_SUFFIXES)
+    ):
+        summary.update(
+            exit_code=EXIT_USAGE, error=f"Input directory not found: {args.input_dir}"
+        )
+        emit_summary(summary, args.summary_json)
+        return EXIT_USAGE
+
+    # 必须在 import transformers 之前设置，才能生效
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        os.environ.setdefault("HF_HOME", os.path.join(args.cache_dir, "huggingface"))
+
+    # 所有运行日志走 stderr，保证 stdout 只有一行机器可读的统计
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            from pipeline_modules import (
+                CorpusPipeline,
+                default_model_configs,
+                setup_logging,
+            )
+
+            setup_logging(level=args.log_level, stream=sys.stderr)
+
+            if args.rebuild_review_json:
+                from pipeline_modules import ReviewStore
+
+                count = ReviewStore(args.input_dir).export_legacy_json(
+                    pretty=args.pretty_json
+                )
+                summary = {
+                    "status": "ok" if count else "empty",
+                    "exit_code": EXIT_OK if count else EXIT_NO_INPUT,
+                    "documents": count,
+                }
+            elif args.train_cascade:
+                from pipeline_modules import (
+                    DEFAULT_CACHE_DIR,
+                    ParagraphCascade,
+                    read_model_version,
+                )
+
+                noise_model = (
+                    args.noise_model
+                    or default_model_configs(CURRENT_DIR)["NOISE_CAPTION"]
+                )
+                summary = ParagraphCascade.train(
+                    args.cache_dir or DEFAULT_CACHE_DIR,
+                    read_model_version(noise_model),
+                    recall=args.cascade_recall,
+                )
+                summary["status"] = "error" if "error" in summary else "ok"
+                summary["exit_code"] = EXIT_NO_INPUT if "error" in summary else EXIT_OK
+            elif args.profile_rules:
+                from pipeline_modules import StructuralRuleSet
+
+                summary = StructuralRuleSet.profile_corpus(
+                    args.input_dir,
+                    recursive=args.recursive,
+                    budget_ms=args.rule_budget_ms,
+                )
+                summary["status"] = "mismatch" if summary["mismatches"] else "ok"
+                summary["exit_code"] = (
+                    EXIT_FAILURE
+                    if summary["mismatches"]
+                    else EXIT_OK if summary["documents"] else EXIT_NO_INPUT
+                )
+            elif args.dry_run:
+                summary = CorpusPipeline.estimate_workload(
+                    args.input_dir, recursive=args.recursive, shard=args.shard
+                )
+                summary["status"] = "dry-run"
+                summary["exit_code"] = (
+                    EXIT_OK if summary["files_scheduled"] else EXIT_NO_INPUT
+                )
+            else:
+                model_configs = default_model_configs(CURRENT_DIR)
+                if args.noise_model:
+                    model_configs["NOISE_CAPTION"] = args.noise_model
+                if args.semantic_model:
+                    model_configs["SEMANTIC_MODEL"] = args.semantic_model
+
+                missing = [
+                    name
+                    for name, path in model_configs.items()
+                    if not os.path.exists(path)
+                ]
+                if missing:
+                    summary.update(
+                        exit_code=EXIT_MODELS_MISSING,
+                        error=f"Models missing: {missing}",
+                    )
+                else:
+                    model_configs.update(
+                        {
+                            "DEVICE": args.device,
+                            "PRECISION": args.precision,
+                            "NER_BATCH_SIZE": args.ner_batch_size,
+                            "SEMANTIC_BATCH_SIZE": args.semantic_batch_size,
+                            "NUM_WORKERS": args.workers,
+                            "TORCH_THREADS": args.torch_threads,
+                            "AUTOTUNE": args.autotune,
+                            "INFERENCE_MODE": args.inference_mode,
+                            "WARMUP": not args.no_warmup,
+                            "MEMORY_BUDGET_MB": args.memory_budget,
+                            "PREFORK_WORKERS": args.prefork,
+                            "PREFORK_THREADS": args.prefork_threads,
+                            "SCHEDULE": args.schedule,
+                            "STRUCTURAL_RULE_BUDGET_MS": args.rule_budget_ms,
+                            "READ_AHEAD_FILES": args.read_ahead,
+                            "PARAGRAPH_MEMO_SIZE": args.paragraph_memo_size,
+                            "NER_PACKING": args.ner_packing,
+                            "NER_PACKING_TOLERANCE": args.packing_tolerance,
+                            "SEMANTIC_AGGREGATION": args.semantic_aggregation,
+                            "LEGACY_REVIEW_JSON": not args.no_legacy_json,
+                            "PRETTY_JSON": args.pretty_json,
+                            "SEMANTIC_INPUT": args.semantic_input,
+                            "SEMANTIC_SHORT_CIRCUIT": args.semantic_short_circuit,
+                            "SEMANTIC_SHORT_CIRCUIT_MIN_SAMPLES": args.short_circuit_min_samples,
+                            "SEMANTIC_SHORT_CIRCUIT_PASS_RATE": args.short_circuit_pass_rate,
+                            "SEMANTIC_SHORT_CIRCUIT_VERIFY_RATE": args.short_circuit_verify_rate,
+                            "NER_CASCADE": args.cascade,
+                            "NER_CASCADE_RECALL": args.cascade_recall,
+                            "NER_CASCADE_AUDIT_RATE": args.cascade_audit_rate,
+                        }
+                    )
+                    if args.cache_dir:
+                        model_configs["CACHE_DIR"] = args.cache_dir
+                    if args.semantic_config:
+                        model_configs["SEMANTIC_CONFIG_PATH"] = args.semantic_config
+                    if args.export:
+                        model_configs.update(
+                            {
+                                "EXPORT_FORMAT": args.export,
+                                "EXPORT_DIR": args.export_dir,
+                                "EXPORT_ROWS_PER_SHARD": args.export_rows_per_shard,
+                                "EXPORT_ROW_GROUP_SIZE": args.export_row_group,
+                            }
+                        )
+                    if args.catalog:
+                        model_configs["CATALOG"] = args.catalog
+                    query = {
+                        "date_from": args.date_from,
+                        "date_to": args.date_to,
+                        "sources": args.sources,
+                        "gate": args.gate,
+                        "unprocessed": args.only_unprocessed,
+                    }
+                    query = {k: v for k, v in query.items() if v} or None
+
+                    profile = None
+                    if args.profile is not None:
+                        profile = {"docs": args.profile, "format": args.profile_format}
+
+                    pipeline = CorpusPipeline(model_configs)
+                    try:
+                        if args.watch:
+                            summary = run_watch(pipeline, args)
+                        else:
+                            summary = pipeline.process_folder(
+                                args.input_dir,
+                                recursive=args.recursive,
+                                output_root=args.output_root,
+                                shard=args.shard,
+                                profile=profile,
+                                output_archive=args.output_archive,
+                                query=query,
+                            )
+                    finally:
+                        pipeline.dispose()
+
+                    if "error" in summary:
+                        summary.update(status="error", exit_code=EXIT_FAILURE)
+                    elif args.watch:
+                        summary.update(status="stopped", exit_code=EXIT_OK)
+                    elif summary["files_total"] == 0:
+                        summary.update(status="empty", exit_code=EXIT_NO_INPUT)
+                    else:
+                        summary.update(status="ok", exit_code=EXIT_OK)
+        except Exception as e:
+            traceback.print_exc()
+            summary = {"status": "error", "exit_code": EXIT_FAILURE, "error": str(e)}
+        finally:
+            if "pipeline_modules" in sys.modules:
+                sys.modules["pipeline_modules"].shutdown_logging()
+
+    emit_summary(summary, args.summary_json)
+    return summary["exit_code"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import sys
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# ==========================================================
+# 分级日志: 按阶段命名的 logger (corpus.ner / corpus.semantic / ...)，
+# 处理线程只负责入队，格式化和写出交给后台监听线程
+# ==========================================================
+LOGGER_ROOT = "corpus"
+# 每个阶段一个 logger，可单独调整级别: corpus.ner / corpus.semantic / ...
+LOG_STAGES = [
+    "device",
+    "autotune",
+    "rtf",
+    "formatter",
+    "memo",
+    "ner",
+    "semantic",
+    "pipeline",
+    "export",
+    "review",
+    "service",
+]
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+_log_listener = None
+
+
+def get_logger(stage):
+    return logging.getLogger(f"{LOGGER_ROOT}.{stage}")
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    默认的 QueueHandler 会在调用线程里格式化消息；
+    这里原样入队，格式化和写出都交给后台监听线程
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level="INFO", stream=None, handler=None):
+    """
+    把 corpus.* 的日志接到一个后台线程上:
+    处理线程只负责入队，不会因为 stdout/管道写满而阻塞
+    handler 为空时写到 stream (默认 stderr)
+    """
+    global _log_listener
+    shutdown_logging()
+
+    if handler is None:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+    root = logging.getLogger(LOGGER_ROOT)
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    root.propagate = False
+
+    _log_listener = logging.handlers.QueueListener(log_queue, handler)
+    _log_listener.start()
+    return _log_listener
+
+
+def shutdown_logging():
+    """等待队列中剩余的日志写完 (进程退出前调用)"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def ensure_logging():
+    """直接 import 使用流水线时，给一个默认的 INFO 输出"""
+    if _log_listener is None:
+        setup_logging()
+
+
+def set_log_level(level, stage=None):
+    """运行时调整级别; stage 为空时调整全局"""
+    level = str(level).upper()
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level: {level}")
+    name = f"{LOGGER_ROOT}.{stage}" if stage else LOGGER_ROOT
+    logging.getLogger(name).setLevel(level)
+    return name, level
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,453 @@
+import sys
+import os
+import argparse
+import contextlib
+import concurrent.futures
+import difflib
+import multiprocessing
+import time
+import traceback
+
+import numpy as np
+
+# ==========================================================
+# 速度 / 质量评估: 同一份样本语料分别用基线模式和候选模式跑一遍，
+# 对比吞吐、延迟、峰值内存，以及输出的一致性 (保留/丢弃、高亮区间、正文)
+# 用法: python evaluate.py <sample_dir> -c cascade:NER_CASCADE=on [options]
+# 运行日志写到 stderr，评估报告以单行 JSON 写到 stdout
+# ==========================================================
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+import serializer
+
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_NO_INPUT = 4
+EXIT_GATE_FAILED = 5
+
+# 这两类高亮是结构切分，不是模型判断，不参与区间一致性
+STRUCTURAL_SPANS = ("HEADER", "FOOTER")
+
+
+def parse_value(text):
+    """命令行里的配置值: JSON 能解析就按 JSON (数字 / true / null)，否则是字符串"""
+    try:
+        return serializer.loads(text)
+    except ValueError:
+        return text
+
+
+def parse_overrides(text):
+    """KEY=VALUE,KEY=VALUE -> dict"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got: {item}")
+        overrides[key.strip().upper()] = parse_value(value.strip())
+    return overrides
+
+
+def parse_candidate(text):
+    """name:KEY=VALUE,... -> (name, overrides)"""
+    name, sep, spec = text.partition(":")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(
+            f"Candidate must look like 'name:KEY=VALUE,...', got: {text}"
+        )
+    return name, parse_overrides(spec)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Compare pipeline modes on a fixed sample corpus: "
+        "throughput, latency and memory next to output agreement."
+    )
+    parser.add_argument("sample_dir", help="Folder containing sample .rtf files")
+    parser.add_argument(
+        "-r", "--recursive", action="store_true", help="Scan sub-folders"
+    )
+    parser.add_argument(
+        "--limit", type=int, help="Only use the first N files (sorted by path)"
+    )
+
+    modes = parser.add_argument_group("modes")
+    modes.add_argument(
+        "-b",
+        "--baseline",
+        type=parse_overrides,
+        default={},
+        metavar="KEY=VALUE,...",
+        help="Config overrides for the baseline mode (default: pipeline defaults)",
+    )
+    modes.add_argument(
+        "-c",
+        "--candidate",
+        type=parse_candidate,
+        action="append",
+        default=[],
+        metavar="NAME:KEY=VALUE,...",
+        help="A candidate mode, e.g. 'cascade:NER_CASCADE=on' or "
+        "'big-batch:NER_BATCH_SIZE=64,SEMANTIC_BATCH_SIZE=128' (repeatable)",
+    )
+    modes.add_argument(
+        "--modes",
+        help='JSON file {"baseline": {...}, "candidates": {"name": {...}}} '
+        "(merged with -b / -c)",
+    )
+
+    paths = parser.add_argument_group("models & caches")
+    paths.add_argument("--noise-model", help="Path to the DeBERTa noise model")
+    paths.add_argument("--semantic-model", help="Path to the MiniLM model")
+    paths.add_argument("--semantic-config", help="semantic_config.json to use")
+    paths.add_argument("--cache-dir", help="Directory for pipeline caches")
+    paths.add_argument(
+        "--device", choices=["cpu", "cuda", "mps"], help="Force a device"
+    )
+
+    gates = parser.add_argument_group("gates (exit code 5 if a candidate fails)")
+    gates.add_argument(
+        "--min-keep-agreement",
+        type=float,
+        help="Minimum share of documents with the same keep/drop decision",
+    )
+    gates.add_argument(
+        "--min-span-iou", type=float, help="Minimum mean highlight span IoU"
+    )
+    gates.add_argument(
+        "--max-body-distance",
+        type=float,
+        help="Maximum mean normalized cleaned-body edit distance",
+    )
+    gates.add_argument(
+        "--min-speedup", type=float, help="Minimum docs/sec ratio over the baseline"
+    )
+
+    run = parser.add_argument_group("run control")
+    run.add_argument("--report", help="Also write the report JSON (indented) here")
+    run.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="WARNING",
+        help="Pipeline log level in the mode runs (default: WARNING)",
+    )
+    return parser
+
+
+# ---------- 样本语料 ----------
+def load_samples(sample_dir, recursive=False, limit=None):
+    """一次性读入内存，各模式使用完全相同的输入 (不计入磁盘 IO)"""
+    from pipeline_modules import CorpusPipeline
+
+    files = sorted(CorpusPipeline.discover_files(sample_dir, recursive))
+    if limit:
+        files = files[:limit]
+    documents = []
+    for path in files:
+        with open(path, "rb") as f:
+            data = f.read()
+        documents.append(
+            {
+                "id": os.path.relpath(path, sample_dir),
+                "rtf": data,
+                "topic_mode": CorpusPipeline.detect_topic_mode(os.path.dirname(path)),
+            }
+        )
+    return documents
+
+
+# ---------- 单个模式 (在独立的子进程里跑，峰值内存互不影响) ----------
+def peak_rss_mb():
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位是 KB，macOS 是字节
+        return round(peak / (1024**2 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1024**2, 1)
+
+
+def run_mode(name, model_configs, documents, log_level="WARNING"):
+    with contextlib.redirect_stdout(sys.stderr):
+        from pipeline_modules import CorpusPipeline, setup_logging, shutdown_logging
+
+        setup_logging(level=log_level, stream=sys.stderr)
+        try:
+            load_start = time.perf_counter()
+            pipeline = CorpusPipeline(model_configs)
+            load_sec = time.perf_counter() - load_start
+
+            submitted = {}
+
+            def feed():
+                for doc in documents:
+                    submitted[doc["id"]] = time.perf_counter()
+                    yield doc
+
+            outputs = {}
+            latencies = []
+            start = time.perf_counter()
+            for record in pipeline.stream(feed()):
+                now = time.perf_counter()
+                latencies.append(now - submitted.pop(record["path"]))
+                outputs[record["path"]] = {
+                    "status": record["status"],
+                    "spans": [
+                        (h["start"], h["end"])
+                        for h in record.get("highlights", [])
+                        if h["type"] not in STRUCTURAL_SPANS
+                    ],
+                    "body": record.get("cleaned_body", ""),
+                }
+            elapsed = time.perf_counter() - start
+
+            latency_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+            perf = {
+                "documents": len(outputs),
+                "load_sec": round(load_sec, 2),
+                "elapsed_sec": round(elapsed, 3),
+                "docs_per_sec": round(len(outputs) / elapsed, 2) if elapsed else 0.0,
+                "latency_ms_p50": round(float(np.percentile(latency_ms, 50)), 2),
+                "latency_ms_p95": round(float(np.percentile(latency_ms, 95)), 2),
+                "latency_ms_p99": round(float(np.percentile(latency_ms, 99)), 2),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+            if pipeline.cleaner.cascade is not None:
+                perf["cascade"] = pipeline.cleaner.cascade.report()
+            if pipeline.short_circuit is not None:
+                perf["semantic_short_circuit"] = pipeline.short_circuit.report()
+            pipeline.dispose()
+            return {"name": name, "perf": perf, "outputs": outputs}
+        finally:
+            shutdown_logging()
+
+
+def run_isolated(name, model_configs, documents, log_level):
+    """每个模式一个新的 spawn 进程: 模型加载、缓存、峰值内存都从零开始"""
+    ctx = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context=ctx) as executor:
+        return executor.submit(
+            run_mode, name, model_configs, documents, log_level
+        ).result()
+
+
+# ---------- 一致性指标 ----------
+def _merge(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def span_iou(a, b):
+    """两组字符区间的 IoU (都为空时为 1)"""
+    a, b = _merge(a), _merge(b)
+    union = sum(e - s for s, e in _merge(a + b))
+    if union == 0:
+        return 1.0
+    inter = 0
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo, hi = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        inter += max(0, hi - lo)
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return inter / union
+
+
+def body_distance(a, b):
+    """清洗后正文的词级编辑距离 (difflib 操作码)，按较长一方的词数归一化"""
+    if a == b:
+        return 0.0
+    wa, wb = a.split(), b.split()
+    if not wa or not wb:
+        return 1.0
+    edits = sum(
+        max(i2 - i1, j2 - j1)
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(
+            None, wa, wb, autojunk=False
+        ).get_opcodes()
+        if tag != "equal"
+    )
+    return edits / max(len(wa), len(wb))
+
+
+def compare(baseline, candidate):
+    base_out, cand_out = baseline["outputs"], candidate["outputs"]
+    ids = sorted(set(base_out) & set(cand_out))
+    confusion = {
+        "both_kept": 0,
+        "both_dropped": 0,
+        "only_baseline": 0,
+        "only_candidate": 0,
+    }
+    same_status = 0
+    ious, distances = [], []
+    changed = []
+    for doc_id in ids:
+        b, c = base_out[doc_id], cand_out[doc_id]
+        same_status += b["status"] == c["status"]
+        b_kept, c_kept = b["status"] == "kept", c["status"] == "kept"
+        if b_kept and c_kept:
+            confusion["both_kept"] += 1
+            iou = span_iou(b["spans"], c["spans"])
+            dist = body_distance(b["body"], c["body"])
+            ious.append(iou)
+            distances.append(dist)
+            if dist > 0:
+                changed.append((dist, doc_id))
+        elif b_kept:
+            confusion["only_baseline"] += 1
+            changed.append((1.0, doc_id))
+        elif c_kept:
+            confusion["only_candidate"] += 1
+            changed.append((1.0, doc_id))
+        else:
+            confusion["both_dropped"] += 1
+
+    n = len(ids)
+    keep_agree = (confusion["both_kept"] + confusion["both_dropped"]) / n if n else 1.0
+    base_speed = baseline["perf"]["docs_per_sec"]
+    return {
+        "documents": n,
+        "keep_agreement": round(keep_agree, 4),
+        "status_agreement": round(same_status / n, 4) if n else 1.0,
+        "confusion": confusion,
+        "span_iou_mean": round(float(np.mean(ious)), 4) if ious else 1.0,
+        "span_iou_p5": round(float(np.percentile(ious, 5)), 4) if ious else 1.0,
+        "body_distance_mean": round(float(np.mean(distances)), 4) if distances else 0.0,
+        "body_exact_match": (
+            round(sum(d == 0 for d in distances) / len(distances), 4)
+            if distances
+            else 1.0
+        ),
+        "speedup": (
+            round(candidate["perf"]["docs_per_sec"] / base_speed, 3)
+            if base_speed
+            else None
+        ),
+        # 差异最大的几篇，方便人工查看
+        "most_changed": [doc_id for _, doc_id in sorted(changed, reverse=True)[:10]],
+    }
+
+
+def check_gates(agreement, args):
+    failed = []
+    if (
+        args.min_keep_agreement is not None
+        and agreement["keep_agreement"] < args.min_keep_agreement
+    ):
+        failed.append("keep_agreement")
+    if args.min_span_iou is not None and agreement["span_iou_mean"] < args.min_span_iou:
+        failed.append("span_iou")
+    if (
+        args.max_body_distance is not None
+        and agreement["body_distance_mean"] > args.max_body_distance
+    ):
+        failed.append("body_distance")
+    if args.min_speedup is not None and (agreement["speedup"] or 0) < args.min_speedup:
+        failed.append("speedup")
+    return {"passed": not failed, "failed": failed}
+
+
+def base_model_configs(args):
+    from pipeline_modules import default_model_configs
+
+    model_configs = default_model_configs(CURRENT_DIR)
+    if args.noise_model:
+        model_configs["NOISE_CAPTION"] = args.noise_model
+    if args.semantic_model:
+        model_configs["SEMANTIC_MODEL"] = args.semantic_model
+    if args.semantic_config:
+        model_configs["SEMANTIC_CONFIG_PATH"] = args.semantic_config
+    if args.cache_dir:
+        model_configs["CACHE_DIR"] = args.cache_dir
+    if args.device:
+        model_configs["DEVICE"] = args.device
+    # 默认不读写持久化的段落缓存，各模式互不影响 (候选模式可以自己打开)
+    model_configs["PARAGRAPH_MEMO_PERSIST"] = False
+    model_configs["AUTOTUNE"] = "off"
+    return model_configs
+
+
+def emit_report(report, report_path=None):
+    sys.stdout.write(serializer.dumps(report) + "\n")
+    sys.stdout.flush()
+    if report_path:
+        serializer.dump_file(report, report_path, pretty=True)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    report = {"status": "error", "exit_code": EXIT_FAILURE}
+
+    if not os.path.isdir(args.sample_dir):
+        report.update(
+            exit_code=EXIT_USAGE, error=f"Sample directory not found: {args.sample_dir}"
+        )
+        emit_report(report, args.report)
+        return EXIT_USAGE
+
+    baseline_overrides = dict(args.baseline)
+    candidates = dict(args.candidate)
+    if args.modes:
+        spec = serializer.load_file(args.modes)
+        baseline_overrides = {**spec.get("baseline", {}), **baseline_overrides}
+        candidates = {**spec.get("candidates", {}), **candidates}
+
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            documents = load_samples(args.sample_dir, args.recursive, args.limit)
+            if not documents:
+                report.update(
+                    status="empty", exit_code=EXIT_NO_INPUT, error="No RTF files found"
+                )
+            else:
+                base_configs = base_model_configs(args)
+                modes = {"baseline": baseline_overrides, **candidates}
+                results = {}
+                for name, overrides in modes.items():
+                    print(f"⏱️ Running mode '{name}' on {len(documents)} documents...")
+                    results[name] = run_isolated(
+                        name, {**base_configs, **overrides}, documents, args.log_level
+                    )
+
+                report = {
+                    "sample_dir": args.sample_dir,
+                    "documents": len(documents),
+                    "modes": {
+                        name: {"config": modes[name], "perf": results[name]["perf"]}
+                        for name in modes
+                    },
+                    "agreement": {},
+                    "gates": {},
+                }
+                for name in candidates:
+                    agreement = compare(results["baseline"], results[name])
+                    report["agreement"][name] = agreement
+                    report["gates"][name] = check_gates(agreement, args)
+
+                all_passed = all(g["passed"] for g in report["gates"].values())
+                report["status"] = "ok" if all_passed else "gate_failed"
+                report["exit_code"] = EXIT_OK if all_passed else EXIT_GATE_FAILED
+        except Exception as e:
+            traceback.print_exc()
+            report = {"status": "error", "exit_code": EXIT_FAILURE, "error": str(e)}
+
+    emit_report(report, args.report)
+    return report["exit_code"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import os
+import json
+import gzip
+
+import serializer
+from corpus_logging import get_logger
+
+# --- 可选依赖 ---
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+
+# ==========================================================
+# 列式语料导出: 保留的文章流式写成 Parquet / 压缩 JSONL 分片
+# ==========================================================
+class CorpusExportSink:
+    """
+    把保留下来的文章流式写成分片文件，供下游分析任务直接读取
+    - parquet: 每 row_group_size 行写一个 row group，每 rows_per_shard 行换一个文件
+    - jsonl: 每行一个 JSON 对象，zstd 压缩 (没有 zstandard 时退回 gzip)
+    内存中最多只缓存一个 row group
+    """
+
+    log = get_logger("export")
+
+    COLUMNS = [
+        ("filename", "string"),
+        ("folder", "string"),
+        ("title", "string"),
+        ("date", "string"),
+        ("source", "string"),
+        ("body", "string"),
+        ("topic_mode", "string"),
+        ("gate_reason", "string"),
+        ("semantic_reason", "string"),
+        ("semantic_pos", "float64"),
+        ("semantic_neg", "float64"),
+        ("rules_version", "string"),
+    ]
+
+    def __init__(
+        self, export_dir, fmt="parquet", rows_per_shard=100000, row_group_size=10000
+    ):
+        if fmt == "parquet" and pa is None:
+            self.log.warning(
+                "⚠️ pyarrow not installed, exporting compressed JSONL instead."
+            )
+            fmt = "jsonl"
+        if fmt not in ("parquet", "jsonl"):
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        self.export_dir = export_dir
+        self.fmt = fmt
+        self.rows_per_shard = max(1, int(rows_per_shard))
+        self.row_group_size = max(1, min(int(row_group_size), self.rows_per_shard))
+        os.makedirs(export_dir, exist_ok=True)
+
+        self.buffer = []
+        self.shards = []  # [{"file": .., "rows": ..}]
+        self.shard_rows = 0
+        self.writer = None
+
+        if self.fmt == "parquet":
+            self.schema = pa.schema(
+                [(name, getattr(pa, dtype)()) for name, dtype in self.COLUMNS]
+            )
+
+    def flush(self):
+        """把未满一个 row group 的缓冲先写出去 (内存紧张时调用)"""
+        if self.buffer:
+            self._flush()
+
+    def write(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.row_group_size:
+            self._flush()
+
+    def write_record(self, record, folder=""):
+        """把流水线的 record 转成导出行"""
+        meta = record["meta"]
+        scores = record.get("sem_scores") or {}
+        self.write(
+            {
+                "filename": record["filename"],
+                "folder": folder,
+                "title": meta["title"],
+                "date": meta["date"],
+                "source": meta["source"],
+                "body": record["cleaned_body"],
+                "topic_mode": record.get("topic_mode", ""),
+                "gate_reason": record.get("gate_reason", ""),
+                "semantic_reason": record.get("sem_reason", ""),
+                "semantic_pos": scores.get("pos"),
+                "semantic_neg": scores.get("neg"),
+                "rules_version": record.get("rules_version", ""),
+            }
+        )
+
+    def _open_shard(self):
+        ext = "parquet" if self.fmt == "parquet" else "jsonl." + _COMPRESSED_EXT
+        path = os.path.join(self.export_dir, f"part-{len(self.shards):05d}.{ext}")
+        if self.fmt == "parquet":
+            self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self.writer = _open_compressed(path)
+        self.shards.append({"file": os.path.basename(path), "rows": 0})
+        self.shard_rows = 0
+
+    def _close_shard(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _flush(self):
+        rows = self.buffer
+        self.buffer = []
+        while rows:
+            if self.writer is None:
+                self._open_shard()
+            take = rows[: self.rows_per_shard - self.shard_rows]
+            rows = rows[len(take) :]
+
+            if self.fmt == "parquet":
+                table = pa.Table.from_pylist(take, schema=self.schema)
+                self.writer.write_table(table, row_group_size=self.row_group_size)
+            else:
+                for row in take:
+                    self.writer.write(serializer.dumpb(row) + b"\n")
+
+            self.shard_rows += len(take)
+            self.shards[-1]["rows"] = self.shard_rows
+            if self.shard_rows >= self.rows_per_shard:
+                self._close_shard()
+
+    def close(self):
+        """写完剩余数据并生成 _manifest.json"""
+        self._flush()
+        self._close_shard()
+        manifest = {
+            "format": self.fmt,
+            "columns": [name for name, _ in self.COLUMNS],
+            "shards": self.shards,
+            "rows": sum(s["rows"] for s in self.shards),
+        }
+        with open(
+            os.path.join(self.export_dir, "_manifest.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest
+
+
+def _open_compressed(path):
+    """以二进制写模式打开压缩文件 (zstd 优先，gzip 兜底)"""
+    if zstd is not None:
+        return zstd.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+    return gzip.open(path, "wb")
+
+
+_COMPRESSED_EXT = "zst" if zstd is not None else "gz"
@@ -0,0 +1,16 @@
+import collections
+
+# ==========================================================
+# 文件发现: scandir 的扫描结果与预读线程使用的读取函数
+# ==========================================================
+# 文件发现结果: 一次 scandir 同时拿到大小和修改时间，后续排程 / 估算不再逐个 stat
+FileEntry = collections.namedtuple("FileEntry", ["path", "size", "mtime"])
+
+
+def read_file(path):
+    """预读线程: 读入整个文件，失败时返回 None (交回解析阶段按原路径处理并记录错误)"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
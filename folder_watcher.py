@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import hashlib
+
+from autotune import DEFAULT_CACHE_DIR
+from corpus_logging import get_logger
+
+# ==========================================================
+# 监视目录 (守护模式): 轮询发现新增 / 修改且已经写完的 RTF
+# ==========================================================
+# 守护模式累计统计的字段
+WATCH_TOTAL_KEYS = [
+    "files_total",
+    "processed",
+    "kept",
+    "empty",
+    "gate_skipped",
+    "semantic_skipped",
+    "briefing_skipped",
+]
+
+
+class FolderWatcher:
+    """
+    轮询 + stat 缓存发现新增 / 修改的 RTF (不依赖各系统的文件通知 API)
+    - 大小和 mtime 连续 debounce 秒不变、且以 "}" 结尾，才认为文件已写完
+    - 已处理文件的 (size, mtime) 持久化，重启后只处理期间的变化
+    """
+
+    log = get_logger("pipeline")
+
+    def __init__(self, input_dir, recursive=False, debounce=3.0, cache_dir=None):
+        self.input_dir = os.path.abspath(input_dir)
+        self.recursive = recursive
+        self.debounce = debounce
+        key = hashlib.sha1(f"{self.input_dir}|{recursive}".encode("utf-8")).hexdigest()
+        self.state_path = os.path.join(
+            cache_dir or DEFAULT_CACHE_DIR, "watch", f"{key[:12]}.json"
+        )
+        self.done = self._load_state()  # path -> [size, mtime_ns] (已处理的版本)
+        self.pending = {}  # path -> ([size, mtime_ns], 首次看到该版本的时间)
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            self.log.warning(f"⚠️ Watch state unreadable ({e}), rescanning all files.")
+            return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.done, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            self.log.error(f"❌ Failed to save watch state: {e}")
+
+    def _stat_all(self):
+        """scandir 一遍，返回 {path: [size, mtime_ns]}"""
+        found = {}
+        stack = [self.input_dir]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                stack.append(entry.path)
+                        elif entry.name.lower().endswith(".rtf"):
+                            st = entry.stat()
+                            found[entry.path] = [st.st_size, st.st_mtime_ns]
+            except OSError:
+                continue  # 目录在扫描期间被删除 / 无权限
+        return found
+
+    @staticmethod
+    def _looks_complete(path):
+        """RTF 以 '}' 结尾；还在复制中的文件通常没有"""
+        try:
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 64))
+                return f.read().rstrip().endswith(b"}")
+        except OSError:
+            return False
+
+    def poll(self):
+        """返回已经稳定、可以处理的文件列表"""
+        now = time.monotonic()
+        current = self._stat_all()
+        ready = []
+        for path, sig in current.items():
+            if self.done.get(path) == sig:
+                self.pending.pop(path, None)
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != sig:
+                self.pending[path] = (sig, now)
+                continue
+            stable_for = now - seen[1]
+            if stable_for < self.debounce or sig[0] == 0:
+                continue
+            # 结尾不完整时多等一会儿，超过 10 倍防抖时间仍按原样处理
+            if self._looks_complete(path) or stable_for >= self.debounce * 10:
+                ready.append(path)
+
+        for path in [p for p in self.pending if p not in current]:
+            del self.pending[path]
+        for path in [p for p in self.done if p not in current]:
+            del self.done[path]
+        return sorted(ready)
+
+    def mark_done(self, paths):
+        for path in paths:
+            if path in self.pending:
+                self.done[path] = self.pending.pop(path)[0]
+        self.save()
@@ -0,0 +1,116 @@
+import gc
+import collections
+
+import psutil
+
+from corpus_logging import get_logger
+
+
+# ==========================================================
+# 内存预算: 按 RSS 对流水线施加背压，并记录各阶段的内存高水位
+# ==========================================================
+class MemoryGovernor:
+    """
+    跟踪本进程及其子进程 (解析进程池 / 预分叉工作进程) 的 RSS 之和，
+    并按预算 (MEMORY_BUDGET_MB) 逐级施加背压:
+    1. 超过 soft_ratio: 缓冲落盘、裁剪段落缓存、gc
+    2. 仍然偏高: 批大小减半
+    3. 超过预算: 读入窗口减半 (预读 / 解析进程池 / 预分叉的在途批次)，
+       源迭代器只在窗口有空位时才被拉取，最小到一次一个
+    批大小和窗口都降到底仍超预算时 (预算低于模型本身的占用) 记一次警告，
+    之后不再收紧；未设置预算时只记录各阶段的高水位
+    """
+
+    log = get_logger("pipeline")
+
+    def __init__(self, budget_mb=None, soft_ratio=0.85):
+        self.process = psutil.Process()
+        self.budget = int(budget_mb) * 1024**2 if budget_mb else None
+        self.soft_ratio = soft_ratio
+        self.high_water = {}  # stage -> 峰值 RSS (bytes)
+        self.events = collections.Counter()  # flushes / shrinks / throttles
+        # 读入窗口的缩放比例 (1 / 2 / 4 ...)，只收紧不放宽 (与批大小一致)
+        self.intake_divisor = 1
+        self.exhausted = False
+
+    def rss(self):
+        """本进程 + 所有子进程的 RSS (字节)；刚退出的子进程忽略"""
+        total = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return total
+
+    def mark(self, stage):
+        """记录某阶段结束时的 RSS，返回当前值"""
+        rss = self.rss()
+        if rss > self.high_water.get(stage, 0):
+            self.high_water[stage] = rss
+        return rss
+
+    def level(self):
+        if self.budget is None:
+            return "ok"
+        rss = self.rss()
+        if rss >= self.budget:
+            return "critical"
+        if rss >= self.budget * self.soft_ratio:
+            return "high"
+        return "ok"
+
+    def window(self, size):
+        """读入窗口 size 在当前背压下的实际大小 (至少 1)"""
+        return max(1, size // self.intake_divisor)
+
+    def relieve(self, flush, shrink, max_window=1):
+        """
+        flush(): 把缓冲写到磁盘 / 释放缓存
+        shrink(): 批大小减半，返回是否还能再减
+        max_window: 调用方最大的读入窗口，窗口已经降到 1 时不再收紧
+        """
+        if self.exhausted or self.level() == "ok":
+            return
+        flush()
+        gc.collect()
+        self.events["flushes"] += 1
+        if self.level() == "ok":
+            return
+        shrunk = shrink()
+        if shrunk:
+            self.events["shrinks"] += 1
+        if self.level() != "critical":
+            return
+        if self.window(max_window) > 1:
+            self.throttle()
+        elif not shrunk:
+            self.exhausted = True
+            self.log.warning(
+                f"⚠️ RSS {self.rss() / 1024**2:.0f} MB still over budget "
+                f"{self.budget / 1024**2:.0f} MB with minimal batches and intake; "
+                "no further backpressure (the budget may be smaller than the "
+                "loaded models)."
+            )
+
+    def throttle(self):
+        """读入窗口减半: 后续只在窗口有空位时才从源迭代器拉取"""
+        self.intake_divisor *= 2
+        self.events["throttles"] += 1
+        self.log.warning(
+            f"⚠️ RSS {self.rss() / 1024**2:.0f} MB over budget "
+            f"{self.budget / 1024**2:.0f} MB, intake windows -> "
+            f"1/{self.intake_divisor}"
+        )
+
+    def report(self):
+        mb = lambda v: round(v / 1024**2, 1)
+        return {
+            "budget_mb": mb(self.budget) if self.budget else None,
+            "peak_rss_mb": mb(max(self.high_water.values(), default=self.rss())),
+            "high_water_mb": {k: mb(v) for k, v in self.high_water.items()},
+            "flushes": self.events["flushes"],
+            "shrinks": self.events["shrinks"],
+            "throttles": self.events["throttles"],
+            "intake_divisor": self.intake_divisor,
+        }
@@ -0,0 +1,339 @@
+import os
+import re
+import math
+import zlib
+import random
+import hashlib
+import collections
+
+import numpy as np
+
+import serializer
+from corpus_logging import get_logger
+
+
+# ==========================================================
+# 级联预分类器: 便宜的逻辑回归先筛掉明显干净的段落，剩下的才送 DeBERTa
+# ==========================================================
+class ParagraphCascade:
+    """
+    DeBERTa 前面的级联预分类器: 词袋 (哈希) + 位置 + 提示词特征的逻辑回归
+    用模型自己过去的判断离线训练 (NER_CASCADE=collect 时收集样本)，
+    打分低于阈值 (按召回率目标从验证集选出) 的段落直接判为干净，不再推理
+    - on: 只按阈值放行
+    - audit: 放行的段落按 NER_CASCADE_AUDIT_RATE 抽样仍送模型，统计漏检率
+    """
+
+    log = get_logger("ner")
+
+    MODES = ["off", "collect", "on", "audit"]
+    HASH_DIM = 1 << 14
+    CUE_PATTERNS = [
+        re.compile(p, re.IGNORECASE)
+        for p in [
+            r"\bphoto\b|\bpicture\b|\bimage\b",
+            r"\bsource:|\bsources?\b",
+            r"read\s+more|more\s+on\s+this|related\s+stor",
+            r"sign\s+up|newsletter|subscribe",
+            r"click\s+here|follow\s+us|download\s+the",
+            r"copyright|all\s+rights\s+reserved|©|\(c\)",
+            r"https?://|www\.|\S+@\S+\.\w+",
+            r"reporting\s+by|editing\s+by|additional\s+reporting",
+            r"disclaimer|views\s+expressed",
+            r"^\W*(?:photo|source|read|file|caption)\b",
+        ]
+    ]
+    TOKEN_RE = re.compile(r"[a-z]+|\d+")
+    # 验证集里至少要有这么多噪音段落，阈值才可信
+    MIN_NOISY_VALIDATION = 20
+
+    def __init__(
+        self,
+        mode="off",
+        model_version="",
+        cache_dir=None,
+        recall=0.995,
+        audit_rate=0.05,
+        max_samples=50000,
+    ):
+        self.mode = mode if mode in self.MODES else "off"
+        self.model_version = model_version
+        self.recall = float(recall)
+        self.audit_rate = float(audit_rate)
+        self.max_samples = int(max_samples)
+        self.dir = os.path.join(cache_dir, "cascade") if cache_dir else None
+        self.samples = []
+        self.weights = None
+        self.threshold = None
+        self.rng = random.Random(0)
+        self.stats = collections.Counter()
+        if self.mode in ("on", "audit"):
+            self.load()
+
+    @property
+    def model_path(self):
+        return os.path.join(self.dir, "ner_cascade.npz") if self.dir else None
+
+    @property
+    def samples_path(self):
+        """样本按 DeBERTa 版本分文件存放，换模型后不会混入旧模型的标签"""
+        if not self.dir:
+            return None
+        model_hash = hashlib.sha1(self.model_version.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.dir, "samples", f"{model_hash}.jsonl")
+
+    # ---------- 特征 ----------
+    @classmethod
+    def features(cls, text, position, total):
+        """-> (稠密特征 ndarray, 哈希词索引 ndarray)"""
+        core = text.strip()
+        length = max(1, len(core))
+        from_end = total - 1 - position
+        dense = [
+            position / max(1, total - 1),
+            1.0 if from_end == 0 else 0.0,
+            1.0 if from_end < 3 else 0.0,
+            1.0 if position == 0 else 0.0,
+            math.log1p(length) / 7.0,
+            1.0 if length < 40 else 0.0,
+            sum(c.isdigit() for c in core) / length,
+            sum(c.isupper() for c in core) / length,
+            0.0 if core[-1:] in ".!?\"'”" else 1.0,
+        ]
+        dense.extend(1.0 if pat.search(core) else 0.0 for pat in cls.CUE_PATTERNS)
+        tokens = set(cls.TOKEN_RE.findall(core.lower()))
+        hashed = np.array(
+            sorted({zlib.crc32(t.encode("utf-8")) % cls.HASH_DIM for t in tokens}),
+            dtype=np.int64,
+        )
+        return np.array(dense, dtype=np.float32), hashed
+
+    def score(self, text, position, total):
+        dense, hashed = self.features(text, position, total)
+        w_dense, w_hash, bias = self.weights
+        z = float(dense @ w_dense + w_hash[hashed].sum() + bias)
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    # ---------- 推理时 ----------
+    def split(self, texts, indices):
+        """
+        indices: 需要判断的段落下标 (段落缓存未命中的)
+        返回 (送模型的下标, 直接放行的下标, 放行但抽样复核的下标)
+        """
+        if self.mode not in ("on", "audit") or self.weights is None:
+            return list(indices), [], set()
+        run, bypassed, audit = [], [], set()
+        total = len(texts)
+        for i in indices:
+            self.stats["checked"] += 1
+            if self.score(texts[i], i, total) >= self.threshold:
+                run.append(i)
+                continue
+            self.stats["bypassed"] += 1
+            if self.mode == "audit" and self.rng.random() < self.audit_rate:
+                audit.add(i)
+                run.append(i)
+            else:
+                bypassed.append(i)
+        return run, bypassed, audit
+
+    def observe(self, texts, run, labels, audit=()):
+        """模型结果回传: 统计复核漏检，collect 模式下记录训练样本"""
+        total = len(texts)
+        for i, label in zip(run, labels):
+            if i in audit:
+                self.stats["audited"] += 1
+                self.stats["audit_misses"] += int(label)
+            if self.mode == "collect" and len(self.samples) < self.max_samples:
+                self.samples.append(
+                    {"text": texts[i], "position": i, "total": total, "label": label}
+                )
+
+    def report(self):
+        checked = self.stats["checked"]
+        audited = self.stats["audited"]
+        report = {
+            "mode": self.mode,
+            "active": self.weights is not None,
+            "recall_target": self.recall,
+            "checked": checked,
+            "bypassed": self.stats["bypassed"],
+            "bypass_rate": (
+                round(self.stats["bypassed"] / checked, 3) if checked else 0.0
+            ),
+        }
+        if self.mode == "audit":
+            report["audited"] = audited
+            report["audit_misses"] = self.stats["audit_misses"]
+            report["miss_rate"] = (
+                round(self.stats["audit_misses"] / audited, 4) if audited else 0.0
+            )
+        if self.mode == "collect":
+            report["samples_collected"] = len(self.samples)
+        return report
+
+    # ---------- 预分叉工作进程 ----------
+    def drain_delta(self):
+        """上次调用以来的统计和新样本 (工作进程里随之清空)"""
+        delta = {"stats": dict(self.stats), "samples": self.samples}
+        self.stats = collections.Counter()
+        self.samples = []
+        return delta
+
+    def merge_delta(self, delta):
+        """父进程: 合并工作进程发回的统计和样本 (样本总数仍受 max_samples 限制)"""
+        self.stats.update(delta["stats"])
+        room = max(0, self.max_samples - len(self.samples))
+        self.samples.extend(delta["samples"][:room])
+
+    # ---------- 持久化 ----------
+    def load(self):
+        path = self.model_path
+        if not path or not os.path.exists(path):
+            self.log.warning(
+                "⚠️ No trained cascade found, every paragraph goes to DeBERTa. "
+                "Run with NER_CASCADE=collect, then train it."
+            )
+            return
+        try:
+            data = np.load(path, allow_pickle=False)
+            if str(data["model_version"]) != self.model_version:
+                self.log.info(
+                    "ℹ️ Cascade was trained for another model version, ignored."
+                )
+                return
+            noisy_scores = data["noisy_scores"]
+            self.weights = (data["w_dense"], data["w_hash"], float(data["bias"]))
+            # 召回率目标可以运行时调整: 阈值取验证集噪音段落分数的对应分位数
+            self.threshold = float(
+                np.quantile(noisy_scores, 1.0 - self.recall, method="lower")
+            )
+            self.log.info(
+                f"✅ Cascade loaded (recall target {self.recall:.3f}, "
+                f"threshold {self.threshold:.4f})."
+            )
+        except Exception as e:
+            self.log.warning(f"⚠️ Cascade load failed ({e}), disabled.")
+            self.weights = None
+
+    def save_samples(self):
+        """collect 模式: 本次运行的样本追加到缓存目录"""
+        if not self.samples or not self.samples_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.samples_path), exist_ok=True)
+            with open(self.samples_path, "ab") as f:
+                for sample in self.samples:
+                    sample["model_version"] = self.model_version
+                    f.write(serializer.dumpb(sample) + b"\n")
+            self.log.info(f"💾 Saved {len(self.samples)} cascade training samples.")
+            self.samples = []
+        except Exception as e:
+            self.log.error(f"❌ Failed to save cascade samples: {e}")
+
+    # ---------- 离线训练 ----------
+    @classmethod
+    def train(
+        cls,
+        cache_dir,
+        model_version="",
+        recall=0.995,
+        max_samples=500000,
+        epochs=30,
+        lr=0.5,
+        l2=1e-5,
+        seed=0,
+    ):
+        """
+        用收集到的样本训练逻辑回归，20% 留作验证集选阈值
+        返回训练报告 dict；样本不足时 report["error"] 说明原因
+        """
+        cascade = cls("collect", model_version, cache_dir, recall)
+        path = cascade.samples_path
+        if not path or not os.path.exists(path):
+            return {"error": "no_samples"}
+        with open(path, "rb") as f:
+            lines = f.readlines()[-max_samples:]
+        samples = [
+            sample
+            for sample in (serializer.loads(line) for line in lines if line.strip())
+            if sample.get("model_version", model_version) == model_version
+        ]
+        if not samples:
+            return {"error": "no_samples"}
+
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(samples))
+        feats = [cls.features(s["text"], s["position"], s["total"]) for s in samples]
+        dense = np.stack([f[0] for f in feats]) if feats else np.zeros((0, 0))
+        hashed = [f[1] for f in feats]
+        labels = np.array([float(s["label"]) for s in samples], dtype=np.float32)
+
+        n_val = len(samples) // 5
+        val_idx, train_idx = order[:n_val], order[n_val:]
+        n_noisy_val = int(labels[val_idx].sum())
+        if n_noisy_val < cls.MIN_NOISY_VALIDATION:
+            return {
+                "error": "not_enough_noisy_samples",
+                "samples": len(samples),
+                "noisy_validation": n_noisy_val,
+            }
+
+        # 噪音段落是少数类，按类别频率加权
+        pos_rate = min(1 - 1e-3, max(1e-3, float(labels[train_idx].mean())))
+        class_weight = np.where(labels > 0, 0.5 / pos_rate, 0.5 / (1 - pos_rate))
+
+        w_dense = np.zeros(dense.shape[1], dtype=np.float64)
+        w_hash = np.zeros(cls.HASH_DIM, dtype=np.float64)
+        bias = 0.0
+
+        def logits(idx):
+            z = dense[idx] @ w_dense + bias
+            z += np.array([w_hash[hashed[i]].sum() for i in idx])
+            return z
+
+        batch = 256
+        for epoch in range(epochs):
+            step = lr / (1 + epoch * 0.2)
+            for b in range(0, len(train_idx), batch):
+                idx = train_idx[rng.permutation(len(train_idx))[b : b + batch]]
+                p = 1.0 / (1.0 + np.exp(-np.clip(logits(idx), -30, 30)))
+                g = (p - labels[idx]) * class_weight[idx] / len(idx)
+                w_dense -= step * (dense[idx].T @ g + l2 * w_dense)
+                bias -= step * g.sum()
+                grad_hash = np.zeros_like(w_hash)
+                for gi, i in zip(g, idx):
+                    grad_hash[hashed[i]] += gi
+                w_hash -= step * (grad_hash + l2 * w_hash)
+
+        val_scores = 1.0 / (1.0 + np.exp(-np.clip(logits(val_idx), -30, 30)))
+        noisy_scores = np.sort(val_scores[labels[val_idx] > 0])
+        threshold = float(np.quantile(noisy_scores, 1.0 - recall, method="lower"))
+        clean_val = labels[val_idx] == 0
+
+        os.makedirs(cascade.dir, exist_ok=True)
+        tmp_path = cascade.model_path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            w_dense=w_dense.astype(np.float32),
+            w_hash=w_hash.astype(np.float32),
+            bias=np.float64(bias),
+            noisy_scores=noisy_scores.astype(np.float64),
+            model_version=np.str_(model_version),
+        )
+        os.replace(tmp_path, cascade.model_path)
+
+        return {
+            "samples": len(samples),
+            "noisy_rate": round(float(labels.mean()), 4),
+            "validation": int(n_val),
+            "recall_target": recall,
+            "threshold": round(threshold, 6),
+            "validation_recall": round(float((noisy_scores >= threshold).mean()), 4),
+            # 验证集上可以跳过推理的段落比例
+            "bypass_rate": round(float((val_scores < threshold).mean()), 4),
+            "clean_bypass_rate": round(
+                float((val_scores[clean_val] < threshold).mean()), 4
+            ),
+            "path": cascade.model_path,
+        }
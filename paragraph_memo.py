@@ -0,0 +1,193 @@
+import os
+import re
+import pickle
+import hashlib
+import collections
+
+import numpy as np
+
+from corpus_logging import get_logger
+
+
+# ==========================================================
+# 段落预测缓存: 重复出现的样板段落直接复用噪音掩码，跳过分词和推理
+# ==========================================================
+class ParagraphMemo:
+    """
+    LRU 缓存: key = 模型版本 + 规范化段落的哈希
+    (去掉首尾空白，内部连续空白和 NBSP 折叠成一个空格，RTF 导出里常见)
+    value = 规范化文本上的逐字符噪音掩码 (packbits 压缩)，取出时按偏移映射还原到原文
+    Newsletter 订阅、READ MORE、图片来源、出版商声明这类段落会在同一来源下反复出现，
+    命中后直接复用掩码，不再分词和推理
+    """
+
+    log = get_logger("memo")
+
+    # Unicode 模式下 \s 包含 NBSP (\u00a0)
+    _WHITESPACE = re.compile(r"\s+")
+
+    def __init__(self, capacity=20000, model_version="", persist_path=None):
+        self.capacity = max(1, int(capacity))
+        self.model_version = model_version
+        self.persist_path = persist_path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.by_source = {}  # source -> [hits, misses]
+        # 预分叉工作进程里记录新写入的条目，随批次结果发回父进程 (None 不记录)
+        self.journal = None
+        if persist_path:
+            self.load()
+
+    def _key(self, core):
+        digest = hashlib.sha1(self.model_version.encode("utf-8") + b"\0")
+        digest.update(core.encode("utf-8"))
+        return digest.digest()
+
+    @classmethod
+    def _normalize(cls, text):
+        """
+        返回 (规范化内容, starts)
+        starts[j] 为第 j 个规范化字符在原文中的起点，末尾多一个终点，
+        相邻两项之差即该字符覆盖的原文长度 (折叠的空白覆盖整段空白)
+        """
+        lead = len(text) - len(text.lstrip())
+        end = len(text.rstrip())
+        parts, starts = [], []
+        pos = lead
+        for match in cls._WHITESPACE.finditer(text, lead, end):
+            parts.append(text[pos : match.start()])
+            starts.extend(range(pos, match.start()))
+            parts.append(" ")
+            starts.append(match.start())
+            pos = match.end()
+        parts.append(text[pos:end])
+        starts.extend(range(pos, end))
+        starts.append(max(end, lead))
+        return "".join(parts), np.asarray(starts, dtype=np.int64)
+
+    def get(self, text, source=""):
+        core, starts = self._normalize(text)
+        key = self._key(core)
+        entry = self.entries.get(key)
+        stats = self.by_source.setdefault(source or "", [0, 0])
+        if entry is None:
+            self.misses += 1
+            stats[1] += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        stats[0] += 1
+        packed, core_len = entry
+        core_mask = np.unpackbits(packed, count=core_len).astype(bool)
+        mask = np.zeros(len(text), dtype=bool)
+        mask[starts[0] : starts[-1]] = np.repeat(core_mask, np.diff(starts))
+        return mask
+
+    def put(self, text, mask):
+        core, starts = self._normalize(text)
+        if core:
+            # 折叠的空白只要有一个字符被判为噪音，就整段记为噪音
+            core_mask = np.logical_or.reduceat(
+                np.asarray(mask[starts[0] : starts[-1]], dtype=bool),
+                starts[:-1] - starts[0],
+            )
+        else:
+            core_mask = np.zeros(0, dtype=bool)
+        key = self._key(core)
+        self.entries[key] = (np.packbits(core_mask), len(core))
+        self.entries.move_to_end(key)
+        if self.journal is not None:
+            self.journal.append((key, self.entries[key]))
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def shrink(self, ratio=0.5):
+        """内存紧张时丢掉最久未用的一部分条目"""
+        target = int(len(self.entries) * ratio)
+        while len(self.entries) > target:
+            self.entries.popitem(last=False)
+
+    def report(self):
+        def rate(h, m):
+            return round(h / (h + m), 3) if (h + m) else 0.0
+
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": rate(self.hits, self.misses),
+            "by_source": {
+                src: {"hits": h, "misses": m, "hit_rate": rate(h, m)}
+                for src, (h, m) in sorted(
+                    self.by_source.items(), key=lambda kv: -(kv[1][0] + kv[1][1])
+                )
+            },
+        }
+
+    # ---------- 预分叉工作进程 ----------
+    def drain_delta(self):
+        """上次调用以来新写入的条目和命中统计 (工作进程里的计数随之清零)"""
+        delta = {
+            "entries": self.journal or [],
+            "hits": self.hits,
+            "misses": self.misses,
+            "by_source": self.by_source,
+        }
+        if self.journal is not None:
+            self.journal = []
+        self.hits = self.misses = 0
+        self.by_source = {}
+        return delta
+
+    def merge_delta(self, delta):
+        """父进程: 合并工作进程发回的条目和统计"""
+        for key, value in delta["entries"]:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        self.hits += delta["hits"]
+        self.misses += delta["misses"]
+        for src, (hits, misses) in delta["by_source"].items():
+            stats = self.by_source.setdefault(src, [0, 0])
+            stats[0] += hits
+            stats[1] += misses
+
+    # ---------- 持久化 ----------
+    def load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("model_version") != self.model_version:
+                self.log.info(
+                    "ℹ️ Paragraph memo belongs to another model version, ignored."
+                )
+                return
+            for key, value in data["entries"][-self.capacity :]:
+                self.entries[key] = value
+            self.log.info(f"✅ Loaded {len(self.entries)} memoized paragraphs.")
+        except Exception as e:
+            self.log.warning(f"⚠️ Paragraph memo load failed ({e}), starting empty.")
+
+    def save(self):
+        if not self.persist_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+            tmp_path = self.persist_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(
+                    {
+                        "model_version": self.model_version,
+                        "entries": list(self.entries.items()),
+                    },
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            self.log.error(f"❌ Failed to save paragraph memo: {e}")
@@ -1,18 +1,56 @@
 import os
 import re
+import sys
+import logging
+import logging.handlers
 import json
+import time
+import zlib
+import itertools
+import collections
+import concurrent.futures
+import csv
+import multiprocessing
+import hashlib
+import pickle
 import pandas as pd
 import nltk
 import torch
 import transformers
 import unicodedata
 import numpy as np
-import platform
 import psutil
 import gc
+import warnings
+import functools
 from striprtf.striprtf import rtf_to_text
 from transformers import AutoTokenizer, AutoModelForTokenClassification
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
+import serializer
+from corpus_logging import (
+    LOGGER_ROOT,
+    LOG_STAGES,
+    LOG_LEVELS,
+    get_logger,
+    setup_logging,
+    shutdown_logging,
+    ensure_logging,
+    set_log_level,
+)
+from autotune import DEFAULT_CACHE_DIR, HardwareAutotuner
+from export_sink import CorpusExportSink
+from review_store import ReviewStore
+from paragraph_memo import ParagraphMemo
+from folder_watcher import WATCH_TOTAL_KEYS, FolderWatcher
+from memory_governor import MemoryGovernor
+from paragraph_cascade import ParagraphCascade
+from semantic_short_circuit import SemanticShortCircuit
+from profiler import SamplingProfiler
+from file_discovery import FileEntry, read_file
+from archive_io import RTFArchive, ArchiveOutput
+from catalog import CorpusCatalog
+from semantic_config import resolve_semantic_config_path
+from structural_rules import StructuralRuleSet
 
 transformers.logging.set_verbosity_error()
 
@@ -27,14 +65,41 @@ except LookupError:
 # 工具类: 设备管理
 # ==================================================
 class DeviceManager:
+    log = get_logger("device")
+
+    # 精度名称 -> torch dtype (CLI / 配置中使用)
+    PRECISIONS = {
+        "fp32": torch.float32,
+        "fp16": torch.float16,
+        "bf16": torch.bfloat16,
+    }
+
     @staticmethod
-    def get_optimal_device():
-        """自动检测最佳运行设备: cuda, mps, 或 cpu"""
+    def get_optimal_device(preferred=None):
+        """
+        自动检测最佳运行设备: cuda, mps, 或 cpu
+        preferred: 强制指定设备 ("cpu" / "cuda" / "mps")，None 或 "auto" 为自动检测
+        """
         device = "cpu"
         info = {"type": "cpu", "vram": 0, "desc": "Standard Processing Unit"}
 
+        if preferred == "cpu":
+            return device, info
+        if preferred == "cuda" and not torch.cuda.is_available():
+            DeviceManager.log.warning(
+                "⚠️ CUDA requested but not available, falling back to auto-detect."
+            )
+            preferred = None
+        if preferred == "mps" and not (
+            hasattr(torch.backends, "mps") and torch.backends.mps.is_available()
+        ):
+            DeviceManager.log.warning(
+                "⚠️ MPS requested but not available, falling back to auto-detect."
+            )
+            preferred = None
+
         # A. 检测 NVIDIA GPU
-        if torch.cuda.is_available():
+        if torch.cuda.is_available() and preferred != "mps":
             device = "cuda"
             try:
                 device_name = torch.cuda.get_device_name(0)
@@ -61,8 +126,22 @@ class DeviceManager:
         return device, info
 
     @staticmethod
-    def get_model_kwargs(device):
-        """根据设备返回模型加载参数"""
+    def get_model_kwargs(device, precision=None):
+        """
+        根据设备返回模型加载参数
+        precision: "fp32" / "fp16" / "bf16"，None 或 "auto" 使用设备默认值
+        """
+        if precision and precision != "auto":
+            if precision not in DeviceManager.PRECISIONS:
+                raise ValueError(f"Unknown precision: {precision}")
+            if device == "cpu" and precision == "fp16":
+                # CPU 上很多算子不支持 half，退回 float32
+                DeviceManager.log.warning(
+                    "⚠️ fp16 is not supported on CPU, using fp32 instead."
+                )
+                precision = "fp32"
+            return {"torch_dtype": DeviceManager.PRECISIONS[precision]}
+
         kwargs = {}
         if device == "cuda":
             # 显存够的话可以用 float16 加速
@@ -76,10 +155,28 @@ class DeviceManager:
         return kwargs
 
 
+def read_model_version(model_path):
+    """模型版本: 优先读 version.txt (HF commit)，否则用权重文件的修改时间"""
+    version_file = os.path.join(model_path, "version.txt")
+    if os.path.exists(version_file):
+        with open(version_file, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    stamps = []
+    if os.path.isdir(model_path):
+        for name in sorted(os.listdir(model_path)):
+            if name.endswith((".safetensors", ".bin", "config.json")):
+                stamps.append(
+                    f"{name}:{os.path.getmtime(os.path.join(model_path, name))}"
+                )
+    return f"{model_path}|{'|'.join(stamps)}"
+
+
 # ==================================================
 # 工具类: 文本格式化
 # ==================================================
 class TextFormatter:
+    log = get_logger("formatter")
+
     @staticmethod
     def format_text(text):
         if not text:
@@ -91,7 +188,7 @@ class TextFormatter:
         text = re.sub(r"(\w+)\s+([.,;:?!])", r"\1\2", text)
         text = re.sub(r" +", " ", text)
         text = re.sub(r"\n{3,}", "\n\n", text)
-        print(f"✅ TextFormatter ran on {len(text)} chars")  # Debug 信号
+        TextFormatter.log.debug("✅ TextFormatter ran on %d chars", len(text))
         return text.strip()
 
 
@@ -99,11 +196,23 @@ class TextFormatter:
 # 模块 1: RTF 处理与基础清洗
 # ==================================================
 class RTFHandler:
+    log = get_logger("rtf")
+
     @staticmethod
     def to_text(file_path):
         try:
             with open(file_path, "rb") as f:
-                content = f.read().decode("cp1252", errors="ignore")
+                data = f.read()
+        except Exception as e:
+            RTFHandler.log.error(f"❌ RTF Error {file_path}: {e}")
+            return ""
+        return RTFHandler.bytes_to_text(data, file_path)
+
+    @staticmethod
+    def bytes_to_text(data, name="<bytes>"):
+        """RTF 原始字节 -> 纯文本 (不需要落盘，内存/压缩包/HTTP 输入共用)"""
+        try:
+            content = data.decode("cp1252", errors="ignore")
 
             # 1. 核心修复：SPh Media 特有格式
             content = content.replace(r"\u169?", "(c)")
@@ -148,10 +257,98 @@ class RTFHandler:
 
             return text.strip()
         except Exception as e:
-            print(f"❌ RTF Error {file_path}: {e}")
+            RTFHandler.log.error(f"❌ RTF Error {name}: {e}")
             return ""
 
 
+# ==================================================
+# 工具类: 文档对象 (各阶段共用的派生视图)
+# ==================================================
+class Document:
+    """
+    一篇文章的纯文本 + 按需计算并缓存的派生视图 (行及偏移、小写文本、
+    Header / Body / Footer 边界、正文段落)，在关键词门、结构分析、
+    NER 清洗和语义过滤之间传递，同一份视图只算一次
+    """
+
+    def __init__(self, text, doc_id="", meta_extractor=None):
+        self.text = text or ""
+        self.doc_id = doc_id
+        self.meta_extractor = meta_extractor
+
+    @functools.cached_property
+    def lines(self):
+        """[{"text" (含换行符), "content" (不含), "stripped", "start", "end"}, ...]"""
+        lines = []
+        cursor = 0
+        for line, content in zip(
+            self.text.splitlines(keepends=True), self.text.splitlines()
+        ):
+            lines.append(
+                {
+                    "text": line,
+                    "content": content,
+                    "stripped": line.strip(),
+                    "start": cursor,
+                    "end": cursor + len(line),
+                }
+            )
+            cursor += len(line)
+        return lines
+
+    @functools.cached_property
+    def first_line(self):
+        return self.text.split("\n", 1)[0]
+
+    @functools.cached_property
+    def titled_text(self):
+        """关键词门检查的文本: 标题 + 全文"""
+        return self.first_line + "\n" + self.text
+
+    @functools.cached_property
+    def titled_lower(self):
+        return self.titled_text.lower()
+
+    @functools.cached_property
+    def structure(self):
+        """(header_end, footer_start, meta)"""
+        return (self.meta_extractor or _META_EXTRACTOR).analyze_structure(self)
+
+    @property
+    def header_end(self):
+        return self.structure[0]
+
+    @property
+    def footer_start(self):
+        return self.structure[1]
+
+    @property
+    def meta(self):
+        return self.structure[2]
+
+    @functools.cached_property
+    def body_offset(self):
+        """正文 (去掉开头空白后) 在全文中的起始位置"""
+        body = self.text[self.header_end : self.footer_start]
+        return self.header_end + len(body) - len(body.lstrip())
+
+    @functools.cached_property
+    def body(self):
+        if self.header_end >= self.footer_start:
+            return ""
+        return self.text[self.body_offset : self.footer_start]
+
+    @functools.cached_property
+    def paragraphs(self):
+        """正文的 [(全文中的起始位置, 段落 (含换行符)), ...]"""
+        paragraphs = []
+        cursor = self.body_offset
+        for para in self.body.splitlines(keepends=True):
+            paragraphs.append((cursor, para))
+            cursor += len(para)
+        return paragraphs
+
+
 # ==================================================
 # 结构性噪音清洗 (整篇删除)
 # ==================================================
@@ -164,8 +361,9 @@ class StructuralCleaner:
         )
 
     def is_skippable(self, text):
-        # 检查前 5 行是否命中跳过规则
-        header_sample = " ".join(text.splitlines()[:5])
+        # 检查前 5 行是否命中跳过规则 (text 可以是 str 或 Document)
+        doc = text if isinstance(text, Document) else Document(text)
+        header_sample = " ".join(line["content"] for line in doc.lines[:5])
         return bool(self.SKIP_BRIEFING_PATTERN.search(header_sample))
 
 
@@ -185,20 +383,11 @@ class MetaExtractor:
         返回: (header_end_char, footer_start_char, metadata_dict)
         1. Header: 依然使用特征查找 (Date/Source)
         2. Footer: 直接定位到倒数第 2 个非空行 (Blind Cut)
+        text 可以是 str 或 Document (复用已经切好的行)
         """
-        lines_info = []
-        cursor = 0
-        for line in text.splitlines(keepends=True):
-            stripped = line.strip()
-            lines_info.append(
-                {
-                    "text": line,
-                    "stripped": stripped,
-                    "start": cursor,
-                    "end": cursor + len(line),
-                }
-            )
-            cursor += len(line)
+        doc = text if isinstance(text, Document) else Document(text)
+        text = doc.text
+        lines_info = doc.lines
 
         if not lines_info:
             return 0, len(text), {"title": "", "date": "", "source": ""}
@@ -310,47 +499,61 @@ class MetaExtractor:
         )
 
 
+# Document.structure 使用的共享实例 (无状态，只有正则)
+_META_EXTRACTOR = MetaExtractor()
+
+
+class _LogitsOnly(torch.nn.Module):
+    """TorchScript 追踪用: 只返回 logits 张量"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
 # ==================================================
 # 模块 3: AI 清洗 (混合架构：AI + Regex + 句子平滑)
 # ==================================================
 class NERCleaner:
+    log = get_logger("ner")
+
+    # 编译 / 追踪模式下把序列长度补齐到这些桶，限制需要生成的图的数量
+    LENGTH_BUCKETS = [32, 64, 128, 256, 512]
+    # 预热时跑的长度桶 (512 很少见，首次遇到时再生成)
+    WARMUP_BUCKETS = [32, 64, 128, 256]
+    # 序列打包: 不超过这个 token 数的段落才参与拼接；拼接后的序列上限
+    # (512 减去 [CLS] / [SEP] 再留一点余量)
+    PACK_SHORT_TOKENS = 128
+    PACK_MAX_TOKENS = 500
+
     def __init__(self, model_configs):
         # 1. 设备选择
-        self.device, self.device_info = DeviceManager.get_optimal_device()
-        print(f"🤖 Noise Cleaner (DeBERTa) running on: {self.device_info['desc']}")
+        self.device, self.device_info = DeviceManager.get_optimal_device(
+            model_configs.get("DEVICE")
+        )
+        self.log.info(
+            f"🤖 Noise Cleaner (DeBERTa) running on: {self.device_info['desc']}"
+        )
 
         self.tokenizer = None
         self.model = None
-
-        # 结构性噪音正则
-        self.PAT_STRUCTURAL_NOISE = [
-            re.compile(
-                r"(?:(?<=[.!?])\s*)?(More\s+On\s+This\s+Topic|Related\s+Stor(?:y|ies)).*?$",
-                re.IGNORECASE | re.MULTILINE,
-            ),
-            re.compile(
-                r"(?:(?<=[.!?])\s*)?(READ\s+MORE\s+(?:HERE|ABOUT)|Click\s+here\s+to\s+read).*?(?=\n\n|$)",
-                re.IGNORECASE | re.DOTALL,
-            ),
-            re.compile(
-                r"Sign\s+up\s+for\s+the\s+ST\s+Asian\s+Insider\s+newsletter.*?(?=\n\n|$)",
-                re.IGNORECASE,
-            ),
-            re.compile(
-                r"Disclaimer:\s+The\s+Above\s+Content\s+is\s+Auto-Translated.*",
-                re.IGNORECASE | re.DOTALL,
-            ),
-            re.compile(r"\[Category:.*?\]", re.IGNORECASE),
-            # 1. 印尼/评论文章结尾的 Bio 分割线
-            # 遇到 "______" 或 "-----" 就把后面全删了
-            re.compile(r"(?m)^\s*[_\-]{5,}\s*[\s\S]*$"),
-            # 2. 常见的免责声明 (作为补充，防止分割线漏掉)
-            re.compile(
-                r"(?i)^The\s+views\s+expressed\s+are\s+(personal|solely\s+those\s+of\s+the\s+author).*$",
-                re.MULTILINE,
-            ),
-            # 新增规则可以继续添加...
-        ]
+        # 每次前向推理的段落数量
+        self.batch_size = max(1, int(model_configs.get("NER_BATCH_SIZE") or 16))
+        # 推理模式: eager (默认) / compile (torch.compile) / trace (TorchScript)
+        self.inference_mode = model_configs.get("INFERENCE_MODE") or "eager"
+        self.compiled_model = None
+        self.compiled_shapes = set()  # 编译模式下见过的 (batch, length) 桶形状
+        self.traced_graphs = {}  # (batch, length) -> TorchScript 模块
+        cache_dir = model_configs.get("CACHE_DIR")
+        self.compiled_dir = os.path.join(cache_dir, "compiled") if cache_dir else None
+
+        # 结构性噪音规则 (线性扫描 / 限时正则，见 StructuralRuleSet)
+        self.structural_rules = StructuralRuleSet(
+            model_configs.get("STRUCTURAL_RULE_BUDGET_MS", 200)
+        )
 
         # 2. 加载模型
         model_path = model_configs.get("NOISE_CAPTION")
@@ -358,17 +561,19 @@ class NERCleaner:
         if not model_path:
             # 使用默认模型路径
             model_path = "microsoft/mdeberta-v3-base"
-            print(
+            self.log.warning(
                 f"⚠️ Warning: 'NOISE_CAPTION' not in config, using default: {model_path}"
             )
 
-        print(f"   ↳ Loading DeBERTa from {model_path} ...")
+        self.log.info(f"   ↳ Loading DeBERTa from {model_path} ...")
 
         try:
             self.tokenizer = AutoTokenizer.from_pretrained(model_path)
 
             # 根据设备选择加载参数
-            model_kwargs = DeviceManager.get_model_kwargs(self.device)
+            model_kwargs = DeviceManager.get_model_kwargs(
+                self.device, model_configs.get("PRECISION")
+            )
 
             self.model = AutoModelForTokenClassification.from_pretrained(
                 model_path, **model_kwargs
@@ -377,66 +582,154 @@ class NERCleaner:
             self.model.eval()
             self.noise_label_id = 1
         except Exception as e:
-            print(f"❌ DeBERTa Model Load Failed: {e}")
+            self.log.error(f"❌ DeBERTa Model Load Failed: {e}")
+
+        self.model_version = read_model_version(model_path)
+        if self.model is not None and self.inference_mode == "compile":
+            self._compile_model()
+
+        # 3. 段落预测缓存 (PARAGRAPH_MEMO_SIZE=0 关闭)
+        # 打包推理的掩码受相邻段落影响，和逐段推理的掩码分开缓存
+        self.packing = model_configs.get("NER_PACKING") or "off"
+        memo_variant = "_packed" if self.packing == "on" else ""
+        self.memo = None
+        memo_size = int(model_configs.get("PARAGRAPH_MEMO_SIZE", 20000))
+        if memo_size > 0:
+            persist_path = None
+            if model_configs.get("PARAGRAPH_MEMO_PERSIST", True):
+                persist_path = os.path.join(
+                    model_configs.get("CACHE_DIR") or DEFAULT_CACHE_DIR,
+                    f"paragraph_memo{memo_variant}.pkl",
+                )
+            self.memo = ParagraphMemo(
+                memo_size, self.model_version + memo_variant, persist_path
+            )
 
-    def clean(self, raw_text, header_end, footer_start, protected_keywords=None):
+        # 4. 级联预分类器 (NER_CASCADE: off / collect / on / audit)
+        self.cascade = None
+        cascade_mode = model_configs.get("NER_CASCADE") or "off"
+        if cascade_mode != "off":
+            self.cascade = ParagraphCascade(
+                cascade_mode,
+                self.model_version,
+                model_configs.get("CACHE_DIR") or DEFAULT_CACHE_DIR,
+                recall=model_configs.get("NER_CASCADE_RECALL", 0.995),
+                audit_rate=model_configs.get("NER_CASCADE_AUDIT_RATE", 0.05),
+            )
+
+        # 5. 短段落序列打包 (NER_PACKING: off / on / validate)
+        self.packing_tolerance = float(model_configs.get("NER_PACKING_TOLERANCE", 0.01))
+        self.packing_stats = collections.Counter()
+        self.pack_separator, self.pack_separator_tokens = "\n\n", 0
+        if self.tokenizer is not None:
+            # 用模型认识的 [SEP] 隔开段落，让模型看到段落边界
+            if self.tokenizer.sep_token:
+                self.pack_separator = f" {self.tokenizer.sep_token} "
+            self.pack_separator_tokens = len(
+                self.tokenizer(self.pack_separator, add_special_tokens=False)[
+                    "input_ids"
+                ]
+            )
+
+    def clean(
+        self,
+        raw_text,
+        header_end=None,
+        footer_start=None,
+        protected_keywords=None,
+        source="",
+    ):
         """
-        raw_text: 全文
-        header_end / footer_start: 正文的起止位置
+        raw_text: 全文，或 Document (此时正文边界和段落直接取自文档)
+        header_end / footer_start: 正文的起止位置 (raw_text 为 str 时必填)
         protected_keywords: 如果句子包含这些词，强制不进行AI整句删除
+        source: 文章来源 (仅用于按来源统计缓存命中率)
+        """
+        if isinstance(raw_text, Document):
+            doc = raw_text
+        else:
+            doc = Document(raw_text)
+            doc.structure = (header_end, footer_start, {})
+        return self.clean_many([doc], protected_keywords, [source])[0]
+
+    def clean_many(self, docs, protected_keywords=None, sources=None):
         """
+        一批文章一起清洗 (流水线的一个批次 / HTTP 服务合并的并发请求):
+        各文章缓存未命中的段落合并成一次推理，返回 [(正文, 删除片段), ...]
+        sources: 各文章的来源 (仅用于按来源统计缓存命中率)
+        """
+        sources = sources or [""] * len(docs)
+        articles = [self._body_paragraphs(doc) for doc in docs]
+        if self.model:
+            # 所有文章的段落按批次送入模型 (缓存命中的段落跳过)
+            masks = self._noise_masks_for_articles(
+                [
+                    (texts, source, positions)
+                    for (texts, _, positions), source in zip(articles, sources)
+                ]
+            )
+        else:
+            masks = [None] * len(docs)
+        return [
+            self._clean_body(doc, texts, offsets, article_masks, protected_keywords)
+            for doc, (texts, offsets, _), article_masks in zip(docs, articles, masks)
+        ]
+
+    @staticmethod
+    def _body_paragraphs(doc):
+        """
+        正文里要送模型的段落 -> (文本, 绝对坐标, 在文章中的序号) 三个列表
+        序号用于打包时判断段落是否相连
+        """
+        para_texts, para_offsets, para_positions = [], [], []
+        if doc.header_end >= doc.footer_start:
+            return para_texts, para_offsets, para_positions
+        for position, (abs_offset, para) in enumerate(doc.paragraphs):
+            if len(para.strip()) >= 5:
+                para_texts.append(para)
+                # 绝对坐标
+                para_offsets.append(abs_offset)
+                para_positions.append(position)
+        return para_texts, para_offsets, para_positions
+
+    def _clean_body(self, doc, para_texts, para_offsets, masks, protected_keywords):
+        """单篇文章: 模型掩码 (masks 为 None 时跳过) + 结构性规则 -> 重组正文"""
         # 1. 提取正文主体
-        if header_end >= footer_start:
+        if doc.header_end >= doc.footer_start:
             return "", []
 
-        raw_body = raw_text[header_end:footer_start].lstrip()
+        raw_body = doc.body
         # 计算偏移量以便最后返回 span (虽然现在主要用 text)
-        skipped_len = len(raw_text[header_end:footer_start]) - len(raw_body)
-        body_offset = header_end + skipped_len
+        body_offset = doc.body_offset
 
         all_deleted_spans = []  # 用于收集所有被删除的片段
 
         # =========================================
         # 1. 执行 AI 扫描 (只记录位置，不生成文本)
         # =========================================
-        if self.model:
-            paragraphs = raw_body.splitlines(keepends=True)
-            current_rel_pos = 0
-
-            for para in paragraphs:
-                if len(para.strip()) < 5:
-                    current_rel_pos += len(para)
-                    continue
-
-                # 计算绝对坐标
-                abs_offset = body_offset + current_rel_pos
-
+        if masks is not None:
+            for para, abs_offset, mask in zip(para_texts, para_offsets, masks):
                 # 获取 AI 认为该删的片段
-                _, deleted_in_para = self._ai_clean_paragraph(
-                    para, abs_offset, protected_keywords
+                _, deleted_in_para = self._apply_sentence_logic(
+                    para, mask, abs_offset, protected_keywords
                 )
                 all_deleted_spans.extend(deleted_in_para)
-                current_rel_pos += len(para)
 
         # =========================================
         # 2. 执行 Regex 扫描
         # =========================================
         # 我们在 raw_body 上直接跑正则，找到所有结构性噪音
-        for pat in self.PAT_STRUCTURAL_NOISE:
-            for match in pat.finditer(raw_body):
-                start_idx = match.start()
-                end_idx = match.end()
-
-                # 记录 Regex 删除的片段
-                all_deleted_spans.append(
-                    {
-                        "start": body_offset + start_idx,
-                        "end": body_offset + end_idx,
-                        "type": "STRUCTURAL_NOISE (Regex)",  # 前端显示为结构性噪音
-                        "score": 1.0,
-                        "text": match.group(),
-                    }
-                )
+        for start_idx, end_idx in self.structural_rules.spans(raw_body, doc.doc_id):
+            # 记录 Regex 删除的片段
+            all_deleted_spans.append(
+                {
+                    "start": body_offset + start_idx,
+                    "end": body_offset + end_idx,
+                    "type": "STRUCTURAL_NOISE (Regex)",  # 前端显示为结构性噪音
+                    "score": 1.0,
+                    "text": raw_body[start_idx:end_idx],
+                }
+            )
 
         # =========================================
         # 3. 文本重组
@@ -488,34 +781,405 @@ class NERCleaner:
         if not text.strip():
             return text, []
 
-        inputs = self.tokenizer(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            return_offsets_mapping=True,
-            padding="longest",
-        ).to(self.device)
-        offsets = inputs["offset_mapping"][0].cpu().numpy()
-
-        with torch.no_grad():
-            outputs = self.model(
-                input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]
-            )
-            predictions = torch.argmax(outputs.logits, dim=2)[0].cpu().numpy()
-
-        n = len(text)
-        char_is_noise = np.zeros(n, dtype=bool)
-        for i, (start, end) in enumerate(offsets):
-            if start == end:
-                continue
-            if predictions[i] == self.noise_label_id:
-                char_is_noise[start:end] = True
+        char_is_noise = self._predict_noise_masks([text])[0]
 
         return self._apply_sentence_logic(
             text, char_is_noise, offset, protected_keywords
         )
 
+    def _noise_masks_for(self, texts, source="", positions=None):
+        """单篇文章的段落掩码 (见 _noise_masks_for_articles)"""
+        return self._noise_masks_for_articles([(texts, source, positions)])[0]
+
+    def _noise_masks_for_articles(self, articles):
+        """
+        articles: [(段落列表, 来源, 段落在文章中的序号 或 None), ...]
+        每篇文章先查段落缓存，再让级联预分类器放行明显干净的段落
+        (级联的位置特征按文章计算)，剩下的段落合并成一次推理；
+        返回每篇文章的掩码列表
+        """
+        results, pending = [], []
+        pool_texts, pool_positions = [], []
+        pooled = {}  # 段落文本 -> 推理池中的下标 (同一批里重复的样板段落只推理一次)
+        base = 0
+        for texts, source, positions in articles:
+            if positions is None:
+                positions = range(len(texts))
+            if self.memo is None:
+                masks = [None] * len(texts)
+            else:
+                masks = [self.memo.get(text, source) for text in texts]
+            results.append(masks)
+            missing = [i for i, mask in enumerate(masks) if mask is None]
+            if not missing:
+                continue
+
+            audit = set()
+            if self.cascade is not None:
+                missing, bypassed, audit = self.cascade.split(texts, missing)
+                for i in bypassed:
+                    masks[i] = np.zeros(len(texts[i]), dtype=bool)
+            if not missing:
+                continue
+
+            refs = []
+            for i in missing:
+                if texts[i] not in pooled:
+                    pooled[texts[i]] = len(pool_texts)
+                    pool_texts.append(texts[i])
+                    pool_positions.append(base + positions[i])
+                refs.append(pooled[texts[i]])
+            pending.append((texts, masks, missing, audit, refs))
+            # 文章之间留一个空位，打包时不会把两篇文章的段落拼在一起
+            base += positions[-1] + 2
+
+        if not pool_texts:
+            return results
+        predicted = self._predict_noise_masks(pool_texts, pool_positions)
+        for texts, masks, missing, audit, refs in pending:
+            article_predicted = [predicted[ref] for ref in refs]
+            for i, mask in zip(missing, article_predicted):
+                if self.memo is not None:
+                    self.memo.put(texts[i], mask)
+                masks[i] = mask
+            if self.cascade is not None:
+                labels = [
+                    self._has_noise(texts[i], mask)
+                    for i, mask in zip(missing, article_predicted)
+                ]
+                self.cascade.observe(texts, missing, labels, audit)
+        return results
+
+    def _has_noise(self, text, mask):
+        """该段落按模型掩码是否会删掉内容 (不考虑保护词，偏保守)"""
+        if not mask.any():
+            return False
+        return bool(self._apply_sentence_logic(text, mask, 0, None)[1])
+
+    def _predict_noise_masks(self, texts, positions=None):
+        """
+        批量推理: 返回每段文本的逐字符噪音掩码 (bool ndarray)，顺序与输入一致
+        NER_PACKING=on 时把文章中相邻的短段落拼接成整条序列推理
+        (positions 为各段在文章中的序号，不给时不打包)；
+        validate 时两种都跑，统计判断差异，结果仍以逐段推理为准
+        """
+        if self.packing == "off" or positions is None or len(texts) < 2:
+            return self._predict_batches(texts)
+        packed = self._predict_packed(texts, positions)
+        if self.packing == "validate":
+            reference = self._predict_batches(texts, count=False)
+            self._compare_packing(texts, packed, reference)
+            return reference
+        return packed
+
+    # ---------- 序列打包 (NER_PACKING) ----------
+    def _pack(self, texts, positions):
+        """
+        按原顺序把相邻的短段落贪心装进不超过 PACK_MAX_TOKENS 的序列
+        返回 [[段落下标, ...], ...]；超过 PACK_SHORT_TOKENS 的段落单独成组，
+        序号不相连 (中间的段落命中缓存或被级联放行) 的段落不会拼在一起
+        """
+        lengths = [
+            len(ids)
+            for ids in self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+        ]
+        packs, current, used = [], [], 0
+        for i, n in enumerate(lengths):
+            # 分隔符的 token 数，外加 1 个余量 (拼接后边界处的切分可能略有不同)
+            cost = n + self.pack_separator_tokens + 1
+            if current and (
+                n > self.PACK_SHORT_TOKENS
+                or used + cost > self.PACK_MAX_TOKENS
+                or positions[i] != positions[current[-1]] + 1
+            ):
+                packs.append(current)
+                current, used = [], 0
+            if n > self.PACK_SHORT_TOKENS:
+                packs.append([i])
+                continue
+            current.append(i)
+            used += cost
+        if current:
+            packs.append(current)
+        return packs
+
+    def _predict_packed(self, texts, positions):
+        """
+        拼接后的序列一次前向推理，再按每段在拼接文本中的字符区间
+        把掩码切回各段 (跨到分隔符上的 token 只保留落在段内的部分)
+        """
+        packs = self._pack(texts, positions)
+        packed_texts, placements = [], []
+        for pack in packs:
+            offsets, position = [], 0
+            for i in pack:
+                offsets.append((i, position))
+                position += len(texts[i]) + len(self.pack_separator)
+            packed_texts.append(self.pack_separator.join(texts[i] for i in pack))
+            placements.append(offsets)
+
+        masks = [None] * len(texts)
+        for mask, offsets in zip(self._predict_batches(packed_texts), placements):
+            for i, position in offsets:
+                masks[i] = mask[position : position + len(texts[i])].copy()
+
+        self.packing_stats["paragraphs"] += len(texts)
+        self.packing_stats["sequences"] += len(packs)
+        return masks
+
+    def _compare_packing(self, texts, packed, reference):
+        """validate 模式: 逐段比较打包前后的删除判断和字符掩码"""
+        stats = self.packing_stats
+        for text, a, b in zip(texts, packed, reference):
+            stats["validated"] += 1
+            stats["chars"] += len(text)
+            stats["char_mismatches"] += int(np.count_nonzero(a != b))
+            if self._has_noise(text, a) != self._has_noise(text, b):
+                stats["decision_mismatches"] += 1
+
+    def packing_report(self):
+        stats = self.packing_stats
+        sequences = stats["sequences"]
+        report = {
+            "mode": self.packing,
+            "paragraphs": stats["paragraphs"],
+            "sequences": sequences,
+            "paragraphs_per_sequence": (
+                round(stats["paragraphs"] / sequences, 2) if sequences else 0.0
+            ),
+            # 实际送进模型的 token 中有效 (非 padding) 的比例
+            "token_utilization": (
+                round(stats["tokens"] / stats["slots"], 3) if stats["slots"] else 0.0
+            ),
+        }
+        if self.packing == "validate":
+            validated = stats["validated"]
+            disagreement = (
+                stats["decision_mismatches"] / validated if validated else 0.0
+            )
+            report.update(
+                {
+                    "validated": validated,
+                    "decision_mismatches": stats["decision_mismatches"],
+                    "decision_disagreement": round(disagreement, 4),
+                    "char_disagreement": (
+                        round(stats["char_mismatches"] / stats["chars"], 4)
+                        if stats["chars"]
+                        else 0.0
+                    ),
+                    "tolerance": self.packing_tolerance,
+                    "within_tolerance": disagreement <= self.packing_tolerance,
+                }
+            )
+        return report
+
+    def _predict_batches(self, texts, count=True):
+        """
+        逐条推理: 按长度排序后分批，减少 padding 浪费；结果顺序与输入一致
+        count: 是否计入 token 利用率统计 (validate 的对照推理不计)
+        """
+        masks = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+        for b in range(0, len(order), self.batch_size):
+            idx_chunk = order[b : b + self.batch_size]
+            chunk = [texts[i] for i in idx_chunk]
+
+            inputs = self.tokenizer(
+                chunk,
+                return_tensors="pt",
+                truncation=True,
+                max_length=512,
+                return_offsets_mapping=True,
+                padding="longest",
+            )
+            offsets = inputs.pop("offset_mapping").numpy()
+            if count:
+                self.packing_stats["tokens"] += int(inputs["attention_mask"].sum())
+                self.packing_stats["slots"] += inputs["attention_mask"].numel()
+            inputs = inputs.to(self.device)
+
+            with torch.no_grad():
+                logits = self._forward(inputs["input_ids"], inputs["attention_mask"])
+                predictions = torch.argmax(logits, dim=2).cpu().numpy()
+
+            for row, text_idx in enumerate(idx_chunk):
+                char_is_noise = np.zeros(len(texts[text_idx]), dtype=bool)
+                for (start, end), label in zip(offsets[row], predictions[row]):
+                    if start == end:
+                        continue
+                    if label == self.noise_label_id:
+                        char_is_noise[start:end] = True
+                masks[text_idx] = char_is_noise
+
+        return masks
+
+    # ---------- 推理后端 (eager / compile / trace) ----------
+    def _forward(self, input_ids, attention_mask):
+        """返回 logits；编译模式下先补齐到桶形状，结果只取真实的行和列"""
+        if self.inference_mode == "eager":
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+        rows, length = input_ids.shape
+        input_ids, attention_mask = self._pad_to_bucket(input_ids, attention_mask)
+        if self.inference_mode == "compile":
+            shape = tuple(input_ids.shape)
+            if shape not in self.compiled_shapes:
+                self.compiled_shapes.add(shape)
+                self._raise_recompile_limit()
+            try:
+                logits = self.compiled_model(
+                    input_ids=input_ids, attention_mask=attention_mask
+                ).logits
+            except Exception as e:
+                # 编译在首次调用时才真正发生；超出重编译上限也会在这里报错
+                self.log.warning(
+                    f"⚠️ torch.compile failed for shape {shape} ({e}), "
+                    "using eager mode."
+                )
+                self.inference_mode = "eager"
+                self.compiled_model = None
+                return self._forward(
+                    input_ids[:rows, :length], attention_mask[:rows, :length]
+                )
+        else:
+            graph = self._traced_graph(input_ids, attention_mask)
+            if graph is None:
+                return self._forward(
+                    input_ids[:rows, :length], attention_mask[:rows, :length]
+                )
+            logits = graph(input_ids, attention_mask)
+        return logits[:rows, :length]
+
+    def _pad_to_bucket(self, input_ids, attention_mask):
+        """
+        序列长度补到 LENGTH_BUCKETS (超过最大桶时补到它的整数倍)，
+        行数补到 2 的幂 (不超过 batch_size)
+        补出来的位置 attention_mask 为 0，不影响真实段落的结果
+        """
+        rows, length = input_ids.shape
+        largest = self.LENGTH_BUCKETS[-1]
+        bucket = next(
+            (b for b in self.LENGTH_BUCKETS if b >= length),
+            -(-length // largest) * largest,
+        )
+        target_rows = rows
+        if rows < self.batch_size:
+            target_rows = min(self.batch_size, 1 << (rows - 1).bit_length())
+        pad_cols, pad_rows = bucket - length, target_rows - rows
+        if pad_cols or pad_rows:
+            pad_id = self.tokenizer.pad_token_id or 0
+            input_ids = torch.nn.functional.pad(
+                input_ids, (0, pad_cols, 0, pad_rows), value=pad_id
+            )
+            attention_mask = torch.nn.functional.pad(
+                attention_mask, (0, pad_cols, 0, pad_rows), value=0
+            )
+        return input_ids, attention_mask
+
+    def _compile_model(self):
+        if not hasattr(torch, "compile"):
+            self.log.warning("⚠️ torch.compile not available, using eager mode.")
+            self.inference_mode = "eager"
+            return
+        if self.compiled_dir:
+            # Inductor 的编译产物放到缓存目录，下次启动直接复用
+            # (Inductor 第一次用到缓存时会自己写入这个变量，所以这里直接赋值)
+            os.environ["TORCHINDUCTOR_CACHE_DIR"] = os.path.join(
+                self.compiled_dir, "inductor"
+            )
+        try:
+            self.compiled_model = torch.compile(self.model, dynamic=False)
+        except Exception as e:
+            self.log.warning(f"⚠️ torch.compile failed ({e}), using eager mode.")
+            self.inference_mode = "eager"
+            return
+        # 超出重编译上限时报错 (由 _forward 记录并退回 eager)，而不是悄悄跑 eager
+        dynamo_config = torch._dynamo.config
+        if hasattr(dynamo_config, "fail_on_recompile_limit_hit"):
+            dynamo_config.fail_on_recompile_limit_hit = True
+        self.log.info("🛠️ DeBERTa compiled with torch.compile (per length bucket).")
+
+    def _raise_recompile_limit(self):
+        """
+        每个 (行数, 长度桶) 形状都是一张静态图: 5 个长度桶 × 各行数桶
+        会超过 Dynamo 默认的重编译上限 (8)，按见过的形状数调高
+        (另留默认上限的余量给其它原因的重编译)
+        """
+        dynamo_config = torch._dynamo.config
+        name = (
+            "recompile_limit"
+            if hasattr(dynamo_config, "recompile_limit")
+            else "cache_size_limit"
+        )
+        needed = len(self.compiled_shapes) + 8
+        if getattr(dynamo_config, name) < needed:
+            setattr(dynamo_config, name, needed)
+
+    def _graph_path(self, rows, length):
+        if not self.compiled_dir:
+            return None
+        tag = hashlib.sha1(
+            f"{self.model_version}|{self.device}|{self.model.dtype}|"
+            f"{torch.__version__}".encode("utf-8")
+        ).hexdigest()[:12]
+        return os.path.join(self.compiled_dir, f"ner_{tag}_b{rows}_l{length}.pt")
+
+    def _traced_graph(self, input_ids, attention_mask):
+        """每个 (行数, 长度桶) 追踪一次，保存到磁盘；失败时退回 eager"""
+        key = tuple(input_ids.shape)
+        if key in self.traced_graphs:
+            return self.traced_graphs[key]
+
+        path = self._graph_path(*key)
+        graph = None
+        try:
+            if path and os.path.exists(path):
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    graph = torch.jit.load(path, map_location=self.device)
+            else:
+                # 追踪样例里必须有被 mask 的位置，否则 "全部有效" 的分支会被固化进图里
+                example_mask = attention_mask.clone()
+                example_mask[:, -1] = 0
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    graph = torch.jit.trace(
+                        _LogitsOnly(self.model),
+                        (input_ids, example_mask),
+                        check_trace=False,
+                        strict=False,
+                    )
+                if path:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        torch.jit.save(graph, path)
+        except Exception as e:
+            self.log.warning(f"⚠️ TorchScript tracing failed ({e}), using eager mode.")
+            self.inference_mode = "eager"
+            return None
+        self.traced_graphs[key] = graph
+        return graph
+
+    def warmup(self):
+        """
+        加载后用几种典型长度的整批段落跑一遍模型，
+        让首批真实文章不再承担内存分配 / 编译 / 追踪的开销
+        返回耗时 (秒)
+        """
+        if self.model is None:
+            return 0.0
+        start = time.perf_counter()
+        words = " ".join(HardwareAutotuner.SAMPLE_PARAGRAPHS).split()
+        for bucket in self.WARMUP_BUCKETS:
+            # 英文大约 0.75 个词一个 token，留一点余量不超出当前桶
+            text = " ".join((words * (bucket // len(words) + 1))[: int(bucket * 0.6)])
+            self._predict_noise_masks([text] * self.batch_size)
+        # 预热的段落不计入打包统计
+        self.packing_stats.clear()
+        return time.perf_counter() - start
+
     def _apply_sentence_logic(self, text, char_mask, offset, protected_keywords):
         import re
 
@@ -574,7 +1238,14 @@ class NERCleaner:
         return "".join(final_chunks), deleted_spans
 
     def release_memory(self):
-        print("🧹 Releasing NER model memory...")
+        self.log.info("🧹 Releasing NER model memory...")
+        if self.memo is not None:
+            self.memo.save()
+        if self.cascade is not None:
+            self.cascade.save_samples()
+        self.compiled_model = None
+        self.compiled_shapes = set()
+        self.traced_graphs = {}
         if hasattr(self, "model"):
             del self.model
         if hasattr(self, "tokenizer"):
@@ -585,7 +1256,7 @@ class NERCleaner:
             torch.cuda.ipc_collect()
         elif self.device == "mps":
             torch.mps.empty_cache()
-        print("✅ NER memory released.")
+        self.log.info("✅ NER memory released.")
 
 
 # ==================================================
@@ -653,10 +1324,30 @@ class RelevanceFilter:
             re.compile(r"\bCPC\s+(Code|Act|Section|provision)\b", re.IGNORECASE),
         ]
 
+    @property
+    def version(self):
+        """关键词门规则 (白名单 / 锚点 / 正则) 的短哈希，规则变化后目录里的门结果随之失效"""
+        canonical = json.dumps(
+            {
+                "whitelist": self.WHITELIST_PHRASES,
+                "anchors": self.CHINA_ANCHORS,
+                "modernization": [
+                    [p.pattern, p.flags] for p in self.MODERNIZATION_PATTERNS
+                ],
+                "noise": [[p.pattern, p.flags] for p in self.LOCAL_NOISE_PATTERNS],
+            },
+            ensure_ascii=False,
+        )
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
     # 快速筛选
     def is_relevant(self, text, title="", topic_mode="GENERAL"):
-        combined_text = title + "\n" + text
-        combined_lower = combined_text.lower()
+        # text 为 Document 时用它缓存的 "标题 + 全文" (title 参数忽略)
+        if isinstance(text, Document):
+            combined_text, combined_lower = text.titled_text, text.titled_lower
+        else:
+            combined_text = title + "\n" + text
+            combined_lower = combined_text.lower()
 
         # 1. 绝对白名单
         for phrase in self.WHITELIST_PHRASES:
@@ -693,21 +1384,56 @@ class RelevanceFilter:
 
         return False, "NO_CHINA_KEYWORDS"
 
+    def anchor_hits(self, text, title=""):
+        """China 锚点出现的总次数 (语义短路策略的分组依据)"""
+        if isinstance(text, Document):
+            combined_lower = text.titled_lower
+        else:
+            combined_lower = (title + "\n" + text).lower()
+        return sum(combined_lower.count(anchor) for anchor in self.CHINA_ANCHORS)
+
+
+# 语义规则快照: 概念列表 + 向量矩阵 + 版本号 (整体替换，保证原子性)
+SemanticRules = collections.namedtuple(
+    "SemanticRules", ["positive", "negative", "pos_matrix", "neg_matrix", "version"]
+)
+
+
+def semantic_rules_version(positive, negative):
+    """规则内容的短哈希，写进每篇输出，方便追溯用的是哪一版规则"""
+    canonical = json.dumps(
+        {"positive": list(positive), "negative": list(negative)}, ensure_ascii=False
+    )
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
 
 ## ==================================================
 # 模块 4b: 语义相关性过滤器 (Sentence-BERT)
 # ==================================================
 class SemanticRelevanceFilter:
+    log = get_logger("semantic")
+
     def __init__(self, config, threshold=0.15):
         """
         threshold: 正向相似度的最低门槛。即使没触犯负向规则，如果离政治太远也不要。
         """
         self.config = config
         self.threshold = threshold
+        # 每次 encode 的文档数量
+        self.batch_size = max(1, int(config.get("SEMANTIC_BATCH_SIZE") or 32))
+        # 多个概念的相似度如何汇总: "mean" (默认，threshold 按它校准) 或
+        # "max" (最像的那个概念，分数整体偏高，需要相应调高 threshold)
+        self.aggregation = config.get("SEMANTIC_AGGREGATION") or "mean"
+        if self.aggregation not in ("max", "mean"):
+            raise ValueError(f"Unknown semantic aggregation: {self.aggregation}")
 
         # 1. 设备选择
-        self.device, self.device_info = DeviceManager.get_optimal_device()
-        print(f"🧠 Semantic Engine (MiniLM) running on: {self.device_info['desc']}")
+        self.device, self.device_info = DeviceManager.get_optimal_device(
+            config.get("DEVICE")
+        )
+        self.log.info(
+            f"🧠 Semantic Engine (MiniLM) running on: {self.device_info['desc']}"
+        )
 
         # 2. 获取模型路径
         model_path = config.get(
@@ -715,24 +1441,44 @@ class SemanticRelevanceFilter:
         )
 
         # 3. 加载模型
-        opt_kwargs = DeviceManager.get_model_kwargs(self.device)
-        print(f"   ↳ Loading Semantic Model from: {model_path} ...")
+        opt_kwargs = DeviceManager.get_model_kwargs(
+            self.device, config.get("PRECISION")
+        )
+        self.log.info(f"   ↳ Loading Semantic Model from: {model_path} ...")
 
         try:
             # 尝试本地加载
             self.model = SentenceTransformer(
                 model_path, device=self.device, model_kwargs=opt_kwargs
             )
+            self.model_id = read_model_version(model_path)
         except Exception as e:
-            print(f"❌ Failed to load Semantic Model: {e}")
+            self.log.error(f"❌ Failed to load Semantic Model: {e}")
             # 尝试从 HuggingFace 下载
-            print("   ↳ Fallback: Downloading 'all-MiniLM-L6-v2' from HuggingFace...")
+            self.log.info(
+                "   ↳ Fallback: Downloading 'all-MiniLM-L6-v2' from HuggingFace..."
+            )
             self.model = SentenceTransformer("all-MiniLM-L6-v2", device=self.device)
+            self.model_id = "all-MiniLM-L6-v2"
+
+        # 概念向量缓存: {concept_text: np.ndarray}，落盘在 CACHE_DIR 下
+        model_hash = hashlib.sha1(self.model_id.encode("utf-8")).hexdigest()[:16]
+        self.concept_cache_path = os.path.join(
+            config.get("CACHE_DIR") or DEFAULT_CACHE_DIR,
+            "concept_embeddings",
+            f"{model_hash}.pkl",
+        )
+        self._concept_vectors = self._load_concept_cache()
 
         # 4. 加载规则 (配置)
-        self.config_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), "semantic_config.json"
+        # 与界面 (api.py save-semantic-config) 使用同一个文件
+        self.config_path = (
+            config.get("SEMANTIC_CONFIG_PATH") or resolve_semantic_config_path()
         )
+        # 运行中检查配置文件变化的最小间隔 (秒)
+        self.reload_interval = float(config.get("SEMANTIC_RELOAD_INTERVAL", 1.0))
+        self._last_reload_check = time.time()
+        self.rules = None
         self.load_concepts()
         self.update_embeddings()
 
@@ -765,23 +1511,34 @@ class SemanticRelevanceFilter:
             ],
         }
 
+        self._config_stat = self._stat_config()
         if os.path.exists(self.config_path):
             try:
-                with open(self.config_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.positive_concepts = data.get("positive", defaults["positive"])
-                    self.negative_concepts = data.get("negative", defaults["negative"])
-                print("✅ Loaded semantic config from file.")
+                data = self._read_config_file()
+                self.positive_concepts = data.get("positive", defaults["positive"])
+                self.negative_concepts = data.get("negative", defaults["negative"])
+                self.log.info("✅ Loaded semantic config from file.")
             except Exception as e:
-                print(f"⚠️ Config load failed ({e}), using defaults.")
+                self.log.warning(f"⚠️ Config load failed ({e}), using defaults.")
                 self.positive_concepts = defaults["positive"]
                 self.negative_concepts = defaults["negative"]
         else:
-            print("ℹ️ No config file found, creating default.")
+            self.log.info("ℹ️ No config file found, creating default.")
             self.positive_concepts = defaults["positive"]
             self.negative_concepts = defaults["negative"]
             self.save_concepts()
 
+    def _read_config_file(self):
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _stat_config(self):
+        try:
+            st = os.stat(self.config_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
     # 保存当前概念到 JSON
     def save_concepts(self):
         try:
@@ -791,43 +1548,185 @@ class SemanticRelevanceFilter:
             }
             with open(self.config_path, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+            self._config_stat = self._stat_config()
         except Exception as e:
-            print(f"❌ Failed to save config: {e}")
+            self.log.error(f"❌ Failed to save config: {e}")
 
     # 当概念改变时，重新计算 Embeddings
     def update_embeddings(self):
-        if hasattr(self, "model"):
-            self.pos_embedding = self.model.encode(
-                " ".join(self.positive_concepts), convert_to_tensor=True
-            )
-            self.neg_embedding = self.model.encode(
-                " ".join(self.negative_concepts), convert_to_tensor=True
+        """
+        每个概念单独一个向量，组成 [概念数, 维度] 的矩阵
+        已经算过的概念直接从缓存取，只 encode 新增/修改过的概念
+        新的规则快照一次性替换，正在进行的批次仍使用旧快照
+        """
+        positive = list(self.positive_concepts)
+        negative = list(self.negative_concepts)
+        self.rules = SemanticRules(
+            positive,
+            negative,
+            self._concept_matrix(positive),
+            self._concept_matrix(negative),
+            semantic_rules_version(positive, negative),
+        )
+
+    def reload_if_changed(self, force=False):
+        """
+        热更新: 检查配置文件是否被修改 (最多每 reload_interval 秒 stat 一次)
+        有变化时只重新 encode 改动过的概念，不重新加载模型
+        文件损坏 (比如正在被编辑) 时保留当前规则
+        返回: 规则是否发生了替换
+        """
+        now = time.time()
+        if not force and now - self._last_reload_check < self.reload_interval:
+            return False
+        self._last_reload_check = now
+
+        stat = self._stat_config()
+        if stat is None or (not force and stat == self._config_stat):
+            return False
+
+        try:
+            data = self._read_config_file()
+        except Exception as e:
+            self.log.warning(
+                f"⚠️ Semantic config unreadable ({e}), keeping current rules."
             )
+            return False
+        self._config_stat = stat
 
-        # 预计算锚点的向量 (加速后续推理)
-        # 我们把所有正向概念拼成一个大的语义向量，负向同理
-        self.pos_embedding = self.model.encode(
-            " ".join(self.positive_concepts), convert_to_tensor=True
-        )
-        self.neg_embedding = self.model.encode(
-            " ".join(self.negative_concepts), convert_to_tensor=True
+        positive = data.get("positive", self.positive_concepts)
+        negative = data.get("negative", self.negative_concepts)
+        old_version = self.rules.version
+        if semantic_rules_version(positive, negative) == old_version:
+            return False
+
+        self.positive_concepts = positive
+        self.negative_concepts = negative
+        self.update_embeddings()
+        self.log.info(
+            f"🔁 Semantic rules reloaded: {old_version} -> {self.rules.version}"
         )
+        return True
+
+    def adopt_rules(self, version, positive, negative):
+        """
+        预分叉工作进程: 换成父进程热更新后的规则 (版本相同时什么都不做)
+        返回: 规则是否发生了替换
+        """
+        if self.rules.version == version:
+            return False
+        self.positive_concepts = list(positive)
+        self.negative_concepts = list(negative)
+        self.update_embeddings()
+        return True
+
+    def _concept_matrix(self, concepts):
+        missing = [c for c in dict.fromkeys(concepts) if c not in self._concept_vectors]
+        if missing:
+            vectors = self.model.encode(
+                missing,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            for concept, vector in zip(missing, vectors):
+                self._concept_vectors[concept] = vector.astype(np.float32)
+            self.log.info(f"🧮 Encoded {len(missing)} new semantic concepts.")
+            self._save_concept_cache()
+
+        if concepts:
+            matrix = np.stack([self._concept_vectors[c] for c in concepts])
+        else:
+            dim = self.model.get_sentence_embedding_dimension()
+            matrix = np.zeros((0, dim), dtype=np.float32)
+        return torch.from_numpy(matrix).to(self.device)
+
+    def _load_concept_cache(self):
+        if not self.concept_cache_path or not os.path.exists(self.concept_cache_path):
+            return {}
+        try:
+            with open(self.concept_cache_path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            self.log.warning(
+                f"⚠️ Concept cache load failed ({e}), re-encoding concepts."
+            )
+            return {}
+
+    def _save_concept_cache(self):
+        if not self.concept_cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.concept_cache_path), exist_ok=True)
+            tmp_path = self.concept_cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self._concept_vectors, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.concept_cache_path)
+        except Exception as e:
+            self.log.error(f"❌ Failed to save concept cache: {e}")
 
     def is_relevant(self, text, title=""):
         """
-        返回: (bool, reason, scores)
+        返回: (bool, reason)
         """
-        # 组合标题和正文的前 800 个字符 (开头通常包含主旨)
-        # 没必要读全文，既省时间又防止被后文的噪音干扰
-        content_snippet = f"{title}. {text[:800]}"
+        return self.is_relevant_batch([text], [title])[0]
 
-        # 计算当前文章的向量
-        doc_embedding = self.model.encode(content_snippet, convert_to_tensor=True)
+    def is_relevant_batch(self, texts, titles=None, return_scores=False):
+        """
+        批量版本: 一次 encode 多篇文章
+        返回: [(bool, reason), ...]，顺序与输入一致
+        return_scores=True 时返回 [(bool, reason, {"pos": .., "neg": ..}), ...]
+        """
+        if not texts:
+            return []
+        if titles is None:
+            titles = [""] * len(texts)
 
-        # 计算余弦相似度
-        score_pos = util.cos_sim(doc_embedding, self.pos_embedding).item()
-        score_neg = util.cos_sim(doc_embedding, self.neg_embedding).item()
+        # 组合标题和正文的前 800 个字符 (开头通常包含主旨)
+        # 没必要读全文，既省时间又防止被后文的噪音干扰
+        snippets = [f"{title}. {text[:800]}" for text, title in zip(texts, titles)]
+
+        # 计算文章向量 (已归一化，点积即余弦相似度)
+        doc_embeddings = self.model.encode(
+            snippets,
+            convert_to_tensor=True,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+        )
 
+        # 一次矩阵乘法得到 [文章数, 正向概念数 + 负向概念数] 的相似度
+        # 整批使用同一个规则快照 (热更新只在批次之间生效)
+        rules = self.rules
+        n_pos = rules.pos_matrix.shape[0]
+        concepts = torch.cat([rules.pos_matrix, rules.neg_matrix]).to(
+            doc_embeddings.dtype
+        )
+        sims = doc_embeddings @ concepts.T
+        pos_scores = self._aggregate(sims[:, :n_pos], len(texts))
+        neg_scores = self._aggregate(sims[:, n_pos:], len(texts))
+
+        results = []
+        for score_pos, score_neg in zip(pos_scores, neg_scores):
+            is_kept, reason = self._decide(score_pos, score_neg)
+            if return_scores:
+                scores = {
+                    "pos": score_pos,
+                    "neg": score_neg,
+                    "rules_version": rules.version,
+                }
+                results.append((is_kept, reason, scores))
+            else:
+                results.append((is_kept, reason))
+        return results
+
+    def _aggregate(self, sims, n_docs):
+        if sims.shape[1] == 0:
+            return [0.0] * n_docs
+        if self.aggregation == "mean":
+            return sims.mean(dim=1).float().tolist()
+        return sims.max(dim=1).values.float().tolist()
+
+    def _decide(self, score_pos, score_neg):
         scores_info = f"[Pos: {score_pos:.3f} | Neg: {score_neg:.3f}]"
 
         # === 判定逻辑 ===
@@ -844,14 +1743,18 @@ class SemanticRelevanceFilter:
         # 3. 通过筛选
         return True, f"SEMANTIC_MATCH {scores_info}"
 
+    def warmup(self):
+        """加载后先完整 encode 一批文章，返回耗时 (秒)"""
+        start = time.perf_counter()
+        doc = " ".join(HardwareAutotuner.SAMPLE_PARAGRAPHS)
+        self.is_relevant_batch([doc] * self.batch_size)
+        return time.perf_counter() - start
+
     def release_memory(self):
-        print("🧠 Releasing Semantic Model (MiniLM) memory...")
+        self.log.info("🧠 Releasing Semantic Model (MiniLM) memory...")
         if hasattr(self, "model"):
             del self.model
-        if hasattr(self, "pos_embedding"):
-            del self.pos_embedding
-        if hasattr(self, "neg_embedding"):
-            del self.neg_embedding
+        self.rules = None
         gc.collect()
         if self.device == "cuda":
             torch.cuda.empty_cache()
@@ -861,14 +1764,71 @@ class SemanticRelevanceFilter:
                 torch.mps.empty_cache()
             except:
                 pass
-        print("✅ Semantic Model memory released.")
+        self.log.info("✅ Semantic Model memory released.")
+
+
+def default_model_configs(project_root=None):
+    """默认模型路径 (与 api.py 中的 MODEL_CONFIGS 保持一致)"""
+    if project_root is None:
+        project_root = os.path.dirname(os.path.abspath(__file__))
+    return {
+        "NOISE_CAPTION": os.path.join(
+            project_root, "models", "noise-cleaner-deberta-v2", "final"
+        ),
+        "SEMANTIC_MODEL": os.path.join(project_root, "models", "all-MiniLM-L6-v2"),
+    }
 
 
 # ==================================================
 # 模块 5: 流水线控制器
 # ==================================================
 class CorpusPipeline:
+    log = get_logger("pipeline")
+
     def __init__(self, model_configs):
+        ensure_logging()
+        init_start = time.perf_counter()
+        # 0. 硬件自动调优 (AUTOTUNE: off / auto / calibrate)
+        # auto: 有本机的调优结果就直接用，没有就用默认参数 (不自动校准)
+        # calibrate: 模型加载后实测一次 (约 10-20 秒，计入启动耗时) 并保存
+        self.autotune_mode = model_configs.get("AUTOTUNE") or "off"
+        self.tuned_profile = None
+        self.autotuner = None
+        self._explicit_keys = {
+            k for k in HardwareAutotuner.TUNED_KEYS if model_configs.get(k) is not None
+        }
+        if self.autotune_mode != "off":
+            device, _ = DeviceManager.get_optimal_device(model_configs.get("DEVICE"))
+            self.autotuner = HardwareAutotuner(model_configs.get("CACHE_DIR"), device)
+            if self.autotune_mode == "auto":
+                self.tuned_profile = self.autotuner.load()
+            if self.tuned_profile:
+                self.log.info(
+                    f"⚙️ Using saved autotune profile: {self.autotuner.profile_path}"
+                )
+                model_configs = HardwareAutotuner.merge(
+                    model_configs, self.tuned_profile
+                )
+            elif self.autotune_mode == "auto":
+                self.log.info(
+                    "⚙️ No autotune profile for this machine, using defaults "
+                    "(AUTOTUNE=calibrate measures one)."
+                )
+        # 记录实际生效的线程数 (interop 线程数在并行计算开始后就改不了)
+        model_configs = {
+            **model_configs,
+            **HardwareAutotuner.apply_threads(model_configs),
+        }
+        self.model_configs = model_configs
+
+        # 预分叉模式 (PREFORK_WORKERS): libgomp 的线程池不能跨 fork 使用，
+        # 本进程在 fork 之前只用单线程 (不会启动 OpenMP 线程池)，
+        # 工作进程 fork 之后再设置各自的线程数
+        self.prefork_plan = self._prefork_plan(model_configs)
+        if self.prefork_plan is not None:
+            torch.set_num_threads(1)
+            os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
         # 1. 初始化工具模块
         self.rtf_handler = RTFHandler()
         self.struct_cleaner = StructuralCleaner()
@@ -880,306 +1840,1520 @@ class CorpusPipeline:
 
         # 3. 初始化相关性过滤器
         self.relevance_filter = RelevanceFilter()
+        # 语义阶段 encode 正文开头 (body，默认) 还是全文开头 (head)
+        self.semantic_input = model_configs.get("SEMANTIC_INPUT") or "body"
+        if self.semantic_input not in ("body", "head"):
+            raise ValueError(f"Unknown semantic input: {self.semantic_input}")
+
+        # 语义短路策略 (SEMANTIC_SHORT_CIRCUIT: off / record / on)
+        self.short_circuit = None
+        short_circuit_mode = model_configs.get("SEMANTIC_SHORT_CIRCUIT") or "off"
+        if short_circuit_mode != "off":
+            self.short_circuit = SemanticShortCircuit(
+                short_circuit_mode,
+                model_configs.get("CACHE_DIR") or DEFAULT_CACHE_DIR,
+                f"{self.semantic_filter.model_id}|{self.semantic_input}",
+                min_samples=model_configs.get(
+                    "SEMANTIC_SHORT_CIRCUIT_MIN_SAMPLES", 200
+                ),
+                min_pass_rate=model_configs.get(
+                    "SEMANTIC_SHORT_CIRCUIT_PASS_RATE", 0.995
+                ),
+                verify_rate=model_configs.get(
+                    "SEMANTIC_SHORT_CIRCUIT_VERIFY_RATE", 0.05
+                ),
+            )
 
-    def process_folder(
-        self, input_dir, output_base_dir=None, recursive=False, progress_callback=None
-    ):
-        if self.cleaner is None or self.semantic_filter is None:
-            print("❌ Error: Pipeline models not initialized correctly.")
-            return
+        # 4. 吞吐参数: RTF 解析进程数
+        self.num_workers = max(1, int(model_configs.get("NUM_WORKERS") or 1))
+        # 文件排程 (size: 文件夹内从大到小 / directory: 目录顺序) 与预读窗口 (0 关闭)
+        self.schedule = model_configs.get("SCHEDULE") or "size"
+        if self.schedule not in ("size", "directory"):
+            raise ValueError(f"Unknown schedule: {self.schedule}")
+        self.read_ahead = int(model_configs.get("READ_AHEAD_FILES", 32) or 0)
+
+        # 5. 可选的列式导出 ("parquet" / "jsonl")
+        self.export_format = model_configs.get("EXPORT_FORMAT")
+
+        # 6. 是否在每个文件夹结束时导出旧版 frontend_diff.json (Review Lab 需要)
+        self.write_legacy_json = model_configs.get("LEGACY_REVIEW_JSON", True)
+        self._protected_kws = None  # clean_batch 复用的保护词列表
+
+        # frontend_diff.json 默认紧凑输出，PRETTY_JSON=True 时缩进 (方便人工查看)
+        self.pretty_json = model_configs.get("PRETTY_JSON", False)
+
+        # 7. 内存预算 (MEMORY_BUDGET_MB 未设置时只记录高水位)
+        self.governor = MemoryGovernor(model_configs.get("MEMORY_BUDGET_MB"))
+        self.governor.mark("load")
+
+        # 8. 预分叉工作进程: 在校准 / 预热之前 fork (之后一直复用，dispose 时回收)
+        self._prefork_pool = None
+        if self.prefork_plan is not None:
+            self._prefork_pool = self._start_prefork_pool(
+                *self.prefork_plan, warmup=model_configs.get("WARMUP", True)
+            )
 
-        all_files = []
+        self.autotune_sec = 0.0
+        if self.autotune_mode == "calibrate":
+            if self._prefork_pool is None:
+                autotune_start = time.perf_counter()
+                self.autotune()
+                self.autotune_sec = time.perf_counter() - autotune_start
+            else:
+                self.log.warning(
+                    "⚠️ Autotune calibration skipped with pre-fork workers "
+                    "(threads per worker come from PREFORK_THREADS)."
+                )
+
+        # 9. 预热 (WARMUP=False 关闭；预分叉模式下由各工作进程自己预热)
+        self.warmup_sec = 0.0
+        if model_configs.get("WARMUP", True) and self._prefork_pool is None:
+            self.warmup_sec = self.cleaner.warmup() + self.semantic_filter.warmup()
+            self.log.info(f"🔥 Models warmed up in {self.warmup_sec:.2f}s.")
+        # 加载 + 校准 + 预热的总耗时 (校准 / 预热各自的耗时另见 _latency_report)
+        self.startup_sec = time.perf_counter() - init_start
+        self.first_run = True
+
+    def autotune(self):
+        """在当前模型上重新校准，保存结果并应用到未显式指定的参数"""
+        if self.autotuner is None:
+            device = self.cleaner.device
+            self.autotuner = HardwareAutotuner(
+                self.model_configs.get("CACHE_DIR"), device
+            )
+        profile = self.autotuner.calibrate(
+            self.cleaner, self.semantic_filter, RTFHandler.bytes_to_text
+        )
+        self.autotuner.save(profile)
+
+        applied = {
+            k: v for k, v in profile.items() if k in HardwareAutotuner.TUNED_KEYS
+        }
+        applied = {k: v for k, v in applied.items() if k not in self._explicit_keys}
+        self.model_configs = {**self.model_configs, **applied}
+        self.model_configs.update(HardwareAutotuner.apply_threads(self.model_configs))
+        # 返回给调用方 (界面) 的结果里附上实际生效的线程数
+        profile = {
+            **profile,
+            "in_effect": HardwareAutotuner.threads_in_effect(),
+        }
+        self.tuned_profile = profile
+        self.cleaner.batch_size = int(self.model_configs.get("NER_BATCH_SIZE") or 16)
+        self.semantic_filter.batch_size = int(
+            self.model_configs.get("SEMANTIC_BATCH_SIZE") or 32
+        )
+        self.num_workers = int(self.model_configs.get("NUM_WORKERS") or 1)
+        return profile
 
+    # ==================================================
+    # 文件发现 / 分组 / 分片 (不依赖模型，可用于 dry-run)
+    # ==================================================
+    @staticmethod
+    def discover_files(input_dir, recursive=False):
+        """扫描输入目录，返回 RTF 文件路径列表"""
+        return [entry.path for entry in CorpusPipeline.scan_files(input_dir, recursive)]
+
+    @staticmethod
+    def scan_files(input_dir, recursive=False):
+        """
+        os.scandir 扫描一遍，返回 FileEntry 列表 (顺序与 os.walk 自上而下一致)
+        目录项自带类型信息，只对 RTF 文件 stat 一次取大小和 mtime
+        """
         if recursive:
             # === 模式 A: 递归 (Batch Mode) ===
-            print(f"🔄 Scanning RECURSIVELY in: {input_dir}")
-            for root, _, files in os.walk(input_dir):
-                for f in files:
-                    if f.lower().endswith(".rtf"):
-                        all_files.append(os.path.join(root, f))
+            CorpusPipeline.log.info(f"🔄 Scanning RECURSIVELY in: {input_dir}")
         else:
             # === 模式 B: 单层 (Single Folder Mode) ===
-            print(f"⏺️ Scanning SINGLE LEVEL in: {input_dir}")
-            if os.path.exists(input_dir):
-                for f in os.listdir(input_dir):
-                    full_path = os.path.join(input_dir, f)
-                    if os.path.isfile(full_path) and f.lower().endswith(".rtf"):
-                        all_files.append(full_path)
+            CorpusPipeline.log.info(f"⏺️ Scanning SINGLE LEVEL in: {input_dir}")
 
-        if not all_files:
-            print("⚠️ No RTF files found.")
-            return
+        found = []
 
-        # 进度统计
-        total_files = len(all_files)
-        processed_count = 0
-        print(f"🚀 Found {total_files} files.")
+        def scan(folder):
+            subdirs = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            # 与 os.walk 相同: 不进入指向目录的符号链接
+                            if recursive and not entry.is_symlink():
+                                subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(".rtf") and entry.is_file():
+                            st = entry.stat()
+                            found.append(FileEntry(entry.path, st.st_size, st.st_mtime))
+            except OSError:
+                return  # 目录不存在 / 扫描期间被删除 / 无权限
+            for subdir in subdirs:
+                scan(subdir)
+
+        scan(input_dir)
+        return found
+
+    @staticmethod
+    def stat_files(paths):
+        """已知路径 (增量模式) -> FileEntry 列表；已经消失的文件大小记为 0"""
+        entries = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+                entries.append(FileEntry(path, st.st_size, st.st_mtime))
+            except OSError:
+                entries.append(FileEntry(path, 0, 0.0))
+        return entries
+
+    @staticmethod
+    def select_shard(files, shard_index, shard_count, base_dir):
+        """
+        按相对路径的稳定哈希切分文件 (shard_index 从 0 开始)
+        同一份语料在不同机器上切分结果一致，适合集群调度
+        files 可以是路径或 FileEntry
+        """
+        selected = []
+        for f in files:
+            path = getattr(f, "path", f)
+            rel = os.path.relpath(path, base_dir).replace(os.sep, "/")
+            if zlib.crc32(rel.encode("utf-8")) % shard_count == shard_index:
+                selected.append(f)
+        return selected
 
+    @staticmethod
+    def group_by_folder(files):
+        """files 可以是路径或 FileEntry，保持原有顺序"""
         files_by_folder = {}
-        for f in all_files:
-            folder = os.path.dirname(f)
+        for f in files:
+            folder = os.path.dirname(getattr(f, "path", f))
             if folder not in files_by_folder:
                 files_by_folder[folder] = []
             files_by_folder[folder].append(f)
+        return files_by_folder
+
+    @staticmethod
+    def schedule_files(entries, order="size"):
+        """
+        排程: 输出按文件夹连续写，所以只在文件夹内部调整顺序
+        size: 文件夹按总字节、文件夹内按文件大小从大到小 ——
+              大文件先开始解析，并行时不会有一个大文件拖在最后；
+              长度相近的文章也更容易落在同一批里，减少 padding
+        directory: 保持扫描顺序
+        返回 {folder: [FileEntry, ...]}
+        """
+        files_by_folder = CorpusPipeline.group_by_folder(entries)
+        if order != "size":
+            return files_by_folder
+        ranked = sorted(
+            files_by_folder.items(), key=lambda kv: -sum(e.size for e in kv[1])
+        )
+        return {
+            folder: sorted(files, key=lambda e: (-e.size, e.path))
+            for folder, files in ranked
+        }
+
+    TOPIC_MODES = ["GENERAL_CHINA", "MODERNIZATION", "STRICT_CPC"]
+
+    @staticmethod
+    def detect_topic_mode(folder):
+        """根据文件夹名称判断 Topic Mode"""
+        folder_name_lower = os.path.basename(folder).lower()
+        topic_mode = "GENERAL_CHINA"  # 默认
+
+        if "modern" in folder_name_lower:  # 覆盖 modernization, modernisation
+            topic_mode = "MODERNIZATION"
+        elif (
+            "cpc" in folder_name_lower
+            or "ccp" in folder_name_lower
+            or "party" in folder_name_lower
+        ):
+            topic_mode = "STRICT_CPC"
+        return topic_mode
+
+    @staticmethod
+    def resolve_output_folder(folder, input_dir, output_root=None):
+        """默认写到 <folder>/output；指定 output_root 时镜像目录结构"""
+        if not output_root:
+            return os.path.join(folder, "output")
+        rel_path = os.path.relpath(folder, input_dir)
+        return os.path.normpath(os.path.join(output_root, rel_path))
 
-        print(f"📂 Grouped into {len(files_by_folder)} folders.")
+    @staticmethod
+    def estimate_workload(input_dir, recursive=False, shard=None, sample_size=20):
+        """
+        Dry-run 估算: 只扫描文件并抽样解析 RTF，不加载任何模型
+        返回文件数、字节数、各文件夹模式、抽样解析耗时与关键词门槛通过率
+        """
+        archive = None
+        if RTFArchive.is_archive(input_dir):
+            archive = RTFArchive(input_dir)
+            all_files = archive.scan(recursive)
+        else:
+            all_files = CorpusPipeline.scan_files(input_dir, recursive)
+        if shard:
+            all_files = CorpusPipeline.select_shard(
+                all_files, shard[0], shard[1], input_dir
+            )
 
+        folders = []
+        scheduled = []
+        for folder, files in CorpusPipeline.group_by_folder(all_files).items():
+            is_root = recursive and os.path.normpath(folder) == os.path.normpath(
+                input_dir
+            )
+            folders.append(
+                {
+                    "folder": os.path.relpath(folder, input_dir),
+                    "mode": CorpusPipeline.detect_topic_mode(folder),
+                    "files": len(files),
+                    "bytes": sum(f.size for f in files),
+                    "skipped_root": is_root,
+                }
+            )
+            if not is_root:
+                scheduled.extend((f.path, f.size, folders[-1]["mode"]) for f in files)
+
+        # 抽样: 均匀取样，测量 RTF 解析速度和 Gatekeeper 通过率
+        sample = scheduled[:: max(1, len(scheduled) // sample_size)][:sample_size]
+        gate = RelevanceFilter()
+        passed = 0
+        start = time.time()
+        for path, _, mode in sample:
+            if archive is None:
+                text = RTFHandler.to_text(path)
+            else:
+                text = RTFHandler.bytes_to_text(archive.read(path), path)
+            title = text.split("\n")[0] if text else ""
+            if text and gate.is_relevant(text, title, topic_mode=mode)[0]:
+                passed += 1
+        parse_sec = (time.time() - start) / len(sample) if sample else 0.0
+        if archive is not None:
+            archive.close()
+
+        return {
+            "input_dir": input_dir,
+            "recursive": recursive,
+            "files_total": len(all_files),
+            "files_scheduled": len(scheduled),
+            "bytes_scheduled": sum(size for _, size, _ in scheduled),
+            "largest_file_bytes": max((size for _, size, _ in scheduled), default=0),
+            "folders": folders,
+            "sample_files": len(sample),
+            "parse_sec_per_file": round(parse_sec, 4),
+            "est_parse_seconds": round(parse_sec * len(scheduled), 1),
+            "gate_pass_rate": round(passed / len(sample), 3) if sample else 0.0,
+        }
+
+    # ==================================================
+    # 主流程
+    # ==================================================
+    def process_folder(
+        self,
+        input_dir,
+        output_base_dir=None,
+        recursive=False,
+        progress_callback=None,
+        output_root=None,
+        shard=None,
+        files=None,
+        profile=None,
+        output_archive=None,
+        query=None,
+    ):
+        """
+        output_base_dir: 界面传入的参数 (保留兼容，输出仍按 output_root 规则决定)
+        output_root: 指定后输出写到 output_root/<相对路径>/，否则写到 <folder>/output/
+        shard: (index, count)，只处理属于该分片的文件
+        files: 只处理这些文件 (增量模式)，结果合并进已有的 output 目录
+        profile: 采样分析整个任务或前 N 篇 (见 SamplingProfiler.from_option)，
+                 结果写到 <output_root 或 input_dir>/profile/
+        input_dir 也可以是 zip / tar 压缩包 (见 RTFArchive)，默认输出到
+        <压缩包名>_output/；output_archive 指定 .zip 时输出整体写进该压缩包
+        query: 语料目录筛选条件 (见 CorpusCatalog.select)，在解析之前下推；
+               CATALOG 配置开启或给出 query 时，处理结果同时记入目录
+        返回: 本次运行的统计 dict
+        """
+        summary = {
+            "input_dir": input_dir,
+            "files_total": 0,
+            "processed": 0,
+            "kept": 0,
+            "empty": 0,
+            "gate_skipped": 0,
+            "semantic_skipped": 0,
+            "briefing_skipped": 0,
+            "root_skipped": 0,
+            "folders": 0,
+            "elapsed_sec": 0.0,
+            "docs_per_sec": 0.0,
+        }
+
+        if self.cleaner is None or self.semantic_filter is None:
+            self.log.error("❌ Error: Pipeline models not initialized correctly.")
+            summary["error"] = "models_not_initialized"
+            return summary
+
+        start_time = time.time()
+        batch_sizes = (self.cleaner.batch_size, self.semantic_filter.batch_size)
+        first_result_sec = None
+        steady_ms = []
+        incremental = files is not None
+        archive = None
+        if incremental:
+            all_files = self.stat_files(files)
+        elif RTFArchive.is_archive(input_dir):
+            # 压缩包输入: 成员直接读成字节，不解压到磁盘
+            archive = RTFArchive(input_dir)
+            all_files = archive.scan(recursive)
+            if not output_root and not output_archive:
+                output_root = archive.default_output_root
+        else:
+            all_files = self.scan_files(input_dir, recursive)
+
+        catalog = self._open_catalog(input_dir, recursive, query)
+        if catalog is not None:
+            changes = catalog.sync(
+                all_files,
+                input_dir=None if incremental else input_dir,
+                recursive=recursive,
+            )
+            self.log.info(
+                f"🗂️ Catalog: {changes['added']} new, {changes['changed']} changed, "
+                f"{changes['removed']} removed."
+            )
+            if query:
+                all_files = self._catalog_filter(catalog, all_files, query, archive)
+                summary["catalog_selected"] = len(all_files)
+
+        if shard:
+            all_files = self.select_shard(all_files, shard[0], shard[1], input_dir)
+            self.log.info(
+                f"🧩 Shard {shard[0]}/{shard[1]}: {len(all_files)} files selected."
+            )
+
+        if not all_files:
+            self.log.warning("⚠️ No RTF files found.")
+            if archive is not None:
+                archive.close()
+            if catalog is not None:
+                catalog.close()
+            return summary
+
+        # 进度统计
+        total_files = len(all_files)
+        processed_count = 0
+        summary["files_total"] = total_files
+        self.log.info(f"🚀 Found {total_files} files.")
+
+        # 压缩的 tar 只能顺序读: 严格按包内成员顺序处理，不按文件夹重新分组
+        # (文件夹在包内交错时，每次往回 seek 都要从流的开头重新解压)
+        sequential = archive is not None and not archive.random_access
+        if sequential:
+            files_by_folder = self.group_by_folder(all_files)
+        else:
+            files_by_folder = self.schedule_files(all_files, self.schedule)
+        self.log.info(f"📂 Grouped into {len(files_by_folder)} folders.")
+        # 扫描顺序: 排程打乱了文件夹内的顺序，写 CSV / 旧版 JSON 时按它还原
+        scan_rank = {entry.path: i for i, entry in enumerate(all_files)}
+
+        topic_modes = {}  # 文件夹 -> 话题模式 (根目录跳过的文件夹不在其中)
+        remaining = collections.Counter()  # 文件夹 -> 还没写完的文章数
         for folder, files in files_by_folder.items():
             # 防止在根目录生成 /output (如果是递归模式)
             if recursive and os.path.normpath(folder) == os.path.normpath(input_dir):
-                print(f"⏩ Skipping root folder output: {folder}")
+                self.log.info(f"⏩ Skipping root folder output: {folder}")
+                summary["root_skipped"] += len(files)
                 continue
-            rel_path = os.path.relpath(folder, input_dir)
-            out_folder = os.path.join(folder, "output")
-            os.makedirs(out_folder, exist_ok=True)
+            topic_modes[folder] = self.detect_topic_mode(folder)
+            remaining[folder] += len(files)
 
-            # 友好显示路径
-            display_path = rel_path
-            if rel_path == ".":
-                display_path = f"{os.path.basename(input_dir)} (Root)"
+        ordered = (
+            all_files
+            if sequential
+            else itertools.chain.from_iterable(files_by_folder.values())
+        )
+        scheduled = []
+        for entry in ordered:
+            folder = os.path.dirname(entry.path)
+            if folder in topic_modes:
+                scheduled.append((entry.path, topic_modes[folder]))
+
+        if archive is None:
+            documents = [
+                {"id": path, "path": path, "topic_mode": mode}
+                for path, mode in scheduled
+            ]
+        else:
+            # 惰性读取: 同时在内存里的只有流水线窗口内的成员
+            documents = (
+                {"id": path, "rtf": archive.read(path), "topic_mode": mode}
+                for path, mode in scheduled
+            )
 
-            # 根据文件夹名称判断 Topic Mode
-            folder_name_lower = os.path.basename(folder).lower()
-            topic_mode = "GENERAL_CHINA"  # 默认
+        # 输出写回压缩包 (可选): 先写暂存目录，文件夹写完即打包
+        archive_out = None
+        if output_archive:
+            if incremental:
+                self.log.warning("⚠️ Incremental runs do not write output archives.")
+            else:
+                archive_out = ArchiveOutput(output_archive, staging_dir=output_root)
+                output_root = archive_out.staging_dir
+
+        # 列式导出 (可选)
+        sink = None
+        if self.export_format:
+            export_dir = self.model_configs.get("EXPORT_DIR") or os.path.join(
+                output_root or input_dir, "corpus_export"
+            )
+            sink = CorpusExportSink(
+                export_dir,
+                fmt=self.export_format,
+                rows_per_shard=self.model_configs.get("EXPORT_ROWS_PER_SHARD", 100000),
+                row_group_size=self.model_configs.get("EXPORT_ROW_GROUP_SIZE", 10000),
+            )
+            self.log.info(f"📦 Exporting {sink.fmt} shards to: {export_dir}")
+
+        def on_file(rtf_path):
+            nonlocal processed_count
+            processed_count += 1
+            # 发送进度给 Electron
+            if progress_callback:
+                progress_callback(
+                    processed_count,
+                    total_files,
+                    f"Processing: {os.path.basename(rtf_path)}",
+                )
 
-            if "modern" in folder_name_lower:  # 覆盖 modernization, modernisation
-                topic_mode = "MODERNIZATION"
-            elif (
-                "cpc" in folder_name_lower
-                or "ccp" in folder_name_lower
-                or "party" in folder_name_lower
-            ):
-                topic_mode = "STRICT_CPC"
+        profiler = SamplingProfiler.from_option(profile)
+        if profiler is not None:
+            profiler.start()
 
-            # 打印一下当前的模式，方便调试确认
-            print(f"📂 Processing: {display_path} | Mode: {topic_mode}")
+        # 文件系统适配层: 结果按输入顺序到达；一个文件夹的文章全部写完后关闭该文件夹
+        # (磁盘目录的文章是连续的；tar 包里同一目录的成员可能被子目录隔开)
+        outputs = {}
+        batches = self._stream_batches(documents, on_file=on_file)
+        try:
+            for records, batch_sec in batches:
+                if first_result_sec is None:
+                    first_result_sec = time.time() - start_time
+                else:
+                    # 首批之后的稳态延迟 (毫秒 / 篇)
+                    steady_ms.append(batch_sec * 1000 / len(records))
+
+                for record in records:
+                    folder = os.path.dirname(record["path"])
+                    output = outputs.get(folder)
+                    if output is None:
+                        output = outputs[folder] = self._open_output_folder(
+                            folder, input_dir, output_root, record["topic_mode"]
+                        )
+                        summary["folders"] += 1
+
+                    summary["processed"] += 1
+                    summary[record["status"]] += 1
+                    if (
+                        profiler is not None
+                        and profiler.max_docs
+                        and summary["processed"] >= profiler.max_docs
+                    ):
+                        profiler.stop()
+                    if record["status"] == "kept":
+                        csv_data = self._write_document(
+                            output["out_folder"], record, output["store"], incremental
+                        )
+                        if sink is not None:
+                            sink.write_record(record, folder=output["rel_path"])
+                        # G. 数据收集
+                        output["kept_filenames"].append(record["filename"])
+                        # H. 收集 CSV 日志
+                        output["csv_logs"].append(csv_data)
+                        output["scan_rank"].append(scan_rank[record["path"]])
+
+                    remaining[folder] -= 1
+                    if not remaining[folder]:
+                        self._close_output_folder(outputs.pop(folder), incremental)
+                        if archive_out is not None:
+                            archive_out.add_folder(output["out_folder"])
+                if catalog is not None:
+                    catalog.record_results(
+                        records,
+                        self.semantic_filter.rules.version,
+                        self.relevance_filter.version,
+                    )
+                del records
+                self.governor.mark("write")
+                self.governor.relieve(
+                    flush=lambda: self._flush_buffers(sink, outputs.values()),
+                    shrink=self._shrink_batches,
+                    max_window=self._max_intake_window(),
+                )
+        finally:
+            batches.close()
+            if profiler is not None:
+                # 出错中断的任务也写出已采到的栈
+                profiler.stop()
+                profile_dir = (
+                    (profile.get("dir") if isinstance(profile, dict) else None)
+                    or self.model_configs.get("PROFILE_DIR")
+                    or os.path.join(output_root or input_dir, "profile")
+                )
+                summary["profile"] = profiler.write(
+                    profile_dir, name=time.strftime("profile_%Y%m%d_%H%M%S")
+                )
+            for output in outputs.values():
+                output["store"].close()
+                if output["spill_path"] and os.path.exists(output["spill_path"]):
+                    os.remove(output["spill_path"])
+            if sink is not None:
+                manifest = sink.close()
+                summary["export"] = {
+                    "dir": sink.export_dir,
+                    "format": manifest["format"],
+                    "rows": manifest["rows"],
+                    "shards": len(manifest["shards"]),
+                }
+            if archive is not None:
+                archive.close()
+            if archive_out is not None:
+                summary["output_archive"] = archive_out.close()
+            if catalog is not None:
+                summary["catalog"] = catalog.report()
+                catalog.close()
+
+        summary["rules_version"] = self.semantic_filter.rules.version
+        if self.cleaner.memo is not None:
+            summary["paragraph_memo"] = self.cleaner.memo.report()
+            self.log.info(
+                f"♻️ Paragraph memo hit rate: {summary['paragraph_memo']['hit_rate']:.1%}"
+            )
 
-            frontend_data_list = []
-            csv_logs = []  # 进度日志
+        if self.short_circuit is not None:
+            self.short_circuit.save()
+            summary["semantic_short_circuit"] = self.short_circuit.report()
+            self.log.info(
+                "⚡ Semantic short-circuit skipped "
+                f"{summary['semantic_short_circuit']['skip_rate']:.1%} of encodes."
+            )
+        if self.cleaner.cascade is not None:
+            summary["cascade"] = self.cleaner.cascade.report()
+            self.log.info(
+                f"🪜 Cascade bypassed {summary['cascade']['bypass_rate']:.1%} "
+                "of paragraphs."
+            )
 
-            # 构建保护词列表
-            protected_kws = []
-            try:
-                # 从 Gatekeeper 获取白名单
-                protected_kws.extend(self.relevance_filter.WHITELIST_PHRASES)
-                # 从 Semantic Filter 获取正向概念里的关键词 (简单分词)
-                # 简单加一些核心词，不用太复杂
-                protected_kws.extend(
-                    [
-                        "modernization",
-                        "modernisation",
-                        "bilateral",
-                        "summit",
-                        "relations",
-                    ]
+        if self.cleaner.packing != "off":
+            summary["ner_packing"] = self.cleaner.packing_report()
+            packing = summary["ner_packing"]
+            self.log.info(
+                f"📦 NER packing: {packing['paragraphs_per_sequence']} paragraphs "
+                f"per sequence, token utilization {packing['token_utilization']:.1%}."
+            )
+            if not packing.get("within_tolerance", True):
+                self.log.warning(
+                    "⚠️ NER packing changed noise decisions for "
+                    f"{packing['decision_disagreement']:.2%} of paragraphs "
+                    f"(tolerance {packing['tolerance']:.2%})."
                 )
-                protected_kws = list(set([k for k in protected_kws if len(k) > 2]))
-            except Exception as e:
-                print(f"⚠️ 关键词提取警告: {e}")
-
-            for rtf_path in files:
-                processed_count += 1
-                # 发送进度给 Electron
-                if progress_callback:
-                    progress_callback(
-                        processed_count,
-                        total_files,
-                        f"Processing: {os.path.basename(rtf_path)}",
-                    )
 
-                # A. 读取
-                raw_text = self.rtf_handler.to_text(rtf_path)
-                if not raw_text:
-                    continue
+        # 结构性噪音规则的累计开销 (进程生命周期内；预分叉子进程的部分不在其中)
+        summary["structural_rules"] = self.cleaner.structural_rules.report()
+        timeouts = sum(r["timeouts"] for r in summary["structural_rules"].values())
+        if timeouts:
+            self.log.warning(
+                f"⏱️ Structural rules hit their time budget {timeouts} times."
+            )
 
-                temp_title = raw_text.split("\n")[0] if raw_text else ""
+        # 本次运行中因内存压力缩小的批大小恢复原值
+        self.cleaner.batch_size, self.semantic_filter.batch_size = batch_sizes
+        summary["memory"] = self.governor.report()
 
-                # 沙漏过滤器
-                # === 过滤第一步：关键词===
-                is_kept_gate, gate_reason = self.relevance_filter.is_relevant(
-                    raw_text, temp_title, topic_mode=topic_mode
+        summary["latency"] = self._latency_report(first_result_sec, steady_ms)
+        self.first_run = False
+
+        elapsed = time.time() - start_time
+        summary["elapsed_sec"] = round(elapsed, 2)
+        summary["docs_per_sec"] = (
+            round(summary["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+        )
+        self.log.info(
+            f"🏁 Done: {summary['kept']}/{summary['processed']} kept "
+            f"in {summary['elapsed_sec']}s ({summary['docs_per_sec']} docs/s)"
+        )
+        return summary
+
+    def _open_catalog(self, input_dir, recursive, query=None):
+        """CATALOG: True (缓存目录下按输入目录命名) 或数据库路径；给出 query 时总是打开"""
+        setting = self.model_configs.get("CATALOG")
+        if not setting and not query:
+            return None
+        if isinstance(setting, str):
+            db_path = setting
+        else:
+            db_path = CorpusCatalog.default_path(
+                self.model_configs.get("CACHE_DIR"), input_dir, recursive
+            )
+        return CorpusCatalog(db_path)
+
+    def _catalog_filter(self, catalog, entries, query, archive=None):
+        """
+        按目录筛选文件: 需要元数据的条件先补齐新增 / 变化文件的索引
+        (读取 + 解析一次，有解析进程池时并行)，再用 SQL 选出满足条件的路径
+        """
+        if catalog.needs_index(query):
+            # 按门筛选时，门规则变化过的文件也要重新索引
+            stale = catalog.unindexed(
+                [entry.path for entry in entries],
+                self.relevance_filter.version if query.get("gate") else None,
+            )
+            if stale:
+                self.log.info(f"🗂️ Indexing metadata of {len(stale)} files...")
+                jobs = (
+                    (
+                        path,
+                        "path" if archive is None else "rtf",
+                        path if archive is None else archive.read(path),
+                        self.detect_topic_mode(os.path.dirname(path)),
+                    )
+                    for path in stale
                 )
+                executor = None
+                if self.num_workers > 1:
+                    executor = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.num_workers
+                    )
+                try:
+                    # 分块提交: 压缩包成员的字节不会一次全部读进内存
+                    while True:
+                        chunk = list(itertools.islice(jobs, 500))
+                        if not chunk:
+                            break
+                        if executor is not None:
+                            rows = executor.map(_catalog_fields, chunk, chunksize=16)
+                        else:
+                            rows = map(_catalog_fields, chunk)
+                        catalog.update_index(list(rows))
+                finally:
+                    if executor is not None:
+                        executor.shutdown()
+
+        selected = catalog.select(query)
+        kept = [entry for entry in entries if entry.path in selected]
+        self.log.info(f"🗂️ Catalog query selected {len(kept)}/{len(entries)} files.")
+        return kept
+
+    def _open_output_folder(self, folder, input_dir, output_root, topic_mode):
+        """process_folder: 开始写一个输出文件夹，返回该文件夹的写入状态"""
+        rel_path = os.path.relpath(folder, input_dir)
+        out_folder = self.resolve_output_folder(folder, input_dir, output_root)
+        os.makedirs(out_folder, exist_ok=True)
+        spill_path = os.path.join(out_folder, ".progress_log.spill.jsonl")
+        if os.path.exists(spill_path):
+            # 上次运行中断时留下的溢写文件
+            os.remove(spill_path)
+
+        # 友好显示路径
+        display_path = rel_path
+        if rel_path == ".":
+            display_path = f"{os.path.basename(input_dir)} (Root)"
+        # 打印一下当前的模式，方便调试确认
+        self.log.info(f"📂 Processing: {display_path} | Mode: {topic_mode}")
+
+        return {
+            "folder": folder,
+            "rel_path": rel_path,
+            "out_folder": out_folder,
+            "store": ReviewStore(out_folder),
+            "kept_filenames": [],  # 本次运行保留的文件 (用于导出旧版 JSON)
+            "csv_logs": [],  # 进度日志
+            "scan_rank": [],  # 各保留文件在扫描结果中的位置
+            # 内存背压时上面三个列表溢写到这里 (文件夹结束时读回、排序后删除)
+            "spill_path": spill_path,
+        }
+
+    def _close_output_folder(self, output, incremental=False):
+        """process_folder: 文件夹结束，导出旧版 JSON 和 CSV"""
+        store = output["store"]
+        store.close()
+        store.compact_if_needed()
+
+        # 读回内存背压时溢写的部分
+        if os.path.exists(output["spill_path"]):
+            with open(output["spill_path"], "rb") as f:
+                for line in f:
+                    rank, filename, csv_data = serializer.loads(line)
+                    output["scan_rank"].append(rank)
+                    output["kept_filenames"].append(filename)
+                    output["csv_logs"].append(csv_data)
+            os.remove(output["spill_path"])
+
+        # 按扫描顺序还原 (与排程无关，输出文件内容稳定)
+        order = sorted(
+            range(len(output["scan_rank"])), key=output["scan_rank"].__getitem__
+        )
+        output["kept_filenames"] = [output["kept_filenames"][i] for i in order]
+        output["csv_logs"] = [output["csv_logs"][i] for i in order]
+
+        # 保存 JSON (从审查库导出旧版格式，兼容 Review Lab)
+        # 增量模式下导出整个审查库，保留之前运行的文章
+        if output["kept_filenames"] and self.write_legacy_json:
+            store.export_legacy_json(
+                None if incremental else output["kept_filenames"],
+                pretty=self.pretty_json,
+            )
 
-                if not is_kept_gate:
-                    print(
-                        f"🚫 [Gatekeeper Skipped] {os.path.basename(rtf_path)}: {gate_reason}"
+        self.governor.mark("export")
+
+        # 保存 CSV (增量模式下已经逐篇追加，这里只去掉重新处理的文件的旧行)
+        csv_path = os.path.join(output["out_folder"], "progress_log.csv")
+        if output["csv_logs"] and not incremental:
+            pd.DataFrame(output["csv_logs"]).to_csv(
+                csv_path, index=False, encoding="utf-8-sig"
+            )
+        elif output["csv_logs"] and os.path.exists(csv_path):
+            try:
+                df = pd.read_csv(csv_path)
+                deduped = df.drop_duplicates("Filename", keep="last")
+                if len(deduped) < len(df):
+                    deduped.to_csv(csv_path, index=False, encoding="utf-8-sig")
+            except Exception as e:
+                self.log.warning(f"⚠️ Error deduplicating CSV log: {e}")
+
+    def watch(
+        self,
+        input_dir,
+        recursive=False,
+        output_root=None,
+        interval=2.0,
+        debounce=3.0,
+        stop_event=None,
+        on_summary=None,
+    ):
+        """
+        守护模式: 模型常驻，轮询输入目录，只处理新增 / 修改过的 RTF
+        stop_event (threading.Event) 被设置或 Ctrl+C 时退出，返回累计统计
+        """
+        cache_dir = self.model_configs.get("CACHE_DIR") or DEFAULT_CACHE_DIR
+        watcher = FolderWatcher(input_dir, recursive, debounce, cache_dir=cache_dir)
+        totals = collections.Counter()
+        self.log.info(
+            f"👀 Watching {input_dir} (every {interval}s, debounce {debounce}s)..."
+        )
+        try:
+            while stop_event is None or not stop_event.is_set():
+                ready = watcher.poll()
+                if ready:
+                    self.log.info(f"📥 {len(ready)} new or changed files.")
+                    summary = self.process_folder(
+                        input_dir,
+                        recursive=recursive,
+                        output_root=output_root,
+                        files=ready,
                     )
-                    continue
+                    watcher.mark_done(ready)
+                    totals.update(
+                        {k: v for k, v in summary.items() if k in WATCH_TOTAL_KEYS}
+                    )
+                    if on_summary:
+                        on_summary(summary)
+                if stop_event is not None:
+                    stop_event.wait(interval)
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.save()
+        self.log.info(f"🛑 Watch stopped: {totals['kept']}/{totals['processed']} kept.")
+        return dict(totals)
 
-                # === 过滤第二步：语义===
-                # 只有通过了第一步的文章才会进这里
-                is_kept_sem, sem_reason = self.semantic_filter.is_relevant(
-                    raw_text, temp_title
+    def stream(self, documents, topic_mode="GENERAL_CHINA"):
+        """
+        内存流式接口: 不经过文件系统，按输入顺序惰性产出 record
+        documents 的每一项可以是:
+        - (doc_id, bytes): RTF 原始字节
+        - (doc_id, str): 纯文本 (以 "{\\rtf" 开头时按 RTF 解析)
+        - dict: {"id", "rtf" | "text" | "path", "topic_mode" (可选)}
+        批处理、解析进程池 / 预分叉进程池都在内部完成；同时在途的文章数有上限，
+        documents 可以是数据库游标之类的无限迭代器
+        record 与 process_folder 内部使用的相同，record["path"] 为 doc_id
+        """
+        batches = self._stream_batches(documents, topic_mode)
+        try:
+            for records, _ in batches:
+                yield from records
+                del records
+                self.governor.relieve(
+                    flush=self._flush_buffers,
+                    shrink=self._shrink_batches,
+                    max_window=self._max_intake_window(),
                 )
+        finally:
+            batches.close()
 
-                if not is_kept_sem:
-                    print(
-                        f"🗑️ [Semantic Skipped] {os.path.basename(rtf_path)}: {sem_reason}"
-                    )
-                    continue
+    def clean_batch(self, items, topic_mode="GENERAL_CHINA"):
+        """
+        对内存中的一批 (name, raw_text) 或 (name, raw_text, topic_mode)
+        执行完整流程，不写任何文件 (HTTP 服务使用)；
+        整批文章的段落一起推理，返回与 _process_batch 相同的 record 列表
+        """
+        if self._protected_kws is None:
+            self._protected_kws = self._build_protected_keywords()
+        return self._process_batch(items, topic_mode, self._protected_kws)
 
-                # print(f"✅ [Kept] {os.path.basename(rtf_path)}: {sem_reason}")
+    def _flush_buffers(self, sink=None, outputs=()):
+        """
+        内存背压第一步: 导出缓冲落盘，打开的输出文件夹的 CSV 行 / 保留文件列表
+        追加到各自的溢写文件，段落缓存减半
+        """
+        if sink is not None:
+            sink.flush()
+        for output in outputs:
+            self._spill_output_logs(output)
+        if self.cleaner.memo is not None:
+            self.cleaner.memo.shrink(0.5)
 
-                # B. 过滤 Briefing
-                if self.struct_cleaner.is_skippable(raw_text):
-                    continue
+    @staticmethod
+    def _spill_output_logs(output):
+        """把一个输出文件夹在内存里累积的日志行追加到溢写文件并清空"""
+        if not output["csv_logs"]:
+            return
+        with open(output["spill_path"], "ab") as f:
+            for rank, filename, csv_data in zip(
+                output["scan_rank"], output["kept_filenames"], output["csv_logs"]
+            ):
+                f.write(serializer.dumpb([rank, filename, csv_data]) + b"\n")
+        output["scan_rank"].clear()
+        output["kept_filenames"].clear()
+        output["csv_logs"].clear()
+
+    def _shrink_batches(self):
+        """内存背压第二步: 批大小减半，已经是 1 时返回 False"""
+        ner, sem = self.cleaner.batch_size, self.semantic_filter.batch_size
+        if ner <= 1 and sem <= 1:
+            return False
+        self.cleaner.batch_size = max(1, ner // 2)
+        self.semantic_filter.batch_size = max(1, sem // 2)
+        self.log.warning(
+            f"⚠️ Memory pressure: batch sizes -> ner {self.cleaner.batch_size}, "
+            f"semantic {self.semantic_filter.batch_size}"
+        )
+        return True
+
+    def _max_intake_window(self):
+        """内存背压第三步: 当前配置下最大的读入窗口 (预读 / 解析进程池 / 预分叉)"""
+        pool = self._prefork_pool
+        return max(
+            self.read_ahead,
+            self.num_workers * 4 if self.num_workers > 1 else 1,
+            pool.prefork_workers * 2 if pool is not None else 1,
+        )
 
-                # C. 结构分析
-                h_end, f_start, meta = self.meta_extractor.analyze_structure(raw_text)
+    def _stream_batches(self, documents, topic_mode="GENERAL_CHINA", on_file=None):
+        """
+        stream / process_folder 共用的核心: 按批产出 (records, 模型耗时秒)
+        解析进程池在第一次取结果时启动，生成器关闭时回收 (预分叉进程池随流水线存在)
+        """
+        if self.cleaner is None or self.semantic_filter is None:
+            raise RuntimeError("Pipeline models not initialized correctly.")
+
+        sources = (self._as_source(doc, topic_mode) for doc in documents)
+        if self.read_ahead > 0:
+            sources = self._read_ahead(sources)
+        if self._protected_kws is None:
+            self._protected_kws = self._build_protected_keywords()
+
+        executor = None
+        pool = self._prefork_pool
+        if pool is None and self.num_workers > 1:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.num_workers
+            )
+        try:
+            yield from self._iter_record_batches(
+                sources, self._protected_kws, executor, pool, on_file
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
 
-                # D. NER 清洗
-                final_clean_body, body_noise = self.cleaner.clean(
-                    raw_text, h_end, f_start, protected_keywords=protected_kws
-                )
+    def _read_ahead(self, sources):
+        """
+        预读: 后台线程提前读入后面 READ_AHEAD_FILES 个文件的字节，
+        解析 (本进程 / 解析进程池 / 预分叉进程) 拿到的已经是内存里的 RTF，
+        不会在冷存储 (网络盘、刚插上的移动硬盘) 上等 I/O
+        sources 本身仍在调用方线程里迭代 (可以是数据库游标之类非线程安全的迭代器)
+        """
+        reader = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="read-ahead"
+        )
 
-                # 格式化 (Formatting)
-                final_clean_body = TextFormatter.format_text(final_clean_body)
-
-                # E. 构建高亮
-                highlights = []
-                if h_end > 0:
-                    highlights.append({"start": 0, "end": h_end, "type": "HEADER"})
-                highlights.extend(body_noise)
-                if f_start < len(raw_text):
-                    highlights.append(
-                        {"start": f_start, "end": len(raw_text), "type": "FOOTER"}
+        def submit(source):
+            if source[1] != "path":
+                return source, None
+            return source, reader.submit(read_file, source[2])
+
+        try:
+            source_iter = iter(sources)
+            pending = collections.deque()
+            while True:
+                # 窗口随内存背压收紧: 只在有空位时才拉取下一个源
+                while len(pending) < self.governor.window(self.read_ahead):
+                    next_source = next(source_iter, None)
+                    if next_source is None:
+                        break
+                    pending.append(submit(next_source))
+                if not pending:
+                    return
+                source, future = pending.popleft()
+                data = future.result() if future is not None else None
+                if data is None:
+                    yield source
+                else:
+                    doc_id, _, _, mode = source
+                    yield doc_id, "rtf", data, mode
+        finally:
+            reader.shutdown(cancel_futures=True)
+
+    def _as_source(self, doc, topic_mode):
+        """输入文档 -> (doc_id, kind, payload, topic_mode)，kind 为 path / rtf / text"""
+        if isinstance(doc, dict):
+            doc_id = doc.get("id", doc.get("path"))
+            topic_mode = doc.get("topic_mode") or topic_mode
+            for kind in ("path", "rtf", "text"):
+                if kind in doc:
+                    payload = doc[kind]
+                    break
+            else:
+                raise ValueError(f"Document {doc_id!r} needs 'path', 'rtf' or 'text'")
+        else:
+            doc_id, payload = doc
+            if isinstance(payload, (bytes, bytearray, memoryview)):
+                kind = "rtf"
+            elif payload.lstrip().startswith("{\\rtf"):
+                kind = "rtf"
+            else:
+                kind = "text"
+        if topic_mode not in self.TOPIC_MODES:
+            raise ValueError(f"Unknown topic_mode: {topic_mode}")
+        return str(doc_id), kind, payload, topic_mode
+
+    def _chunk_by_mode(self, items):
+        """
+        按批切分 (每项最后一个元素是 topic_mode)
+        话题模式变化时提前结束当前批；批大小可能被内存背压调小，每批重新读取
+        """
+        batch = []
+        for item in items:
+            if batch and item[-1] != batch[-1][-1]:
+                yield batch
+                batch = []
+            batch.append(item)
+            if len(batch) >= self.semantic_filter.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _iter_record_batches(
+        self, sources, protected_kws, executor=None, pool=None, on_file=None
+    ):
+        """
+        按批产出 (records, 模型耗时秒)，顺序与 sources 一致
+        有预分叉进程池时整批交给工作进程 (解析 + 推理都在子进程里)，
+        最多同时提交 2 倍进程数的批次；语义规则在本进程热更新，
+        版本随批发出，工作进程对各组件状态的改动随结果发回并合并
+        """
+        if pool is not None:
+            window = collections.deque()
+            chunks = self._chunk_by_mode(sources)
+            while True:
+                while len(window) < self.governor.window(pool.prefork_workers * 2):
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    self.semantic_filter.reload_if_changed()
+                    rules = self.semantic_filter.rules
+                    job = (
+                        chunk,
+                        protected_kws,
+                        (rules.version, rules.positive, rules.negative),
+                        (self.cleaner.batch_size, self.semantic_filter.batch_size),
                     )
+                    window.append(pool.apply_async(_prefork_run_batch, (job,)))
+                if not window:
+                    return
+                records, batch_sec, state = window.popleft().get()
+                self._merge_worker_state(state)
+                for record in records:
+                    if on_file:
+                        on_file(record["path"])
+                yield records, batch_sec
+
+        texts = self._iter_raw_texts(sources, executor)
+        for batch in self._chunk_by_mode(texts):
+            if on_file:
+                for doc_id, _, _ in batch:
+                    on_file(doc_id)
+            self.governor.mark("parse")
+            batch_start = time.perf_counter()
+            records = self._process_batch(
+                [(doc_id, raw_text) for doc_id, raw_text, _ in batch],
+                batch[0][-1],
+                protected_kws,
+            )
+            yield records, time.perf_counter() - batch_start
+
+    @classmethod
+    def _prefork_plan(cls, model_configs):
+        """
+        PREFORK_WORKERS > 1 时返回 (进程数, 每个进程的线程数)
+        只支持 CPU + 支持 fork 的系统，其它情况返回 None (单进程)
+        """
+        workers = int(model_configs.get("PREFORK_WORKERS") or 0)
+        if workers <= 1:
+            return None
+        device, _ = DeviceManager.get_optimal_device(model_configs.get("DEVICE"))
+        if device != "cpu":
+            cls.log.warning(
+                f"⚠️ Pre-fork workers need the CPU backend (got {device}), "
+                "running in a single process."
+            )
+            return None
+        if "fork" not in multiprocessing.get_all_start_methods():
+            cls.log.warning(
+                "⚠️ fork() not available here, running in a single process."
+            )
+            return None
+
+        cores = psutil.cpu_count(logical=False) or psutil.cpu_count() or 1
+        threads = int(model_configs.get("PREFORK_THREADS") or max(1, cores // workers))
+        return workers, threads
+
+    def _start_prefork_pool(self, workers, threads, warmup=True):
+        """
+        模型已在本进程加载完毕，fork 出的子进程通过写时复制共享权重，
+        RSS 不会随进程数成倍增长
+        必须在本进程做任何多线程推理之前调用 (见 __init__)
+        """
+        ctx = multiprocessing.get_context("fork")
+        # 子进程的日志经这个队列回到本进程的日志线程
+        log_queue = ctx.Queue()
+        relay = logging.handlers.QueueListener(log_queue, _PreforkLogRelay())
+        relay.start()
+
+        global _PREFORK_PIPELINE
+        _PREFORK_PIPELINE = self
+        # 冻结现有对象: 子进程里的 GC 不再扫描 (并弄脏) 模型所在的内存页
+        gc.collect()
+        gc.freeze()
+        pool = ctx.Pool(
+            workers, initializer=_prefork_init, initargs=(threads, log_queue, warmup)
+        )
+        pool.log_relay = relay
+        pool.prefork_workers = workers
+        self.log.info(
+            f"🍴 Forked {workers} workers x {threads} threads sharing model weights."
+        )
+        return pool
+
+    def _stop_prefork_pool(self, pool):
+        global _PREFORK_PIPELINE
+        pool.close()
+        pool.join()
+        pool.log_relay.stop()
+        _PREFORK_PIPELINE = None
+        gc.unfreeze()
 
-                # F. 保存 TXT
-                file_stem = os.path.splitext(os.path.basename(rtf_path))[0]
-                if file_stem.startswith("._"):
-                    file_stem = file_stem[2:]
-                clean_filename = re.sub(r'[\\/*?:"<>|]', "_", file_stem) + ".txt"
-
-                out_txt_path = os.path.join(out_folder, clean_filename)
-                content = (
-                    f"<title>{meta['title']}</title>\n"
-                    f"<date>{meta['date']}</date>\n"
-                    f"<source>{meta['source']}</source>\n"
-                    f"<body>\n{final_clean_body}\n</body>"
+    def _track_worker_state(self):
+        """
+        在预分叉工作进程里调用: 开始记录段落缓存 / 语义短路的新增内容，
+        概念向量缓存只由父进程写
+        """
+        if self.cleaner.memo is not None:
+            self.cleaner.memo.journal = []
+        if self.short_circuit is not None:
+            self.short_circuit.journal = {}
+        self.semantic_filter.concept_cache_path = None
+
+    def _drain_worker_state(self):
+        """工作进程: 本批对各组件状态的改动 (缓存新条目、级联样本、各项统计)"""
+        cleaner = self.cleaner
+        state = {
+            "packing": dict(cleaner.packing_stats),
+            "structural_rules": cleaner.structural_rules.drain_delta(),
+        }
+        cleaner.packing_stats.clear()
+        if cleaner.memo is not None:
+            state["memo"] = cleaner.memo.drain_delta()
+        if cleaner.cascade is not None:
+            state["cascade"] = cleaner.cascade.drain_delta()
+        if self.short_circuit is not None:
+            state["short_circuit"] = self.short_circuit.drain_delta()
+        return state
+
+    def _merge_worker_state(self, state):
+        """父进程: 合并工作进程发回的改动，汇总报告和落盘的缓存与单进程一致"""
+        cleaner = self.cleaner
+        cleaner.packing_stats.update(state["packing"])
+        cleaner.structural_rules.merge_delta(state["structural_rules"])
+        if "memo" in state:
+            cleaner.memo.merge_delta(state["memo"])
+        if "cascade" in state:
+            cleaner.cascade.merge_delta(state["cascade"])
+        if "short_circuit" in state:
+            self.short_circuit.merge_delta(state["short_circuit"])
+
+    def _latency_report(self, first_result_sec, steady_ms):
+        """启动耗时、首批结果耗时、稳态每篇耗时 (p50 / p95)"""
+        report = {
+            "startup_sec": round(self.startup_sec, 2),
+            "autotune_sec": round(self.autotune_sec, 2),
+            "warmup_sec": round(self.warmup_sec, 2),
+            "inference_mode": self.cleaner.inference_mode,
+        }
+        if first_result_sec is not None:
+            report["first_result_sec"] = round(first_result_sec, 3)
+            if self.first_run:
+                report["startup_to_first_result_sec"] = round(
+                    self.startup_sec + first_result_sec, 2
                 )
-                with open(out_txt_path, "w", encoding="utf-8") as f:
-                    f.write(content)
+        if steady_ms:
+            report["steady_ms_per_doc_p50"] = round(
+                float(np.percentile(steady_ms, 50)), 2
+            )
+            report["steady_ms_per_doc_p95"] = round(
+                float(np.percentile(steady_ms, 95)), 2
+            )
+        self.log.info(
+            f"⏱️ Startup {report['startup_sec']}s | first result "
+            f"{report.get('first_result_sec', '-')}s | steady p50 "
+            f"{report.get('steady_ms_per_doc_p50', '-')} ms/doc"
+        )
+        return report
 
-                self._append_to_folder_logs(
-                    out_folder,
-                    {
-                        "filename": clean_filename,
-                        "original_text": raw_text,
-                        "cleaned_body": final_clean_body,
-                        "highlights": [],
-                        "metadata": meta,
-                    },
-                    {
-                        "Filename": clean_filename,
-                        "Title": meta["title"],
-                        "Date": meta["date"],
-                        "Source": meta["source"],
-                        "Checked": "No",
-                    },
+    def _build_protected_keywords(self):
+        protected_kws = []
+        try:
+            # 从 Gatekeeper 获取白名单
+            protected_kws.extend(self.relevance_filter.WHITELIST_PHRASES)
+            # 从 Semantic Filter 获取正向概念里的关键词 (简单分词)
+            # 简单加一些核心词，不用太复杂
+            protected_kws.extend(
+                [
+                    "modernization",
+                    "modernisation",
+                    "bilateral",
+                    "summit",
+                    "relations",
+                ]
+            )
+            protected_kws = list(set([k for k in protected_kws if len(k) > 2]))
+        except Exception as e:
+            self.log.warning(f"⚠️ 关键词提取警告: {e}")
+        return protected_kws
+
+    def _iter_raw_texts(self, sources, executor=None):
+        """
+        按顺序产出 (doc_id, raw_text, topic_mode)
+        有进程池时预先提交一个有限窗口的解析任务，RTF 解析与模型推理重叠进行
+        """
+        if executor is None:
+            for doc_id, kind, payload, topic_mode in sources:
+                yield doc_id, _load_source(kind, payload, doc_id), topic_mode
+            return
+
+        def submit(source):
+            doc_id, kind, payload, topic_mode = source
+            if kind == "text":
+                future = concurrent.futures.Future()
+                future.set_result(payload)
+            else:
+                future = executor.submit(_load_source, kind, payload, doc_id)
+            return doc_id, future, topic_mode
+
+        source_iter = iter(sources)
+        pending = collections.deque()
+        while True:
+            while len(pending) < self.governor.window(self.num_workers * 4):
+                next_source = next(source_iter, None)
+                if next_source is None:
+                    break
+                pending.append(submit(next_source))
+            if not pending:
+                return
+            doc_id, future, topic_mode = pending.popleft()
+            yield doc_id, future.result(), topic_mode
+
+    def _process_batch(self, items, topic_mode, protected_kws, reload_rules=True):
+        """
+        对一批 (rtf_path, raw_text) 执行完整清洗流程
+        (也可以是 (rtf_path, raw_text, topic_mode)，覆盖整批的 topic_mode)
+        返回与输入等长的 record 列表，record["status"] 表示结果:
+        kept / empty / gate_skipped / semantic_skipped / briefing_skipped
+        reload_rules=False: 规则由调用方管理 (预分叉工作进程)
+        """
+        records = []
+        gate_passed = []
+
+        # 语义规则热更新 (只在批次之间生效)
+        if reload_rules:
+            self.semantic_filter.reload_if_changed()
+
+        for rtf_path, raw_text, *item_mode in items:
+            record = {
+                "path": rtf_path,
+                "raw_text": raw_text,
+                "status": "kept",
+                "topic_mode": item_mode[0] if item_mode else topic_mode,
+            }
+            records.append(record)
+
+            # A. 读取
+            if not raw_text:
+                record["status"] = "empty"
+                continue
+
+            # 各阶段共用的文档视图 (批次结束时丢弃，不随 record 传出)
+            doc = Document(raw_text, rtf_path, self.meta_extractor)
+            record["doc"] = doc
+            record["title"] = doc.first_line
+
+            # 沙漏过滤器
+            # === 过滤第一步：关键词===
+            is_kept_gate, gate_reason = self.relevance_filter.is_relevant(
+                doc, topic_mode=record["topic_mode"]
+            )
+            record["gate_reason"] = gate_reason
+
+            if not is_kept_gate:
+                self.log.debug(
+                    "🚫 [Gatekeeper Skipped] %s: %s",
+                    os.path.basename(rtf_path),
+                    gate_reason,
                 )
-                # G. 数据收集
-                frontend_data_list.append(
-                    {
-                        "filename": clean_filename,
-                        "original_text": raw_text,
-                        "cleaned_body": final_clean_body,
-                        "highlights": highlights,
-                        "metadata": meta,
-                    }
+                record["status"] = "gate_skipped"
+                continue
+            gate_passed.append(record)
+
+        # === 过滤第二步：语义===
+        # 只有通过了第一步的文章才会进这里 (整批一起 encode)
+        sem_results = self._semantic_results(gate_passed)
+        self.governor.mark("semantic")
+
+        to_clean = []
+        for record, (is_kept_sem, sem_reason, sem_scores) in zip(
+            gate_passed, sem_results
+        ):
+            rtf_path = record["path"]
+            doc = record["doc"]
+            record["sem_reason"] = sem_reason
+            record["sem_scores"] = sem_scores
+            record["rules_version"] = sem_scores["rules_version"]
+
+            if not is_kept_sem:
+                self.log.debug(
+                    "🗑️ [Semantic Skipped] %s: %s",
+                    os.path.basename(rtf_path),
+                    sem_reason,
                 )
+                record["status"] = "semantic_skipped"
+                continue
 
-                # H. 收集 CSV 日志
-                csv_logs.append(
-                    {
-                        "Filename": clean_filename,
-                        "Title": meta["title"],
-                        "Date": meta["date"],
-                        "Source": meta["source"],
-                        "Checked": "No",
-                    }
-                )
+            # B. 过滤 Briefing
+            if self.struct_cleaner.is_skippable(doc):
+                record["status"] = "briefing_skipped"
+                continue
+            to_clean.append(record)
+
+        # D. NER 清洗: 整批文章的段落合并推理
+        cleaned = self.cleaner.clean_many(
+            [record["doc"] for record in to_clean],
+            protected_keywords=protected_kws,
+            sources=[record["doc"].meta["source"] for record in to_clean],
+        )
 
-            # 保存 JSON
-            if frontend_data_list:
-                json_path = os.path.join(out_folder, "frontend_diff.json")
-                with open(json_path, "w", encoding="utf-8") as f:
-                    json.dump(frontend_data_list, f, ensure_ascii=False, indent=2)
-
-            # 保存 CSV
-            if csv_logs:
-                pd.DataFrame(csv_logs).to_csv(
-                    os.path.join(out_folder, "progress_log.csv"),
-                    index=False,
-                    encoding="utf-8-sig",
+        for record, (final_clean_body, body_noise) in zip(to_clean, cleaned):
+            raw_text = record["raw_text"]
+            # C. 结构分析 (语义阶段可能已经算过)
+            h_end, f_start, meta = record["doc"].structure
+
+            # 格式化 (Formatting)
+            final_clean_body = TextFormatter.format_text(final_clean_body)
+
+            # E. 构建高亮
+            highlights = []
+            if h_end > 0:
+                highlights.append({"start": 0, "end": h_end, "type": "HEADER"})
+            highlights.extend(body_noise)
+            if f_start < len(raw_text):
+                highlights.append(
+                    {"start": f_start, "end": len(raw_text), "type": "FOOTER"}
                 )
 
-    def _append_to_folder_logs(self, output_dir, frontend_data, csv_data):
+            record["meta"] = meta
+            record["cleaned_body"] = final_clean_body
+            record["highlights"] = highlights
+
+        for record in records:
+            record.pop("doc", None)
+        self.governor.mark("ner")
+        return records
+
+    def _semantic_results(self, records):
         """
-        辅助函数：向指定 folders 的 logs 追加数据。
-        如果文件不存在则创建，存在则读取后追加 (避免覆盖同目录下的其他文件记录)
+        语义判断，顺序与 records 一致: [(bool, reason, scores), ...]
+        开启短路策略时，高置信分组的文章不 encode，直接判为通过
         """
+        policy = self.short_circuit
+        if policy is None:
+            return self.semantic_filter.is_relevant_batch(
+                [self._semantic_input(r["doc"]) for r in records],
+                [r["title"] for r in records],
+                return_scores=True,
+            )
 
-        # === 1. 处理 JSON (frontend_diff.json) ===
-        json_path = os.path.join(output_dir, "frontend_diff.json")
-        current_list = []
+        rules_version = self.semantic_filter.rules.version
+        keys = [
+            policy.key(
+                r["topic_mode"],
+                r["gate_reason"],
+                self.relevance_filter.anchor_hits(r["doc"]),
+            )
+            for r in records
+        ]
+        run, skipped, verify = policy.split(keys, rules_version)
+        results = [None] * len(records)
+        for i in skipped:
+            results[i] = (
+                True,
+                f"SHORT_CIRCUIT [{keys[i]}]",
+                {"rules_version": rules_version, "short_circuit": True},
+            )
 
-        # 读取旧数据
-        if os.path.exists(json_path):
-            try:
-                with open(json_path, "r", encoding="utf-8") as f:
-                    content = f.read().strip()
-                    if content:
-                        current_list = json.loads(content)
-            except Exception as e:
-                print(f"⚠️ Error reading JSON log: {e}")
+        encoded = self.semantic_filter.is_relevant_batch(
+            [self._semantic_input(records[i]["doc"]) for i in run],
+            [records[i]["title"] for i in run],
+            return_scores=True,
+        )
+        for i, result in zip(run, encoded):
+            results[i] = result
+        policy.observe(
+            [keys[i] for i in run],
+            [result[0] for result in encoded],
+            rules_version,
+            verify={n for n, i in enumerate(run) if i in verify},
+        )
+        return results
 
-        # 去重更新：如果列表中已经有了这个 filename，先删掉旧的，再加新的
-        current_list = [
-            item
-            for item in current_list
-            if item.get("filename") != frontend_data["filename"]
-        ]
-        current_list.append(frontend_data)
+    def _semantic_input(self, doc):
+        """
+        语义阶段 encode 的文本 (之后取前 800 字符，前面拼上标题)
+        body: 正文开头 (跳过日期 / 来源 / 版权等 Header 样板)；head: 全文开头 (旧行为)
+        """
+        if self.semantic_input == "body" and doc.body:
+            return doc.body
+        return doc.text
+
+    def _write_document(self, out_folder, record, store=None, append_csv=False):
+        """
+        保存单篇 TXT 并写入审查库，返回 csv_data
+        append_csv: 同时往 progress_log.csv 追加一行 (增量模式；
+                    整批运行时 CSV 在文件夹结束时一次写出)
+        """
+        meta = record["meta"]
+        final_clean_body = record["cleaned_body"]
+
+        # F. 保存 TXT
+        file_stem = os.path.splitext(os.path.basename(record["path"]))[0]
+        if file_stem.startswith("._"):
+            file_stem = file_stem[2:]
+        clean_filename = re.sub(r'[\\/*?:"<>|]', "_", file_stem) + ".txt"
+        record["filename"] = clean_filename
+
+        out_txt_path = os.path.join(out_folder, clean_filename)
+        content = (
+            f"<title>{meta['title']}</title>\n"
+            f"<date>{meta['date']}</date>\n"
+            f"<source>{meta['source']}</source>\n"
+            f"<body>\n{final_clean_body}\n</body>"
+        )
+        with open(out_txt_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+        csv_data = {
+            "Filename": clean_filename,
+            "Title": meta["title"],
+            "Date": meta["date"],
+            "Source": meta["source"],
+            "Checked": "No",
+        }
+        self._append_to_folder_logs(
+            out_folder,
+            {
+                "filename": clean_filename,
+                "original_text": record["raw_text"],
+                "cleaned_body": final_clean_body,
+                "highlights": record["highlights"],
+                "metadata": meta,
+                "rules_version": record.get("rules_version"),
+            },
+            csv_data,
+            store,
+            append_csv,
+        )
+        return dict(csv_data)
 
-        # 写入
+    def _append_to_folder_logs(
+        self, output_dir, frontend_data, csv_data, store=None, append_csv=True
+    ):
+        """
+        辅助函数：向指定 folders 的 logs 追加数据。
+        审查数据追加到 ReviewStore (O(1)，不再每篇重写整个 JSON)；
+        append_csv 时 CSV 不存在则创建，存在则在末尾追加一行
+        (同名文件的旧行在文件夹结束时统一去掉，见 _close_output_folder)
+        """
+
+        # === 1. 审查数据 (review_store.bin / .idx) ===
+        owns_store = store is None
+        if owns_store:
+            store = ReviewStore(output_dir)
         try:
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(current_list, f, ensure_ascii=False, indent=2)
+            store.append(frontend_data)
         except Exception as e:
-            print(f"❌ Failed to write JSON log: {e}")
+            self.log.error(f"❌ Failed to write review store: {e}")
+        finally:
+            if owns_store:
+                store.close()
 
         # === 2. 处理 CSV (progress_log.csv) ===
+        if not append_csv:
+            return
         csv_path = os.path.join(output_dir, "progress_log.csv")
-        df = pd.DataFrame()
-
-        # 读取旧数据
-        if os.path.exists(csv_path):
-            try:
-                df = pd.read_csv(csv_path)
-            except Exception as e:
-                print(f"⚠️ Error reading CSV log: {e}")
-
-        new_row = pd.DataFrame([csv_data])
-
-        # 去重更新
-        if not df.empty and "Filename" in df.columns:
-            # 删除旧记录
-            df = df[df["Filename"] != csv_data["Filename"]]
-            # 追加新记录
-            df = pd.concat([df, new_row], ignore_index=True)
-        else:
-            # 如果是空表，直接赋值
-            df = new_row
-
-        # 写入 (utf-8-sig 防止 Excel 打开乱码)
         try:
-            df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+            fieldnames = list(csv_data)
+            exists = os.path.exists(csv_path) and os.path.getsize(csv_path) > 0
+            if exists:
+                # 沿用已有表头的列顺序 (界面可能加过列)
+                with open(csv_path, newline="", encoding="utf-8-sig") as f:
+                    fieldnames = next(csv.reader(f), None) or fieldnames
+            # 写入 (utf-8-sig 防止 Excel 打开乱码；追加时不会重复写 BOM)
+            with open(csv_path, "a", newline="", encoding="utf-8-sig") as f:
+                # 换行符与 pandas 写出的部分保持一致
+                writer = csv.DictWriter(
+                    f,
+                    fieldnames,
+                    restval="",
+                    extrasaction="ignore",
+                    lineterminator=os.linesep,
+                )
+                if not exists:
+                    writer.writeheader()
+                writer.writerow(csv_data)
         except Exception as e:
-            print(f"❌ Failed to write CSV log: {e}")
+            self.log.error(f"❌ Failed to write CSV log: {e}")
 
     def dispose(self):
-        print("🗑️ Disposing Pipeline resources...")
+        self.log.info("🗑️ Disposing Pipeline resources...")
+        if getattr(self, "_prefork_pool", None) is not None:
+            self._stop_prefork_pool(self._prefork_pool)
+            self._prefork_pool = None
+        if getattr(self, "short_circuit", None) is not None:
+            self.short_circuit.save()
         if hasattr(self, "cleaner"):
             self.cleaner.release_memory()
         if hasattr(self, "semantic_filter"):
@@ -1188,33 +3362,115 @@ class CorpusPipeline:
         self.semantic_filter = None
         self.seen_hashes = None
         gc.collect()
-        print("✨ Pipeline resources completely freed.")
+        self.log.info("✨ Pipeline resources completely freed.")
 
 
-if __name__ == "__main__":
-    # 路径配置
-    current_script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = current_script_dir
+# ==================================================
+# 解析任务 (解析进程池 / 预分叉工作进程共用)
+# ==================================================
+def _load_source(kind, payload, name):
+    """(kind, payload) -> 纯文本；模块级函数，可以交给解析进程池"""
+    if kind == "path":
+        return RTFHandler.to_text(payload)
+    if kind == "rtf":
+        if isinstance(payload, str):
+            # RTF 本身是 ASCII + cp1252 转义，与读取文件时的解码一致
+            payload = payload.encode("cp1252", errors="replace")
+        return RTFHandler.bytes_to_text(bytes(payload), name)
+    return payload
+
 
-    # 动态拼接模型路径
-    noise_model_path = os.path.join(
-        project_root, "models", "noise-cleaner-deberta-v2", "final"
+# ==================================================
+# 预分叉工作进程 (PREFORK_WORKERS)
+# ==================================================
+# fork 之前指向已加载模型的流水线，子进程直接继承
+_PREFORK_PIPELINE = None
+
+
+class _PreforkLogRelay(logging.Handler):
+    """把子进程发回的日志记录交给本进程同名的 logger"""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def _prefork_init(threads, log_queue, warmup=True):
+    # fork 之后才设置线程数: 每个工作进程启动自己的 OpenMP 线程池
+    torch.set_num_threads(threads)
+    # 父进程的日志线程不会被 fork 过来，改为发回父进程
+    root = logging.getLogger(LOGGER_ROOT)
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    pipeline = _PREFORK_PIPELINE
+    pipeline._track_worker_state()
+    if warmup:
+        warmup_sec = pipeline.cleaner.warmup() + pipeline.semantic_filter.warmup()
+        pipeline.log.info(f"🔥 Worker {os.getpid()} warmed up in {warmup_sec:.2f}s.")
+
+
+def _prefork_run_batch(job):
+    """
+    job = (sources, 保护词, (规则版本, 正向概念, 负向概念), (NER 批大小, 语义批大小))
+    返回 (records, 耗时秒, 本批的状态改动)，改动由父进程合并
+    """
+    sources, protected_kws, rules, batch_sizes = job
+    pipeline = _PREFORK_PIPELINE
+    # 所有工作进程执行父进程热更新后的同一版本规则
+    pipeline.semantic_filter.adopt_rules(*rules)
+    pipeline.cleaner.batch_size, pipeline.semantic_filter.batch_size = batch_sizes
+    batch = [
+        (doc_id, _load_source(kind, payload, doc_id))
+        for doc_id, kind, payload, _ in sources
+    ]
+    start = time.perf_counter()
+    records = pipeline._process_batch(
+        batch, sources[0][-1], protected_kws, reload_rules=False
     )
-    semantic_model_path = os.path.join(project_root, "models", "all-MiniLM-L6-v2")
+    return records, time.perf_counter() - start, pipeline._drain_worker_state()
 
-    MODEL_CONFIGS = {
-        "NOISE_CAPTION": noise_model_path,
-        "SEMANTIC_MODEL": semantic_model_path,
-    }
 
-    INPUT_DIR = os.path.join(project_root, "Corpus")
-    OUTPUT_DIR = os.path.join(project_root, "Cleaned_Corpus")
+# ==================================================
+# 模块 9: 语料目录的索引任务 (目录本身见 catalog.py)
+# ==================================================
+# 目录索引用的关键词门 (每个解析进程各自创建一次)
+_CATALOG_GATE = None
+
+
+def _catalog_fields(job):
+    """
+    目录索引: (path, kind, payload, topic_mode) -> 字段 dict
+    读取 + 哈希 + 解析 + 元数据 + 关键词门；模块级函数，可以交给解析进程池
+    """
+    global _CATALOG_GATE
+    if _CATALOG_GATE is None:
+        _CATALOG_GATE = RelevanceFilter()
+    path, kind, payload, topic_mode = job
+    data = read_file(payload) if kind == "path" else payload
+    row = dict.fromkeys(("content_hash", "title", "date", "source"))
+    row.update(
+        path=path,
+        topic_mode=topic_mode,
+        gate_passed=None,
+        gate_reason=None,
+        gate_version=_CATALOG_GATE.version,
+    )
+    if data is None:
+        return row
+    row["content_hash"] = hashlib.sha1(data).hexdigest()
+    doc = Document(RTFHandler.bytes_to_text(data, path), path)
+    if not doc.text:
+        return row
+    row.update(doc.meta)
+    passed, row["gate_reason"] = _CATALOG_GATE.is_relevant(doc, topic_mode=topic_mode)
+    row["gate_passed"] = int(passed)
+    return row
 
-    if not os.path.exists(INPUT_DIR):
-        print(f"⚠️ Input Directory not found: {INPUT_DIR}")
-    else:
-        pipeline = CorpusPipeline(MODEL_CONFIGS)
-        try:
-            pipeline.process_folder(INPUT_DIR, OUTPUT_DIR)
-        finally:
-            pipeline.dispose()
+
+if __name__ == "__main__":
+    # 命令行入口统一由 cli.py 提供 (python cli.py --help)
+    import sys
+    from cli import main
+
+    sys.exit(main())
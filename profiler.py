@@ -0,0 +1,226 @@
+import os
+import sys
+import time
+import threading
+import collections
+
+import serializer
+from corpus_logging import get_logger
+
+# ==========================================================
+# 采样分析器: 火焰图 (speedscope / collapsed) 与各阶段自身耗时
+# ==========================================================
+# 阶段只按本项目的源文件归类 (流水线的各个类分布在这个目录下的几个模块里)
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SamplingProfiler:
+    """
+    后台线程按固定间隔抓取处理线程的调用栈 (sys._current_frames)，
+    不插桩、不改动被测代码，未开启时没有任何开销
+    输出:
+    - collapsed: "a;b;c 毫秒" 每行一条栈，可直接交给 flamegraph.pl / speedscope
+    - speedscope: speedscope.app 的 JSON 格式
+    - 各阶段自身耗时: 每个样本归到栈上最内层的流水线类 (库函数的时间算给调用它的阶段)
+    注意: 只采样调用 start() 的线程，子进程里的解析 (--workers / --prefork) 不在其中
+    """
+
+    log = get_logger("pipeline")
+
+    FORMATS = ("speedscope", "collapsed")
+
+    # 类名 (或 类名.方法名) -> 阶段
+    STAGES = {
+        "RTFHandler": "parse",
+        "_load_source": "parse",
+        "Document": "structure",
+        "StructuralCleaner": "structure",
+        "MetaExtractor": "meta",
+        "ParagraphMemo": "ner",
+        "ParagraphCascade": "ner",
+        "NERCleaner": "ner",
+        "RelevanceFilter": "gate",
+        "SemanticRelevanceFilter": "semantic",
+        "SemanticShortCircuit": "semantic",
+        "CorpusPipeline._write_document": "write",
+        "CorpusPipeline._open_output_folder": "write",
+        "CorpusPipeline._close_output_folder": "write",
+        "ReviewStore": "write",
+        "CorpusExportSink": "export",
+        "MemoryGovernor": "memory",
+        "CorpusPipeline": "pipeline",
+    }
+
+    def __init__(self, interval=0.01, max_docs=None, fmt="speedscope"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown profile format: {fmt}")
+        self.interval = interval
+        self.max_docs = max_docs or None
+        self.fmt = fmt
+        self.stacks = collections.Counter()  # (code, ...) 根在前 -> 累计毫秒
+        self.samples = 0
+        self.wall_sec = 0.0
+        self._labels = {}  # code -> (label, stage)
+        self._thread = None
+        self._stop = None
+
+    @classmethod
+    def from_option(cls, option):
+        """
+        process_folder / 桥接 start 的 profile 参数:
+        None / False: 不开启; True / 0: 整个任务; N: 前 N 篇
+        dict: {"docs": N, "interval_ms": 10, "format": "speedscope"|"collapsed", "dir": ...}
+        """
+        if option is None or option is False:
+            return None
+        if option is True or isinstance(option, int):
+            return cls(max_docs=0 if option is True else option)
+        return cls(
+            interval=float(option.get("interval_ms", 10)) / 1000,
+            max_docs=option.get("docs"),
+            fmt=option.get("format", "speedscope"),
+        )
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(target,), name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        scope = f"first {self.max_docs} docs" if self.max_docs else "whole job"
+        self.log.info(
+            f"🔬 Sampling profiler on ({scope}, every {self.interval * 1000:.0f} ms)."
+        )
+
+    def stop(self):
+        """可重复调用"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, target):
+        last = started = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            del frame
+            # 按实际间隔加权: GIL 被长时间占用时一个样本代表更长的时间
+            self.stacks[tuple(reversed(stack))] += (now - last) * 1000
+            self.samples += 1
+            last = now
+        self.wall_sec += time.perf_counter() - started
+
+    def _describe(self, code):
+        """code -> (栈帧标签, 所属阶段或 None)"""
+        cached = self._labels.get(code)
+        if cached is None:
+            qualname = getattr(code, "co_qualname", code.co_name)
+            stage = None
+            if os.path.dirname(os.path.abspath(code.co_filename)) == _PROJECT_DIR:
+                owner = qualname.split(".<locals>")[0]
+                stage = self.STAGES.get(owner) or self.STAGES.get(owner.split(".")[0])
+            label = f"{qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            cached = self._labels[code] = (label, stage)
+        return cached
+
+    def report(self, top=15):
+        """各阶段自身耗时 + 最耗时的叶子函数"""
+        total = sum(self.stacks.values())
+        stages = collections.Counter()
+        leaves = collections.Counter()
+        for stack, ms in self.stacks.items():
+            stage = "other"
+            for code in reversed(stack):
+                found = self._describe(code)[1]
+                if found is not None:
+                    stage = found
+                    break
+            stages[stage] += ms
+            leaves[self._describe(stack[-1])[0]] += ms
+        share = lambda ms: round(ms / total, 3) if total else 0.0
+        return {
+            "samples": self.samples,
+            "interval_ms": round(self.interval * 1000, 2),
+            "wall_sec": round(self.wall_sec, 2),
+            "sampled_sec": round(total / 1000, 2),
+            "stages": {
+                stage: {"self_sec": round(ms / 1000, 3), "share": share(ms)}
+                for stage, ms in stages.most_common()
+            },
+            "top_self": [
+                {"frame": label, "self_sec": round(ms / 1000, 3), "share": share(ms)}
+                for label, ms in leaves.most_common(top)
+            ],
+        }
+
+    def write(self, out_dir, name="profile"):
+        """写出栈文件和阶段汇总，返回汇总 (含文件路径)"""
+        os.makedirs(out_dir, exist_ok=True)
+        report = self.report()
+        if self.fmt == "collapsed":
+            stack_path = os.path.join(out_dir, f"{name}.collapsed.txt")
+            with open(stack_path, "w", encoding="utf-8") as f:
+                for stack, ms in self.stacks.most_common():
+                    labels = ";".join(self._describe(code)[0] for code in stack)
+                    f.write(f"{labels} {max(1, round(ms))}\n")
+        else:
+            stack_path = os.path.join(out_dir, f"{name}.speedscope.json")
+            serializer.dump_file(self._speedscope(name), stack_path)
+        report["stacks_file"] = stack_path
+        report["summary_file"] = os.path.join(out_dir, f"{name}.stages.json")
+        serializer.dump_file(report, report["summary_file"], pretty=True)
+        self.log.info(f"🔬 Profile written to: {stack_path}")
+        self.log.info(
+            "🔬 Self time by stage: "
+            + ", ".join(f"{k} {v['share']:.0%}" for k, v in report["stages"].items())
+        )
+        return report
+
+    def _speedscope(self, name):
+        index, frames = {}, []
+        samples, weights = [], []
+        for stack, ms in self.stacks.items():
+            ids = []
+            for code in stack:
+                if code not in index:
+                    index[code] = len(frames)
+                    frames.append(
+                        {
+                            "name": self._describe(code)[0],
+                            "file": code.co_filename,
+                            "line": code.co_firstlineno,
+                        }
+                    )
+                ids.append(index[code])
+            samples.append(ids)
+            weights.append(round(ms, 3))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "profiler.SamplingProfiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": round(sum(weights), 3),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
@@ -0,0 +1,211 @@
+import os
+import zlib
+
+import serializer
+from corpus_logging import get_logger
+
+# --- 可选依赖 ---
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+
+# ==========================================================
+# 审查存储: Review Lab 使用的压缩 diff 库 (每个 output 文件夹一份)
+# ==========================================================
+class ReviewStore:
+    """
+    每个 output 文件夹一份:
+    - review_store.bin: 逐篇追加的压缩帧 (原文只存一次 + 高亮区间坐标，不再复制被删文本)
+    - review_store.idx: 每行一个 JSON {"filename", "offset", "length"}，同名以最后一条为准
+    读取单篇只需要查索引再 seek，不用解析整个文件夹的数据
+    """
+
+    log = get_logger("review")
+
+    DATA_FILE = "review_store.bin"
+    INDEX_FILE = "review_store.idx"
+    LEGACY_JSON = "frontend_diff.json"
+
+    # 帧首字节标记压缩算法
+    CODEC_ZSTD = b"Z"
+    CODEC_ZLIB = b"D"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.data_path = os.path.join(folder, self.DATA_FILE)
+        self.index_path = os.path.join(folder, self.INDEX_FILE)
+        self._data_f = None
+        self._index_f = None
+        self._compressor = zstd.ZstdCompressor(level=6) if zstd is not None else None
+
+    # ---------- 写入 ----------
+    def append(self, entry):
+        """entry: 旧版 frontend_diff.json 的单条格式 (filename/original_text/...)"""
+        if self._data_f is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._data_f = open(self.data_path, "ab")
+            self._index_f = open(self.index_path, "a", encoding="utf-8")
+
+        payload = {
+            "filename": entry["filename"],
+            "original_text": entry["original_text"],
+            "cleaned_body": entry["cleaned_body"],
+            "metadata": entry["metadata"],
+            "rules_version": entry.get("rules_version"),
+            # 只存坐标: [start, end, type, score]
+            "spans": [
+                [h["start"], h["end"], h["type"], h.get("score")]
+                for h in entry.get("highlights", [])
+            ],
+        }
+        frame = self._compress(serializer.dumpb(payload))
+
+        self._data_f.seek(0, os.SEEK_END)
+        offset = self._data_f.tell()
+        self._data_f.write(frame)
+        self._data_f.flush()
+
+        index_line = {
+            "filename": entry["filename"],
+            "offset": offset,
+            "length": len(frame),
+        }
+        self._index_f.write(serializer.dumps(index_line) + "\n")
+        self._index_f.flush()
+
+    def close(self):
+        for f in (self._data_f, self._index_f):
+            if f is not None:
+                f.close()
+        self._data_f = None
+        self._index_f = None
+
+    def _compress(self, raw):
+        if self._compressor is not None:
+            return self.CODEC_ZSTD + self._compressor.compress(raw)
+        return self.CODEC_ZLIB + zlib.compress(raw, 6)
+
+    @classmethod
+    def _decompress(cls, frame):
+        codec, body = frame[:1], frame[1:]
+        if codec == cls.CODEC_ZSTD:
+            if zstd is None:
+                raise RuntimeError("zstandard is required to read this review store")
+            return zstd.ZstdDecompressor().decompress(body)
+        return zlib.decompress(body)
+
+    # ---------- 读取 ----------
+    def load_index(self):
+        """返回 {filename: (offset, length)}，保持首次出现的顺序"""
+        index = {}
+        if not os.path.exists(self.index_path):
+            return index
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = serializer.loads(line)
+                except ValueError:
+                    continue  # 写到一半的行 (进程被杀)
+                index[item["filename"]] = (item["offset"], item["length"])
+        return index
+
+    def get(self, filename, index=None):
+        """读取单篇，返回旧版格式的 dict (高亮的 text 由原文按坐标还原)"""
+        if index is None:
+            index = self.load_index()
+        if filename not in index:
+            return None
+        offset, length = index[filename]
+        with open(self.data_path, "rb") as f:
+            f.seek(offset)
+            frame = f.read(length)
+        return self._to_legacy(serializer.loads(self._decompress(frame)))
+
+    def iter_documents(self, filenames=None):
+        index = self.load_index()
+        names = index.keys() if filenames is None else filenames
+        for name in names:
+            doc = self.get(name, index)
+            if doc is not None:
+                yield doc
+
+    @staticmethod
+    def _to_legacy(payload):
+        original = payload["original_text"]
+        highlights = []
+        for start, end, span_type, score in payload["spans"]:
+            item = {"start": start, "end": end, "type": span_type}
+            if span_type not in ("HEADER", "FOOTER"):
+                item["score"] = score
+                item["text"] = original[start:end]
+            highlights.append(item)
+        return {
+            "filename": payload["filename"],
+            "original_text": original,
+            "cleaned_body": payload["cleaned_body"],
+            "highlights": highlights,
+            "metadata": payload["metadata"],
+            "rules_version": payload.get("rules_version"),
+        }
+
+    # ---------- 兼容导出 ----------
+    def export_legacy_json(self, filenames=None, json_path=None, pretty=False):
+        """
+        生成旧版 frontend_diff.json (Review Lab 目前读取的格式)
+        filenames: 只导出这些文件 (默认导出库里所有文件)
+        pretty: 缩进 2 格 (默认紧凑输出)
+        """
+        if json_path is None:
+            json_path = os.path.join(self.folder, self.LEGACY_JSON)
+        # 逐篇写出，不在内存里拼整个列表
+        count = 0
+        with open(json_path, "wb") as f:
+            f.write(b"[")
+            for doc in self.iter_documents(filenames):
+                data = serializer.dumpb(doc, pretty)
+                if pretty:
+                    f.write(b",\n  " if count else b"\n  ")
+                    data = data.replace(b"\n", b"\n  ")
+                elif count:
+                    f.write(b",")
+                f.write(data)
+                count += 1
+            f.write(b"\n]" if pretty and count else b"]")
+        return count
+
+    def compact_if_needed(self, max_dead_ratio=0.5):
+        """重复运行会留下被覆盖的旧帧，超过一定比例时压缩"""
+        if not os.path.exists(self.index_path):
+            return False
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            total = sum(1 for line in f if line.strip())
+        live = len(self.load_index())
+        if total and (total - live) / total > max_dead_ratio:
+            self.compact()
+            return True
+        return False
+
+    def compact(self):
+        """去掉被覆盖的旧帧，重写数据文件和索引"""
+        self.close()
+        index = self.load_index()
+        if not index:
+            return
+        tmp_data = self.data_path + ".tmp"
+        tmp_index = self.index_path + ".tmp"
+        with open(self.data_path, "rb") as src, open(tmp_data, "wb") as dst, open(
+            tmp_index, "w", encoding="utf-8"
+        ) as idx:
+            for name, (offset, length) in index.items():
+                src.seek(offset)
+                frame = src.read(length)
+                new_line = {"filename": name, "offset": dst.tell(), "length": length}
+                dst.write(frame)
+                idx.write(serializer.dumps(new_line) + "\n")
+        os.replace(tmp_data, self.data_path)
+        os.replace(tmp_index, self.index_path)
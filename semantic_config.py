@@ -0,0 +1,19 @@
+import os
+
+# ==========================================================
+# 语义规则配置文件的位置 (不依赖 torch，api.py 启动时也会用到)
+# ==========================================================
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def resolve_semantic_config_path(base_dir=None):
+    """
+    语义规则配置的唯一位置 (界面保存、流水线读取都用它):
+    css-interface/semantic_config.json 优先，其次 css_interface/，最后项目根目录
+    """
+    if base_dir is None:
+        base_dir = PROJECT_DIR
+    for folder in ("css-interface", "css_interface"):
+        if os.path.isdir(os.path.join(base_dir, folder)):
+            return os.path.join(base_dir, folder, "semantic_config.json")
+    return os.path.join(base_dir, "semantic_config.json")
@@ -0,0 +1,158 @@
+import os
+import random
+import hashlib
+import collections
+
+import serializer
+from corpus_logging import get_logger
+
+
+# ==========================================================
+# 语义阶段短路: 按 "话题模式 + 关键词门结果 + 锚点密度" 分组统计通过率，
+# 一直通过的分组不再送语义模型
+# ==========================================================
+class SemanticShortCircuit:
+    """
+    语义阶段的短路策略: 按 "话题模式 + 关键词门结果 + China 锚点密度" 分组，
+    记录每组在语义模型里的通过率 (按规则版本分别统计，落盘在 CACHE_DIR 下)
+    - record: 只记录统计
+    - on: 样本数足够且通过率 >= min_pass_rate 的分组直接判为通过，不再 encode；
+      其中按 verify_rate 抽样的文章仍送模型复核，报告一致率
+    """
+
+    log = get_logger("semantic")
+
+    MODES = ["off", "record", "on"]
+    # 锚点出现次数分桶: 1 / 2-4 / 5-9 / 10+
+    ANCHOR_BUCKETS = [(10, "10+"), (5, "5-9"), (2, "2-4"), (0, "1")]
+
+    def __init__(
+        self,
+        mode="off",
+        cache_dir=None,
+        model_id="",
+        min_samples=200,
+        min_pass_rate=0.995,
+        verify_rate=0.05,
+    ):
+        self.mode = mode if mode in self.MODES else "off"
+        self.min_samples = int(min_samples)
+        self.min_pass_rate = float(min_pass_rate)
+        self.verify_rate = float(verify_rate)
+        self.dir = None
+        if cache_dir:
+            model_hash = hashlib.sha1(model_id.encode("utf-8")).hexdigest()[:16]
+            self.dir = os.path.join(cache_dir, "semantic_policy", model_hash)
+        self.tables = {}  # rules_version -> {key: [passed, total]}
+        self.rng = random.Random(0)
+        self.stats = collections.Counter()
+        # 预分叉工作进程: (rules_version, key) -> [passed, total] 增量 (None 不记录)
+        self.journal = None
+
+    @classmethod
+    def key(cls, topic_mode, gate_reason, anchor_hits):
+        bucket = next(name for low, name in cls.ANCHOR_BUCKETS if anchor_hits >= low)
+        return f"{topic_mode}|{gate_reason}|{bucket}"
+
+    def _table(self, rules_version):
+        table = self.tables.get(rules_version)
+        if table is None:
+            table = {}
+            path = self._path(rules_version)
+            if path and os.path.exists(path):
+                try:
+                    table = serializer.load_file(path)
+                except Exception as e:
+                    self.log.warning(f"⚠️ Semantic policy stats unreadable ({e}).")
+            self.tables[rules_version] = table
+        return table
+
+    def _path(self, rules_version):
+        return os.path.join(self.dir, f"{rules_version}.json") if self.dir else None
+
+    def confident(self, key, rules_version):
+        passed, total = self._table(rules_version).get(key, (0, 0))
+        return total >= self.min_samples and passed / total >= self.min_pass_rate
+
+    def split(self, keys, rules_version):
+        """
+        keys: 每篇通过关键词门的文章的分组
+        返回 (送模型的下标, 短路通过的下标, 抽样复核的下标)
+        """
+        self.stats["checked"] += len(keys)
+        if self.mode != "on":
+            return list(range(len(keys))), [], set()
+        run, skipped, verify = [], [], set()
+        for i, key in enumerate(keys):
+            if not self.confident(key, rules_version):
+                run.append(i)
+            elif self.rng.random() < self.verify_rate:
+                verify.add(i)
+                run.append(i)
+            else:
+                skipped.append(i)
+        self.stats["skipped"] += len(skipped)
+        return run, skipped, verify
+
+    def observe(self, keys, kept, rules_version, verify=()):
+        """模型的判断回传: 更新分组通过率，统计复核一致率"""
+        table = self._table(rules_version)
+        for i, (key, is_kept) in enumerate(zip(keys, kept)):
+            entry = table.setdefault(key, [0, 0])
+            entry[0] += int(is_kept)
+            entry[1] += 1
+            if self.journal is not None:
+                pending = self.journal.setdefault((rules_version, key), [0, 0])
+                pending[0] += int(is_kept)
+                pending[1] += 1
+            if i in verify:
+                self.stats["verified"] += 1
+                self.stats["agreed"] += int(is_kept)
+
+    def report(self):
+        checked = self.stats["checked"]
+        verified = self.stats["verified"]
+        return {
+            "mode": self.mode,
+            "checked": checked,
+            "skipped": self.stats["skipped"],
+            "skip_rate": round(self.stats["skipped"] / checked, 3) if checked else 0.0,
+            "verified": verified,
+            "agreement": (
+                round(self.stats["agreed"] / verified, 4) if verified else None
+            ),
+            "confident_groups": sorted(
+                key
+                for table_version, table in self.tables.items()
+                for key in table
+                if self.confident(key, table_version)
+            ),
+        }
+
+    def drain_delta(self):
+        """预分叉工作进程: 上次调用以来的分组计数增量和统计 (随之清零)"""
+        delta = {"tables": self.journal or {}, "stats": dict(self.stats)}
+        if self.journal is not None:
+            self.journal = {}
+        self.stats = collections.Counter()
+        return delta
+
+    def merge_delta(self, delta):
+        """父进程: 把工作进程的增量累加到对应规则版本的分组上"""
+        for (rules_version, key), (passed, total) in delta["tables"].items():
+            entry = self._table(rules_version).setdefault(key, [0, 0])
+            entry[0] += passed
+            entry[1] += total
+        self.stats.update(delta["stats"])
+
+    def save(self):
+        if not self.dir:
+            return
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            for rules_version, table in self.tables.items():
+                path = self._path(rules_version)
+                serializer.dump_file(table, path + ".tmp", pretty=True)
+                os.replace(path + ".tmp", path)
+        except Exception as e:
+            self.log.error(f"❌ Failed to save semantic policy stats: {e}")
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+
+# ==========================================================
+# JSON 序列化层: 有 orjson 时用 orjson，否则退回标准库
+# 默认紧凑输出 (审查库 / 导出 / 桥接消息)，pretty=True 时缩进 2 格
+# ==========================================================
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _OPT_COMPACT = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    _OPT_PRETTY = _OPT_COMPACT | orjson.OPT_INDENT_2
+
+
+def _default(obj):
+    """numpy 标量 / 数组等标准类型以外的值"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (set, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumpb(obj, pretty=False):
+    """返回 UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=_default, option=_OPT_PRETTY if pretty else _OPT_COMPACT
+        )
+    return dumps(obj, pretty).encode("utf-8")
+
+
+def dumps(obj, pretty=False):
+    """返回 str (非 ASCII 字符原样保留)"""
+    if orjson is not None:
+        return dumpb(obj, pretty).decode("utf-8")
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def loads(data):
+    """接受 str 或 bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_file(obj, path, pretty=False):
+    with open(path, "wb") as f:
+        f.write(dumpb(obj, pretty))
+
+
+def load_file(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
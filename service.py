@@ -0,0 +1,393 @@
+import sys
+import os
+import time
+import queue
+import argparse
+import threading
+import collections
+import concurrent.futures
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================================
+# 本地 HTTP 清洗服务 (模型常驻，按请求清洗单篇文章)
+# 用法: python service.py [--port 8765] [options]
+#   POST /clean    单篇 {"rtf": ...} / {"text": ...}，或 {"documents": [...]}
+#                  也可以直接 POST RTF / 纯文本 (Content-Type: application/rtf, text/plain,
+#                  ?name=...&topic_mode=...)
+#   GET  /health   模型与规则状态
+#   GET  /metrics  Prometheus 文本格式的计数与延迟
+# 并发请求在 --max-wait-ms 内合并成一批送入模型
+# ==========================================================
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+
+import serializer
+
+# 单个请求体上限 (防止误传整个语料包)
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+
+class DynamicBatcher:
+    """
+    单线程持有流水线: 请求入队，工作线程取到第一篇后最多再等 max_wait 秒，
+    凑够 max_batch 篇或到达截止时间就整批清洗
+    """
+
+    def __init__(self, pipeline, max_batch=16, max_wait_ms=20.0):
+        self.pipeline = pipeline
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.queue = queue.Queue()
+        self.metrics = collections.Counter()
+        self.latencies = collections.deque(maxlen=2000)  # 最近请求的耗时 (秒)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name, raw_text, topic_mode):
+        future = concurrent.futures.Future()
+        self.queue.put((name, raw_text, topic_mode, time.perf_counter(), future))
+        return future
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join(timeout=10)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.queue.put(None)  # 处理完这一批再退出
+                    break
+                batch.append(job)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # 调用方已超时取消的文章不再清洗；其余的标记为运行中，之后不能再取消
+        pending = [job for job in batch if job[-1].set_running_or_notify_cancel()]
+        self.metrics["cancelled"] += len(batch) - len(pending)
+        batch = pending
+        if not batch:
+            return
+        self.metrics["batches"] += 1
+        self.metrics["batch_docs"] += len(batch)
+        # 每篇带自己的 topic_mode (关键词门槛不同)，整批一起清洗:
+        # MiniLM encode 和 DeBERTa 推理都合并成批
+        try:
+            records = self.pipeline.clean_batch(
+                [
+                    (name, raw_text, topic_mode)
+                    for name, raw_text, topic_mode, *_ in batch
+                ]
+            )
+        except Exception as e:
+            self.metrics["errors"] += len(batch)
+            for *_, future in batch:
+                future.set_exception(e)
+            return
+        now = time.perf_counter()
+        for (*_, submitted, future), record in zip(batch, records):
+            self.latencies.append(now - submitted)
+            self.metrics[f"status_{record['status']}"] += 1
+            future.set_result(record)
+
+
+def to_response(record, latency_ms=None):
+    """record -> 返回给调用方的 JSON (不含原文)"""
+    meta = record.get("meta") or {}
+    scores = record.get("sem_scores") or {}
+    return {
+        "name": record["path"],
+        "status": record["status"],
+        "kept": record["status"] == "kept",
+        "topic_mode": record["topic_mode"],
+        "title": meta.get("title", record.get("title", "")),
+        "date": meta.get("date", ""),
+        "source": meta.get("source", ""),
+        "cleaned_body": record.get("cleaned_body", ""),
+        "highlights": record.get("highlights", []),
+        "gate_reason": record.get("gate_reason", ""),
+        "semantic_reason": record.get("sem_reason", ""),
+        "semantic_scores": {k: scores[k] for k in ("pos", "neg") if k in scores},
+        "rules_version": record.get("rules_version"),
+        "latency_ms": latency_ms,
+    }
+
+
+class CleaningService:
+    def __init__(self, pipeline, max_batch=16, max_wait_ms=20.0, timeout=120.0):
+        from pipeline_modules import RTFHandler, get_logger
+
+        self.pipeline = pipeline
+        self.batcher = DynamicBatcher(pipeline, max_batch, max_wait_ms)
+        self.timeout = timeout
+        self.rtf_to_text = RTFHandler.bytes_to_text
+        self.log = get_logger("service")
+        self.started = time.time()
+        self.requests = collections.Counter()
+        self.lock = threading.Lock()  # 请求计数在多个处理线程里更新
+
+    def count(self, key):
+        with self.lock:
+            self.requests[key] += 1
+
+    def parse_document(self, doc, index=0):
+        """{"rtf"|"text", "name", "topic_mode"} -> (name, raw_text, topic_mode)"""
+        name = doc.get("name") or f"request-{index}.rtf"
+        topic_mode = doc.get("topic_mode") or "GENERAL_CHINA"
+        if topic_mode not in self.pipeline.TOPIC_MODES:
+            raise ValueError(f"Unknown topic_mode: {topic_mode}")
+        if "rtf" in doc:
+            data = doc["rtf"]
+            if isinstance(data, str):
+                # RTF 本身是 ASCII + cp1252 转义，与读取文件时的解码一致
+                data = data.encode("cp1252", errors="replace")
+            raw_text = self.rtf_to_text(data, name=name)
+        elif "text" in doc:
+            raw_text = doc["text"]
+        else:
+            raise ValueError("Each document needs an 'rtf' or 'text' field")
+        return name, raw_text, topic_mode
+
+    def clean(self, docs):
+        futures = [self.batcher.submit(*doc) for doc in docs]
+        results = []
+        try:
+            for future in futures:
+                record = future.result(timeout=self.timeout)
+                results.append(to_response(record))
+        except concurrent.futures.TimeoutError:
+            # 还在排队的文章撤出队列 (批处理线程会跳过已取消的任务)
+            for future in futures:
+                future.cancel()
+            raise
+        return results
+
+    def health(self):
+        semantic = self.pipeline.semantic_filter
+        return {
+            "status": "ok",
+            "uptime_sec": round(time.time() - self.started, 1),
+            "device": self.pipeline.cleaner.device,
+            "models_loaded": self.pipeline.cleaner.model is not None
+            and semantic.model is not None,
+            "rules_version": semantic.rules.version if semantic.rules else None,
+            "queue_depth": self.batcher.queue.qsize(),
+        }
+
+    def metrics_text(self):
+        m = self.batcher.metrics
+        lines = [
+            "# TYPE corpus_requests_total counter",
+            f"corpus_requests_total {self.requests['total']}",
+            "# TYPE corpus_request_errors_total counter",
+            f"corpus_request_errors_total {self.requests['errors']}",
+            "# TYPE corpus_documents_total counter",
+        ]
+        for key, value in sorted(m.items()):
+            if key.startswith("status_"):
+                lines.append(f'corpus_documents_total{{status="{key[7:]}"}} {value}')
+        lines += [
+            "# TYPE corpus_batches_total counter",
+            f"corpus_batches_total {m['batches']}",
+            "# TYPE corpus_batch_documents_total counter",
+            f"corpus_batch_documents_total {m['batch_docs']}",
+            "# TYPE corpus_cancelled_documents_total counter",
+            f"corpus_cancelled_documents_total {m['cancelled']}",
+            "# TYPE corpus_queue_depth gauge",
+            f"corpus_queue_depth {self.batcher.queue.qsize()}",
+            "# TYPE corpus_document_latency_seconds summary",
+        ]
+        latencies = sorted(self.batcher.latencies)
+        for q in (0.5, 0.95, 0.99):
+            value = (
+                latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+                if latencies
+                else 0.0
+            )
+            lines.append(
+                f'corpus_document_latency_seconds{{quantile="{q}"}} {value:.6f}'
+            )
+        lines.append(f"corpus_document_latency_seconds_count {len(latencies)}")
+        return "\n".join(lines) + "\n"
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认的 listen 队列只有 5，突发并发请求会被直接 reset
+    request_queue_size = 256
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "CorpusCleaner/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, fmt, *args):
+        self.service.log.debug("%s - %s", self.address_string(), fmt % args)
+
+    def _send(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = (
+                serializer.dumpb(body)
+                if content_type == "application/json"
+                else body.encode("utf-8")
+            )
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.service.health())
+        elif self.path == "/metrics":
+            self._send(200, self.service.metrics_text(), "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/clean":
+            self._send(404, {"error": "not found"})
+            return
+        service = self.service
+        service.count("total")
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(f"Invalid Content-Length: {length}")
+            if length > MAX_BODY_BYTES:
+                raise ValueError(f"Request body over {MAX_BODY_BYTES} bytes")
+            body = self.rfile.read(length)
+            content_type = (self.headers.get("Content-Type") or "").split(";")[0]
+
+            # 直接 POST 原文时，name / topic_mode 放在查询参数里
+            query = dict(urllib.parse.parse_qsl(url.query))
+            if content_type in ("application/rtf", "text/rtf"):
+                payload = {**query, "rtf": body}
+            elif content_type == "text/plain":
+                payload = {**query, "text": body.decode("utf-8", errors="replace")}
+            else:
+                payload = serializer.loads(body)
+            many = isinstance(payload, dict) and "documents" in payload
+            docs = payload["documents"] if many else [payload]
+            parsed = [service.parse_document(doc, i) for i, doc in enumerate(docs)]
+        except Exception as e:
+            service.count("errors")
+            self._send(400, {"error": str(e)})
+            return
+
+        try:
+            results = service.clean(parsed)
+        except concurrent.futures.TimeoutError:
+            service.count("errors")
+            service.log.error(f"❌ Cleaning timed out after {service.timeout}s")
+            self._send(504, {"error": f"Cleaning timed out after {service.timeout}s"})
+            return
+        except Exception as e:
+            service.count("errors")
+            service.log.error(f"❌ Cleaning failed: {e}")
+            self._send(500, {"error": str(e)})
+            return
+
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        for result in results:
+            result["latency_ms"] = latency_ms
+        self._send(200, {"documents": results} if many else results[0])
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Local HTTP service that cleans single articles on demand."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=16,
+        help="Most documents coalesced into one model batch (default: 16)",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=20.0,
+        help="How long the first queued document waits for company (default: 20)",
+    )
+    parser.add_argument(
+        "--device", choices=["auto", "cpu", "cuda", "mps"], default="auto"
+    )
+    parser.add_argument(
+        "--precision", choices=["auto", "fp32", "fp16", "bf16"], default="auto"
+    )
+    parser.add_argument("--noise-model", help="Path to the DeBERTa noise model")
+    parser.add_argument("--semantic-model", help="Path to the MiniLM model")
+    parser.add_argument("--semantic-config", help="semantic_config.json to use")
+    parser.add_argument("--cache-dir", help="Directory for pipeline caches")
+    parser.add_argument(
+        "--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO"
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        os.environ.setdefault("HF_HOME", os.path.join(args.cache_dir, "huggingface"))
+
+    from pipeline_modules import (
+        CorpusPipeline,
+        default_model_configs,
+        setup_logging,
+        shutdown_logging,
+    )
+
+    setup_logging(level=args.log_level, stream=sys.stderr)
+    model_configs = default_model_configs(CURRENT_DIR)
+    if args.noise_model:
+        model_configs["NOISE_CAPTION"] = args.noise_model
+    if args.semantic_model:
+        model_configs["SEMANTIC_MODEL"] = args.semantic_model
+    model_configs.update({"DEVICE": args.device, "PRECISION": args.precision})
+    if args.cache_dir:
+        model_configs["CACHE_DIR"] = args.cache_dir
+    if args.semantic_config:
+        model_configs["SEMANTIC_CONFIG_PATH"] = args.semantic_config
+
+    pipeline = CorpusPipeline(model_configs)
+    service = CleaningService(pipeline, args.max_batch, args.max_wait_ms)
+    server = ServiceHTTPServer((args.host, args.port), ServiceHandler)
+    server.service = service
+    service.log.info(f"🌐 Serving on http://{args.host}:{args.port} (POST /clean)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.batcher.stop()
+        pipeline.dispose()
+        shutdown_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import os
+import re
+import time
+
+from archive_io import RTFArchive
+from corpus_logging import get_logger
+
+try:
+    import regex as _regex
+except ImportError:
+    _regex = None
+
+
+# ==========================================================
+# 结构性噪音规则: 线性扫描 / 限时正则 + 规则分析
+# ==========================================================
+class StructuralRuleSet:
+    """
+    NERCleaner 在正文上扫描的结构性噪音规则，每条规则选择执行方式:
+    - scan: 手写的线性扫描，结果与 re.finditer 逐字一致
+      (回溯正则在大段空行 / 空白上是平方级，畸形文档会卡几秒)
+    - regex: 交给 regex 模块执行，每条规则每篇文章有时间预算
+      (STRUCTURAL_RULE_BUDGET_MS)，超时保留已找到的匹配、跳过剩余部分并记录
+    - re: 没有安装 regex 模块时退回标准库 (无预算)
+    每条规则的累计耗时、最慢的文章、匹配数和超时次数都有统计 (report)
+    """
+
+    log = get_logger("ner")
+
+    # (名称, 模式, 标志, 线性扫描方法名)
+    RULES = [
+        (
+            "more_on_this_topic",
+            r"(?:(?<=[.!?])\s*)?(More\s+On\s+This\s+Topic|Related\s+Stor(?:y|ies)).*?$",
+            re.IGNORECASE | re.MULTILINE,
+            None,
+        ),
+        (
+            "read_more",
+            r"(?:(?<=[.!?])\s*)?(READ\s+MORE\s+(?:HERE|ABOUT)|Click\s+here\s+to\s+read).*?(?=\n\n|$)",
+            re.IGNORECASE | re.DOTALL,
+            None,
+        ),
+        (
+            "st_newsletter",
+            r"Sign\s+up\s+for\s+the\s+ST\s+Asian\s+Insider\s+newsletter.*?(?=\n\n|$)",
+            re.IGNORECASE,
+            None,
+        ),
+        (
+            "auto_translated_disclaimer",
+            r"Disclaimer:\s+The\s+Above\s+Content\s+is\s+Auto-Translated.*",
+            re.IGNORECASE | re.DOTALL,
+            None,
+        ),
+        ("category_tag", r"\[Category:.*?\]", re.IGNORECASE, None),
+        # 1. 印尼/评论文章结尾的 Bio 分割线
+        # 遇到 "______" 或 "-----" 就把后面全删了
+        (
+            "separator_tail",
+            r"(?m)^\s*[_\-]{5,}\s*[\s\S]*$",
+            0,
+            "_scan_separator_tail",
+        ),
+        # 2. 常见的免责声明 (作为补充，防止分割线漏掉)
+        (
+            "views_disclaimer",
+            r"(?i)^The\s+views\s+expressed\s+are\s+(personal|solely\s+those\s+of\s+the\s+author).*$",
+            re.MULTILINE,
+            None,
+        ),
+        # 新增规则可以继续添加 (能写成线性扫描的给出方法名，否则走限时正则)...
+    ]
+
+    _DASH_RUN = re.compile(r"[_\-]{5,}")
+
+    def __init__(self, budget_ms=200.0, engine="guarded"):
+        """engine: guarded (默认) / re (参考实现，规则分析时对照用)"""
+        self.budget = budget_ms / 1000 if budget_ms else None
+        self.engine = engine
+        self.names = [name for name, _, _, _ in self.RULES]
+        self.patterns = [re.compile(p, flags) for _, p, flags, _ in self.RULES]
+        self.runners = []
+        for (name, pattern, flags, scanner), compiled in zip(self.RULES, self.patterns):
+            if engine == "re":
+                self.runners.append(("re", compiled))
+            elif scanner:
+                self.runners.append(("scan", getattr(self, scanner)))
+            elif _regex is not None:
+                self.runners.append(("regex", _regex.compile(pattern, flags)))
+            else:
+                self.runners.append(("re", compiled))
+        if engine != "re" and _regex is None:
+            self.log.warning(
+                "⚠️ regex module not installed: structural rules run without "
+                "time budgets (pip install regex)."
+            )
+        self.stats = self._empty_stats()
+
+    def _empty_stats(self):
+        return {
+            name: {
+                "calls": 0,
+                "sec": 0.0,
+                "max_sec": 0.0,
+                "slowest": None,
+                "matches": 0,
+                "timeouts": 0,
+            }
+            for name in self.names
+        }
+
+    def spans(self, text, doc_id=""):
+        """所有规则在 text 上的匹配 [(start, end), ...]，规则按顺序、匹配按位置"""
+        found = []
+        for name, (kind, runner) in zip(self.names, self.runners):
+            start = time.perf_counter()
+            timed_out = False
+            if kind == "scan":
+                matches = runner(text)
+            elif kind == "regex":
+                matches = []
+                try:
+                    for m in runner.finditer(text, timeout=self.budget):
+                        matches.append(m.span())
+                except TimeoutError:
+                    timed_out = True
+            else:
+                matches = [m.span() for m in runner.finditer(text)]
+            elapsed = time.perf_counter() - start
+
+            stat = self.stats[name]
+            stat["calls"] += 1
+            stat["sec"] += elapsed
+            stat["matches"] += len(matches)
+            if elapsed > stat["max_sec"]:
+                stat["max_sec"] = elapsed
+                stat["slowest"] = doc_id
+            if timed_out:
+                stat["timeouts"] += 1
+                self.log.warning(
+                    f"⏱️ Rule '{name}' hit its {self.budget * 1000:g} ms budget on "
+                    f"{os.path.basename(doc_id) or '<text>'} ({len(text)} chars); "
+                    f"kept {len(matches)} matches found so far."
+                )
+            found.extend(matches)
+        return found
+
+    @classmethod
+    def _scan_separator_tail(cls, text):
+        """
+        (?m)^\\s*[_\\-]{5,}\\s*[\\s\\S]*$ 的线性实现:
+        匹配从某个行首开始、只隔着空白的 5 个以上 "_" / "-"，一直到全文末尾，
+        所以最多一个匹配，起点是满足条件的最早行首
+        只需检查每段横线的起点 q: 向前跳过空白到 w，[w, q] 内最早的行首即为起点
+        """
+        for run in cls._DASH_RUN.finditer(text):
+            q = w = run.start()
+            while w > 0 and text[w - 1].isspace():
+                w -= 1
+            if w == 0 or text[w - 1] == "\n":
+                return [(w, len(text))]
+            newline = text.find("\n", w, q)
+            if newline != -1:
+                return [(newline + 1, len(text))]
+        return []
+
+    def report(self):
+        """各规则的累计开销，按总耗时从高到低"""
+        engines = dict(zip(self.names, (kind for kind, _ in self.runners)))
+        rows = {}
+        for name, stat in sorted(self.stats.items(), key=lambda kv: -kv[1]["sec"]):
+            calls = stat["calls"]
+            rows[name] = {
+                "engine": engines[name],
+                "calls": calls,
+                "total_sec": round(stat["sec"], 4),
+                "mean_ms": round(stat["sec"] * 1000 / calls, 4) if calls else 0.0,
+                "max_ms": round(stat["max_sec"] * 1000, 3),
+                "slowest": stat["slowest"],
+                "matches": stat["matches"],
+                "timeouts": stat["timeouts"],
+            }
+        return rows
+
+    def drain_delta(self):
+        """预分叉工作进程: 上次调用以来各规则的统计 (随之清零)"""
+        delta = self.stats
+        self.stats = self._empty_stats()
+        return delta
+
+    def merge_delta(self, delta):
+        """父进程: 累加工作进程发回的规则统计"""
+        for name, other in delta.items():
+            stat = self.stats[name]
+            for field in ("calls", "sec", "matches", "timeouts"):
+                stat[field] += other[field]
+            if other["max_sec"] > stat["max_sec"]:
+                stat["max_sec"] = other["max_sec"]
+                stat["slowest"] = other["slowest"]
+
+    @classmethod
+    def profile_corpus(cls, input_dir, recursive=False, budget_ms=200.0, limit=None):
+        """
+        规则分析器 (不加载模型): 在语料的每篇正文上分别跑受控引擎和标准库 re，
+        报告每条规则的开销，并核对两者的匹配是否一致
+        新增或修改规则后先跑一遍，防止某条规则悄悄拖垮吞吐
+        """
+        # 解析与文档结构在 pipeline_modules (依赖 torch)，只有分析器需要
+        from pipeline_modules import CorpusPipeline, Document, RTFHandler
+
+        archive = None
+        if RTFArchive.is_archive(input_dir):
+            archive = RTFArchive(input_dir)
+            entries = archive.scan(recursive)
+        else:
+            entries = CorpusPipeline.scan_files(input_dir, recursive)
+        entries = entries[:limit] if limit else entries
+
+        guarded = cls(budget_ms)
+        reference = cls(engine="re")
+        mismatches = []
+        chars = 0
+        for entry in entries:
+            if archive is None:
+                text = RTFHandler.to_text(entry.path)
+            else:
+                text = RTFHandler.bytes_to_text(archive.read(entry.path), entry.path)
+            doc = Document(text, entry.path)
+            if not doc.text or doc.header_end >= doc.footer_start:
+                continue
+            body = doc.body
+            chars += len(body)
+            ours = guarded.spans(body, entry.path)
+            expected = reference.spans(body, entry.path)
+            if ours != expected:
+                mismatches.append(entry.path)
+        if archive is not None:
+            archive.close()
+
+        if mismatches:
+            cls.log.warning(
+                f"⚠️ {len(mismatches)} documents matched differently from re."
+            )
+        return {
+            "documents": len(entries),
+            "body_chars": chars,
+            "regex_module": _regex is not None,
+            "budget_ms": budget_ms,
+            "rules": guarded.report(),
+            "reference_re": reference.report(),
+            "mismatches": len(mismatches),
+            "mismatch_examples": mismatches[:10],
+        }
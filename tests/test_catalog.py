@@ -0,0 +1,132 @@
+"""
+CorpusCatalog: 旧版本数据库原地升级 (保留处理状态) 与增量同步
+运行: python -m pytest -q tests
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import CorpusCatalog  # noqa: E402
+from file_discovery import FileEntry  # noqa: E402
+
+# 第 1 版的表结构 (还没有 gate_version 列)
+SCHEMA_V1 = """
+    CREATE TABLE documents (
+        path TEXT PRIMARY KEY,
+        folder TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL NOT NULL,
+        content_hash TEXT,
+        title TEXT,
+        date TEXT,
+        date_iso TEXT,
+        source TEXT COLLATE NOCASE,
+        topic_mode TEXT,
+        gate_passed INTEGER,
+        gate_reason TEXT,
+        indexed_at REAL,
+        status TEXT,
+        rules_version TEXT,
+        processed_at REAL
+    );
+    CREATE INDEX idx_date ON documents (date_iso);
+    CREATE INDEX idx_source ON documents (source);
+    CREATE INDEX idx_status ON documents (status);
+"""
+
+ROWS_V1 = [
+    ("/c/a.rtf", "/c", 10, 1.0, "2024-01-02", "ST", 1, "kept", "r1"),
+    ("/c/b.rtf", "/c", 20, 2.0, "2024-02-03", "Xinhua", 0, "gate_skipped", "r1"),
+    ("/c/c.rtf", "/c", 30, 3.0, None, None, None, None, None),
+]
+
+
+@pytest.fixture
+def v1_db(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA_V1)
+    conn.executemany(
+        "INSERT INTO documents (path, folder, size, mtime, date_iso, source, "
+        "gate_passed, status, rules_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ROWS_V1,
+    )
+    conn.execute("PRAGMA user_version=1")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def entries(*rows):
+    return [FileEntry(path, size, mtime) for path, _, size, mtime, *_ in rows]
+
+
+def test_v1_database_keeps_status_rows(v1_db):
+    catalog = CorpusCatalog(v1_db)
+    try:
+        assert catalog.conn.execute("PRAGMA user_version").fetchone()[0] == (
+            CorpusCatalog.SCHEMA_VERSION
+        )
+        columns = {
+            row[1] for row in catalog.conn.execute("PRAGMA table_info(documents)")
+        }
+        assert "gate_version" in columns
+
+        assert catalog.report()["status"] == {
+            "kept": 1,
+            "gate_skipped": 1,
+            "unprocessed": 1,
+        }
+        assert catalog.select({"unprocessed": True}) == {"/c/c.rtf"}
+        assert catalog.select({"sources": ["st"]}) == {"/c/a.rtf"}
+        # 升级前的关键词门结果没有版本号，按门筛选时会重新索引
+        assert catalog.unindexed(["/c/a.rtf", "/c/b.rtf"], "g1") == [
+            "/c/a.rtf",
+            "/c/b.rtf",
+        ]
+    finally:
+        catalog.close()
+
+
+def test_reopening_migrated_database_is_stable(v1_db):
+    CorpusCatalog(v1_db).close()
+    catalog = CorpusCatalog(v1_db)
+    try:
+        assert catalog.report()["documents"] == 3
+        assert catalog.select({"status": ["kept"]}) == {"/c/a.rtf"}
+    finally:
+        catalog.close()
+
+
+def test_unknown_version_is_rebuilt(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE documents (path TEXT PRIMARY KEY, junk TEXT)")
+    conn.execute("PRAGMA user_version=99")
+    conn.commit()
+    conn.close()
+
+    catalog = CorpusCatalog(path)
+    try:
+        assert catalog.report()["documents"] == 0
+        assert catalog.sync(entries(*ROWS_V1))["added"] == 3
+    finally:
+        catalog.close()
+
+
+def test_sync_resets_changed_files_only(v1_db):
+    catalog = CorpusCatalog(v1_db)
+    try:
+        a, b, _ = ROWS_V1
+        changed = (b[0], b[1], b[2] + 1, b[3])
+        result = catalog.sync(entries(a, changed), input_dir="/c")
+        assert result == {"added": 0, "changed": 1, "removed": 1}
+        assert catalog.report()["status"] == {"kept": 1, "unprocessed": 1}
+        assert catalog.select({"unprocessed": True}) == {"/c/b.rtf"}
+    finally:
+        catalog.close()
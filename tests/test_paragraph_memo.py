@@ -0,0 +1,130 @@
+"""
+ParagraphMemo: 规范化 key (首尾空白 / 连续空白 / NBSP) 下的掩码还原与持久化
+运行: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from paragraph_memo import ParagraphMemo  # noqa: E402
+
+
+def mask_for(text, noisy):
+    """noisy 子串所在位置为 True 的逐字符掩码"""
+    mask = np.zeros(len(text), dtype=bool)
+    start = text.index(noisy)
+    mask[start : start + len(noisy)] = True
+    return mask
+
+
+PARAGRAPH = "Sign up for the newsletter. READ MORE HERE"
+
+VARIANTS = {
+    "same": PARAGRAPH,
+    "padded": "  \n" + PARAGRAPH + " \t ",
+    "double_spaces": PARAGRAPH.replace(" ", "  "),
+    "nbsp": PARAGRAPH.replace(" ", "\u00a0"),
+    "crlf_runs": PARAGRAPH.replace(". ", ".\r\n \r\n"),
+}
+
+
+@pytest.mark.parametrize("text", VARIANTS.values(), ids=VARIANTS.keys())
+def test_get_restores_mask_on_original_length(text):
+    memo = ParagraphMemo()
+    memo.put(PARAGRAPH, mask_for(PARAGRAPH, "READ MORE HERE"))
+    mask = memo.get(text)
+    assert mask is not None
+    assert len(mask) == len(text)
+    assert mask.dtype == bool
+    # 折叠后的内容一致: 非空白字符逐个对应
+    noisy = "".join(c for c, m in zip(text, mask) if m and not c.isspace())
+    assert noisy == "READMOREHERE"
+    # 首尾空白不在规范化内容里，不会被标成噪音
+    lead = len(text) - len(text.lstrip())
+    assert not mask[:lead].any()
+    assert not mask[len(text.rstrip()) :].any()
+
+
+def test_put_keeps_original_length_for_padded_text():
+    text = VARIANTS["padded"]
+    memo = ParagraphMemo()
+    memo.put(text, mask_for(text, "newsletter"))
+    mask = memo.get(text)
+    assert len(mask) == len(text)
+    assert (mask == mask_for(text, "newsletter")).all()
+
+
+def test_collapsed_run_is_noise_if_any_char_was():
+    text = "Keep this.  \u00a0 \nDrop this."
+    run_start = text.index("  ")
+    run_end = text.index("Drop")
+    mask = np.zeros(len(text), dtype=bool)
+    mask[run_start + 2] = True  # 整段空白里只有 NBSP 被判为噪音
+    memo = ParagraphMemo()
+    memo.put(text, mask)
+
+    restored = memo.get(text)
+    assert restored[run_start:run_end].all()
+    assert not restored[:run_start].any()
+    assert not restored[run_end:].any()
+
+    # 同一段落换一种空白写法，折叠后的空白仍是噪音
+    other = "Keep this. Drop this."
+    restored = memo.get(other)
+    assert len(restored) == len(other)
+    assert restored.tolist() == [c == " " and i == 10 for i, c in enumerate(other)]
+
+
+def test_clean_run_stays_clean():
+    text = "Keep   this"
+    memo = ParagraphMemo()
+    memo.put(text, np.zeros(len(text), dtype=bool))
+    assert not memo.get("Keep this").any()
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\u00a0\n\t"])
+def test_blank_paragraphs(text):
+    memo = ParagraphMemo()
+    memo.put(text, np.ones(len(text), dtype=bool))
+    mask = memo.get(text)
+    assert len(mask) == len(text)
+    assert not mask.any()
+
+
+def test_model_version_is_part_of_key():
+    memo = ParagraphMemo(model_version="v1")
+    memo.put(PARAGRAPH, mask_for(PARAGRAPH, "READ MORE HERE"))
+    other = ParagraphMemo(model_version="v2")
+    other.entries = memo.entries
+    assert other.get(PARAGRAPH) is None
+    assert memo.get(PARAGRAPH) is not None
+
+
+def test_lru_capacity_and_stats():
+    memo = ParagraphMemo(capacity=2)
+    for text in ("one", "two", "three"):
+        memo.put(text, np.zeros(len(text), dtype=bool))
+    assert memo.get("one", "ST") is None
+    assert memo.get("three", "ST") is not None
+    report = memo.report()
+    assert report["size"] == 2
+    assert report["by_source"]["ST"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_persistence_round_trip(tmp_path):
+    path = str(tmp_path / "memo" / "paragraph_memo.pkl")
+    memo = ParagraphMemo(model_version="v1", persist_path=path)
+    memo.put(PARAGRAPH, mask_for(PARAGRAPH, "READ MORE HERE"))
+    memo.save()
+
+    loaded = ParagraphMemo(model_version="v1", persist_path=path)
+    mask = loaded.get(VARIANTS["double_spaces"])
+    assert mask is not None and len(mask) == len(VARIANTS["double_spaces"])
+
+    # 其它模型版本的缓存不加载
+    assert not ParagraphMemo(model_version="v2", persist_path=path).entries
@@ -0,0 +1,124 @@
+"""
+ReviewStore 的写入 / 读取 / 压缩 / 旧版 frontend_diff.json 导出的往返一致性
+运行: python -m pytest -q tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from review_store import ReviewStore  # noqa: E402
+
+
+def make_entry(filename, original, cleaned, spans, rules_version="r1"):
+    """旧版 frontend_diff.json 的单条格式 (高亮带被删文本)"""
+    highlights = []
+    for start, end, span_type, score in spans:
+        item = {"start": start, "end": end, "type": span_type}
+        if span_type not in ("HEADER", "FOOTER"):
+            item["score"] = score
+            item["text"] = original[start:end]
+        highlights.append(item)
+    return {
+        "filename": filename,
+        "original_text": original,
+        "cleaned_body": cleaned,
+        "highlights": highlights,
+        "metadata": {"title": filename, "date": "1 January 2024", "source": "ST"},
+        "rules_version": rules_version,
+    }
+
+
+ORIGINAL_A = "Title A\nBody one. READ MORE HERE: link\nBody two.\nFooter"
+ORIGINAL_B = "Title B\nOnly body with ünïcödé — and NBSP\u00a0here.\nEnd"
+
+ENTRY_A = make_entry(
+    "a.rtf",
+    ORIGINAL_A,
+    "Body one.\nBody two.",
+    [(0, 8, "HEADER", None), (18, 38, "NOISE", 0.93), (49, 55, "FOOTER", None)],
+)
+ENTRY_B = make_entry("b.rtf", ORIGINAL_B, ORIGINAL_B[8:48], [(0, 8, "HEADER", None)])
+ENTRY_A2 = make_entry(
+    "a.rtf", ORIGINAL_A, "Body one. READ MORE HERE: link\nBody two.", [], "r2"
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReviewStore(str(tmp_path / "out"))
+    store.append(ENTRY_A)
+    store.append(ENTRY_B)
+    store.close()
+    return store
+
+
+def test_get_round_trip(store):
+    assert store.get("a.rtf") == ENTRY_A
+    assert store.get("b.rtf") == ENTRY_B
+    assert store.get("missing.rtf") is None
+
+
+def test_latest_append_wins(store):
+    store.append(ENTRY_A2)
+    store.close()
+    assert store.get("a.rtf") == ENTRY_A2
+    # 覆盖不改变文件在索引里的顺序
+    assert list(store.load_index()) == ["a.rtf", "b.rtf"]
+    assert list(store.iter_documents()) == [ENTRY_A2, ENTRY_B]
+
+
+def test_compact_drops_dead_frames(store):
+    store.append(ENTRY_A2)
+    store.close()
+    size_before = os.path.getsize(store.data_path)
+
+    store.compact()
+
+    assert os.path.getsize(store.data_path) < size_before
+    with open(store.index_path, encoding="utf-8") as f:
+        assert sum(1 for line in f if line.strip()) == 2
+    assert store.get("a.rtf") == ENTRY_A2
+    assert store.get("b.rtf") == ENTRY_B
+
+
+def test_compact_if_needed(store):
+    assert not store.compact_if_needed()
+    for _ in range(3):
+        store.append(ENTRY_A2)
+    store.close()
+    assert store.compact_if_needed()
+    assert list(store.iter_documents()) == [ENTRY_A2, ENTRY_B]
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_export_legacy_json(store, pretty):
+    assert store.export_legacy_json(pretty=pretty) == 2
+    with open(os.path.join(store.folder, ReviewStore.LEGACY_JSON), "rb") as f:
+        assert json.loads(f.read()) == [ENTRY_A, ENTRY_B]
+
+
+def test_export_legacy_json_subset_and_empty(store, tmp_path):
+    path = str(tmp_path / "subset.json")
+    assert store.export_legacy_json(["b.rtf", "missing.rtf"], path) == 1
+    with open(path, "rb") as f:
+        assert json.loads(f.read()) == [ENTRY_B]
+
+    empty = ReviewStore(str(tmp_path / "empty"))
+    os.makedirs(empty.folder)
+    for pretty in (False, True):
+        assert empty.export_legacy_json(pretty=pretty) == 0
+        with open(os.path.join(empty.folder, ReviewStore.LEGACY_JSON), "rb") as f:
+            assert json.loads(f.read()) == []
+
+
+def test_truncated_index_line_is_skipped(store):
+    # 进程在写索引时被杀: 最后一行不完整，之前的条目照常可读
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write('{"filename": "c.rtf", "off')
+    assert list(store.load_index()) == ["a.rtf", "b.rtf"]
+    assert store.get("b.rtf") == ENTRY_B
@@ -0,0 +1,126 @@
+"""
+StructuralRuleSet 的受控引擎 (线性扫描 / 限时 regex) 与标准库 re 的逐字对照
+运行: python -m pytest -q tests
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structural_rules import StructuralRuleSet  # noqa: E402
+
+SEPARATOR_PATTERN = next(
+    pattern
+    for name, pattern, _, _ in StructuralRuleSet.RULES
+    if name == "separator_tail"
+)
+
+EDGE_CASES = {
+    "empty": "",
+    "whitespace_only": " \n\t\r\n  ",
+    "separator_only": "-----",
+    "four_dashes": "Body text.\n----\nNot a separator.",
+    "crlf_separator": "First paragraph.\r\n\r\n-----\r\nAuthor bio here.\r\n",
+    "crlf_blank_lines": "Body.\r\n \r\n\r\n  _____  \r\nBio",
+    "cr_only": "Body.\r-----\rBio",
+    "trailing_separator": "Body text.\n\n_____",
+    "trailing_separator_spaces": "Body text.\n-----   \n\n",
+    "trailing_newline_after_text": "Body text.\n-----\n",
+    "indented_separator": "Body.\n \t -_-_-_ bio",
+    "inline_dashes": "Score was 3-----2 in the final.",
+    "dashes_after_text_on_line": "Body text -----\nBio",
+    "two_separators": "Body.\n-----\nBio one.\n_____\nBio two.",
+    "leading_separator": "\n\n-----\nEverything goes.",
+    "nbsp_before_separator": "Body.\n\u00a0\u00a0-----\nBio",
+    "unicode_line_breaks": "Body. ----- Bio\x0b-----",
+    "related_stories": "Story ends here. Related Stories: foo\nNext line",
+    "read_more_crlf": "Done. READ MORE HERE: link\r\n\r\nNext paragraph",
+    "newsletter": "Sign up for the ST Asian Insider newsletter to get more\n\nKeep",
+    "disclaimer": "Text.\nDisclaimer: The Above Content is Auto-Translated\nmore",
+    "category_tags": "[Category: Politics] body [Category: Asia]",
+    "views_disclaimer_crlf": "Body.\r\nThe views expressed are personal.\r\nEnd",
+}
+
+PATHOLOGICAL_CASES = {
+    "blank_lines": "\n" * 5000 + "x",
+    "spaces_then_short_run": " " * 50000 + "----",
+    "blank_lines_then_separator": "\n \n" * 10000 + "-----x",
+    "many_short_runs": "---- \n" * 10000,
+    "crlf_blank_lines": "\r\n" * 20000 + "_____",
+    "related_no_newline": "Related Stories " + "x " * 20000,
+}
+
+
+@pytest.fixture(scope="module")
+def engines():
+    return StructuralRuleSet(budget_ms=5000), StructuralRuleSet(engine="re")
+
+
+@pytest.mark.parametrize("text", EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_edge_cases_match_re(engines, text):
+    guarded, reference = engines
+    assert guarded.spans(text) == reference.spans(text)
+
+
+@pytest.mark.parametrize("text", EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_separator_scan_matches_re(text):
+    expected = [m.span() for m in re.finditer(SEPARATOR_PATTERN, text)]
+    assert StructuralRuleSet._scan_separator_tail(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text", PATHOLOGICAL_CASES.values(), ids=PATHOLOGICAL_CASES.keys()
+)
+def test_pathological_inputs_match_re(engines, text):
+    guarded, reference = engines
+    assert guarded.spans(text) == reference.spans(text)
+
+
+def test_separator_scan_is_linear():
+    # re 在这段输入上是平方级 (几秒)，线性扫描应当远低于 1 秒
+    text = "\n" * 200000 + "----"
+    start = time.perf_counter()
+    assert StructuralRuleSet._scan_separator_tail(text) == []
+    assert time.perf_counter() - start < 1.0
+
+
+def test_separator_scan_random_fuzz():
+    rng = random.Random(0)
+    alphabet = ["-", "_", " ", "\n", "\r", "\t", " ", "a", "."]
+    for _ in range(3000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        expected = [m.span() for m in re.finditer(SEPARATOR_PATTERN, text)]
+        assert StructuralRuleSet._scan_separator_tail(text) == expected, repr(text)
+
+
+def test_timeout_keeps_prefix_of_re_matches():
+    # 预算耗尽时只保留已找到的匹配: 必须是 re 结果的前缀，并计入超时
+    guarded = StructuralRuleSet(budget_ms=0.001)
+    reference = StructuralRuleSet(engine="re")
+    text = "[Category: a] " * 20000
+    name = "category_tag"
+    index = guarded.names.index(name)
+    _, compiled = reference.runners[index]
+    expected = [m.span() for m in compiled.finditer(text)]
+
+    # 其它规则在这段输入上没有匹配
+    found = guarded.spans(text)
+    assert found == expected[: len(found)]
+    if len(found) < len(expected):
+        assert guarded.stats[name]["timeouts"] == 1
+
+
+def test_stats_count_calls_and_matches():
+    guarded = StructuralRuleSet()
+    guarded.spans(EDGE_CASES["two_separators"], "doc.rtf")
+    report = guarded.report()
+    assert report["separator_tail"]["engine"] == "scan"
+    assert report["separator_tail"]["calls"] == 1
+    assert report["separator_tail"]["matches"] == 1
+    assert report["separator_tail"]["slowest"] == "doc.rtf"